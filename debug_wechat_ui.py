@@ -1,10 +1,5 @@
-import subprocess
-import time
+from src.utils.osa import run_applescript
 
-def run_applescript(script):
-    p = subprocess.Popen(['osascript', '-'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    stdout, stderr = p.communicate(script)
-    return stdout.strip(), stderr.strip()
 
 def diagnose_wechat_ui():
     print("🕵️‍♂️ 开始诊断微信 UI 结构...")
@@ -14,7 +9,12 @@ def diagnose_wechat_ui():
     # 注意：微信的 UI 结构比较复杂，通常输入框位于 splitter group 的深层结构中
     script = '''
     tell application "System Events"
-        tell application "WeChat" to activate
+        -- 微信卡死时 activate 会一直等待 Apple Event 回复，限定超时后继续
+        try
+            with timeout of 5 seconds
+                tell application "WeChat" to activate
+            end timeout
+        end try
         delay 0.5
 
         tell process "WeChat"
@@ -8,18 +8,22 @@ CloudWork Desktop API Bridge
 """
 
 import asyncio
+import hmac
 import json
 import logging
 import os
 import sys
 import time
-from typing import Optional, Dict, Any
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Optional, Dict, Any, Tuple
 
 import aiohttp
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import BaseModel
 
 # 将 cloudwork 根目录加入 path，复用现有模块
 cloudwork_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
@@ -33,7 +37,44 @@ from src.utils.config import settings
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI(title="CloudWork Desktop API", version="0.1.0")
+# JSON 编解码：优先 orjson（直接产出/解析 bytes），未安装时回退到标准库
+# orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，捕获标准库的异常即可同时覆盖两种实现
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    orjson = None
+
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    _loads = json.loads
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：创建全局共享的 aiohttp 会话（复用到 VPS 的连接），并启动进程记录清理任务"""
+    app.state.http = aiohttp.ClientSession(
+        timeout=VPS_SSE_TIMEOUT,
+        connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=60),
+    )
+    reaper = asyncio.create_task(_reap_finished_processes())
+    try:
+        yield
+    finally:
+        reaper.cancel()
+        await app.state.http.close()
+
+
+app = FastAPI(
+    title="CloudWork Desktop API",
+    version="0.1.0",
+    lifespan=lifespan,
+    # 普通 JSON 端点也用 orjson 序列化（未安装时回退到标准库）
+    default_response_class=ORJSONResponse if orjson is not None else JSONResponse,
+)
 
 # CORS - 允许前端开发服务器
 app.add_middleware(
@@ -62,6 +103,9 @@ REQUIRE_AUTH = os.environ.get("CLOUDWORK_REQUIRE_AUTH", "false").lower() == "tru
 # VPS API 配置 (通过 Tailscale 内网访问)
 VPS_API_URL = os.environ.get("VPS_API_URL", "http://100.96.65.52:2026")
 VPS_API_TOKEN = os.environ.get("VPS_API_TOKEN", "")
+# VPS 请求超时：SSE 流只限制连接和单次读取，配置查询限制总时长
+VPS_SSE_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=600)
+VPS_CONFIG_TIMEOUT = aiohttp.ClientTimeout(total=10)
 
 security = HTTPBearer(auto_error=False)
 
@@ -80,58 +124,146 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
     if not credentials:
         raise HTTPException(status_code=401, detail="Missing authentication token")
 
-    if credentials.credentials != API_TOKEN:
+    if not _token_matches(credentials.credentials):
         raise HTTPException(status_code=401, detail="Invalid authentication token")
 
     return True
 
 
+async def _skip_auth() -> bool:
+    return True
+
+
+# 未启用强制认证时使用空依赖，FastAPI 不再解析 Authorization 头
+require_token = verify_token if REQUIRE_AUTH else _skip_auth
+
+
+def _token_matches(token: str) -> bool:
+    """常量时间比较 Token，避免时序攻击"""
+    return hmac.compare_digest(token.encode("utf-8"), API_TOKEN.encode("utf-8"))
+
+
 def verify_ws_token(token: Optional[str]) -> bool:
     """验证 WebSocket Token"""
     if not REQUIRE_AUTH:
         return True
     if not API_TOKEN:
         return False
-    return token == API_TOKEN
+    return token is not None and _token_matches(token)
+
+
+# =================== 请求模型 ===================
+
+class SessionCreateBody(BaseModel):
+    """POST /api/sessions 请求体"""
+    name: Optional[str] = None
+
+
+class ModelConfigBody(BaseModel):
+    """WorkAny 请求中的 modelConfig，只用到 model，其余字段忽略"""
+    model: Optional[str] = None
+
+
+class AgentBody(BaseModel):
+    """WorkAny /agent* 请求体"""
+    prompt: str = ""
+    modelConfig: Optional[ModelConfigBody] = None
+
+
+class PermissionBody(BaseModel):
+    """POST /agent/permission 请求体，auto 模式不读取任何字段，只校验为 JSON 对象"""
+
+
+class ProviderSettingsBody(BaseModel):
+    """POST /providers/settings/sync 请求体，CloudWork 不保存 Provider 设置，只校验为 JSON 对象"""
+
+
+class AgentRunBody(BaseModel):
+    """POST /api/agent/run 请求体"""
+    prompt: str = ""
+    session_id: Optional[str] = None
+    model: Optional[str] = None
+    mode: str = "auto"
+
+
+class ReaddirBody(BaseModel):
+    """POST /files/readdir 请求体"""
+    path: str = ""
+
+
+class SettingsBody(BaseModel):
+    """POST /api/settings 请求体，未提供的字段保持不变"""
+    model: Optional[str] = None
+    mode: Optional[str] = None
+    project: Optional[str] = None
+    target: Optional[str] = None
+
+
+def _static_json(obj: Any) -> Response:
+    """内容固定的 JSON 响应：导入时序列化一次，之后每次请求直接复用"""
+    return Response(content=_dumps(obj), media_type="application/json")
+
+
+_STATUS_OK = _static_json({"status": "ok"})
+_STATUS_NOT_FOUND = _static_json({"status": "not_found"})
 
 
 # =================== Health ===================
 
+_HEALTH = _static_json({"status": "ok", "service": "cloudwork-desktop"})
+
+
 @app.get("/health")
 async def health():
-    return {"status": "ok", "service": "cloudwork-desktop"}
+    return _HEALTH
 
 
 # =================== Sessions ===================
 
+# 前端会频繁轮询会话列表和设置，短时间内的重复请求直接返回缓存结果
+SNAPSHOT_CACHE_TTL = 0.25
+
+# 会话列表缓存 (user_id -> (生成时间, 响应))，创建/切换会话时失效
+_sessions_cache: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+
+
 @app.get("/api/sessions")
 async def list_sessions():
     """获取所有会话"""
+    now = time.monotonic()
+    cached = _sessions_cache.get(DESKTOP_USER_ID)
+    if cached and now - cached[0] < SNAPSHOT_CACHE_TTL:
+        return cached[1]
+
     sessions = session_manager.get_all_sessions(DESKTOP_USER_ID, include_archived=False)
     active_id = session_manager.get_active_session_id(DESKTOP_USER_ID)
-    return {
+    result = {
         "sessions": sessions,
         "active_session_id": active_id
     }
+    _sessions_cache[DESKTOP_USER_ID] = (now, result)
+    return result
 
 
 @app.post("/api/sessions")
-async def create_session(data: Optional[Dict[str, Any]] = None):
+async def create_session(body: Optional[SessionCreateBody] = None):
     """创建新会话"""
-    name = data.get("name") if data else None
+    name = body.name if body else None
     if name:
         session_manager.set_pending_name(DESKTOP_USER_ID, name)
     else:
         user_data = session_manager.get_or_create_user_data(DESKTOP_USER_ID)
         user_data.active = None
         session_manager.save_sessions()
-    return {"status": "ok"}
+    _sessions_cache.pop(DESKTOP_USER_ID, None)
+    return _STATUS_OK
 
 
 @app.post("/api/sessions/{session_id}/switch")
 async def switch_session(session_id: str):
     """切换会话"""
     session_manager.set_active_session(DESKTOP_USER_ID, session_id)
+    _sessions_cache.pop(DESKTOP_USER_ID, None)
     return {"status": "ok", "session_id": session_id}
 
 
@@ -145,8 +277,173 @@ async def list_archived():
 # =================== Agent (Claude 执行) ===================
 # 兼容 WorkAny 前端 API 格式
 
-# 活跃进程追踪 (session_id -> process)
-_active_processes: Dict[str, Any] = {}
+# 活跃进程追踪 (session_id -> process)，每个运行只占一个键：
+# 启动时登记在续接的会话 ID 下，收到 CLI 返回的会话 ID 后改登记到新 ID
+_active_processes: Dict[str, asyncio.subprocess.Process] = {}
+_active_processes_lock = asyncio.Lock()
+
+# 清理已退出进程记录的间隔（秒）
+PROCESS_REAP_INTERVAL = 60
+
+
+async def _reap_finished_processes():
+    """
+    定期移除已退出的进程记录
+
+    正常情况下 SSE 流结束时会自行移除；这里兜底处理未走到清理逻辑的记录，防止字典无限增长
+    """
+    while True:
+        await asyncio.sleep(PROCESS_REAP_INTERVAL)
+        async with _active_processes_lock:
+            for sid, process in _active_processes.copy().items():
+                if process.returncode is not None:
+                    del _active_processes[sid]
+
+# 各事件类型的 SSE 帧模板：type 字段固定，只需编码可变字段再拼接 bytes，
+# 不必每次构造 dict 再整体序列化
+_TEXT_PREFIX = b'data: {"type":"text","content":'
+_SESSION_PREFIX = b'data: {"type":"session","sessionId":'
+_DONE_PREFIX = b'data: {"type":"done","sessionId":'
+_TOOL_USE_PREFIX = b'data: {"type":"tool_use","name":'
+_TOOL_RESULT_PREFIX = b'data: {"type":"tool_result","toolUseId":'
+_ERROR_PREFIX = b'data: {"type":"error","content":'
+_VPS_ERROR_PREFIX = b'data: {"type":"error","message":'
+_FRAME_END = b'}\n\n'
+
+
+@lru_cache(maxsize=1)
+def _claude_env() -> Dict[str, str]:
+    """Claude CLI 子进程环境变量（进程内缓存，设置变更时失效）"""
+    return claude_executor.build_claude_env()
+
+
+# 子进程输出单次读取的块大小
+READ_CHUNK_SIZE = 64 * 1024
+
+# 子进程 StreamReader 缓冲上限，同时也是单行 JSON 的最大长度
+STREAM_LIMIT = 16 * 1024 * 1024
+
+# text 事件合并发送：最长等待时间（秒）与最多合并块数
+TEXT_FLUSH_INTERVAL = 0.015
+TEXT_FLUSH_MAX_BLOCKS = 16
+
+# SSE 循环每处理多少个事件检查一次客户端是否断开
+DISCONNECT_CHECK_INTERVAL = 16
+
+# 生产者与 SSE 生成器之间的事件队列长度
+EVENT_QUEUE_SIZE = 256
+
+# 心跳间隔（秒）及心跳帧
+KEEPALIVE_INTERVAL = 5
+_KEEPALIVE = b": keepalive\n\n"
+
+# VPS 流结束帧（不带会话 ID）
+_DONE = b'data: {"type":"done"}\n\n'
+
+
+async def _iter_json_lines(stdout: asyncio.StreamReader, timeout: Optional[float]):
+    """
+    按块读取子进程输出，在进程内切分行
+
+    readline() 每次都要在 StreamReader 缓冲区里逐行查找分隔符，
+    对 Claude CLI 的高频 JSON 行输出开销较大；这里一次读取 64KB，
+    含换行的块用 bytes.split 在 C 中一次切出所有完整行，未完整的行留到下一块继续拼接。
+    单行超过 STREAM_LIMIT 时丢弃该行（直到下一个换行），不中断整个流。
+
+    Yields:
+        完整的一行 (bytes，不含换行符)；每块数据切分完后产出 b"" 作为批次边界；
+        读取超时时产出 None（timeout 为 None 时不超时）
+    """
+    buf = bytearray()
+    skipping = False  # 正在丢弃超长行的剩余部分
+    while True:
+        try:
+            chunk = await asyncio.wait_for(stdout.read(READ_CHUNK_SIZE), timeout=timeout)
+        except asyncio.TimeoutError:
+            yield None
+            continue
+
+        if not chunk:
+            break
+
+        buf += chunk
+        if b'\n' in chunk:
+            lines = bytes(buf).split(b'\n')
+            # 最后一段是尚未完整的行
+            buf = bytearray(lines.pop())
+            if skipping:
+                # 第一段是被丢弃的超长行的剩余部分
+                del lines[0]
+                skipping = False
+            for line in lines:
+                yield line
+        elif skipping:
+            buf.clear()
+            continue
+
+        if len(buf) > STREAM_LIMIT:
+            logger.warning(f"子进程输出单行超过 {STREAM_LIMIT} 字节，已丢弃")
+            buf.clear()
+            skipping = True
+
+        # 当前块已切分完，下一次读取可能阻塞
+        yield b""
+
+    # 输出结束时没有换行的最后一行
+    if buf and not skipping:
+        yield bytes(buf)
+
+
+async def _pump_events(stdout: asyncio.StreamReader, queue: asyncio.Queue):
+    """
+    生产者：读取子进程 stdout，把解析好的 JSON 事件放入队列，输出结束时放入 None
+
+    与负责组帧、写出的 SSE 生成器解耦，客户端写得慢时这里仍可继续读取和解析，
+    队列满了才反压到管道。
+    """
+    try:
+        async for line_bytes in _iter_json_lines(stdout, timeout=None):
+            if not line_bytes or line_bytes[:1] != b'{':
+                continue
+            # 先在原始 bytes 上判断事件类型，SSE 不转发的事件（stream_event 等）不做完整解析
+            if not (b'"type":"assistant"' in line_bytes
+                    or b'"type":"user"' in line_bytes
+                    or b'"type":"system"' in line_bytes
+                    or b'"type":"result"' in line_bytes):
+                continue
+            # orjson 直接解析 bytes，行尾 unbuffer 带来的 \r 属于 JSON 空白，无需 strip
+            try:
+                await queue.put(_loads(line_bytes))
+            except json.JSONDecodeError:
+                pass
+    except Exception as e:
+        logger.error(f"读取 Claude CLI 输出失败: {e}")
+    await queue.put(None)
+
+
+async def _pump_keepalive(queue: asyncio.Queue):
+    """定时向事件队列放入心跳帧，直到被取消"""
+    while True:
+        await asyncio.sleep(KEEPALIVE_INTERVAL)
+        try:
+            queue.put_nowait(_KEEPALIVE)
+        except asyncio.QueueFull:
+            # 队列已满说明正有大量事件待发送，本轮无需心跳
+            pass
+
+
+async def _drain_stderr(stderr: asyncio.StreamReader):
+    """
+    持续读取子进程 stderr 并写入日志
+
+    stderr 是 PIPE 时若没人读取，管道缓冲区写满后子进程会阻塞在写操作上，
+    stdout 也随之停止输出，最终只能等超时。
+    """
+    while True:
+        chunk = await stderr.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        logger.debug(f"Claude CLI stderr: {chunk.decode('utf-8', errors='replace').rstrip()}")
 
 
 def _make_vps_sse_stream(prompt: str, session_id: Optional[str], model: str, mode: str):
@@ -154,7 +451,7 @@ def _make_vps_sse_stream(prompt: str, session_id: Optional[str], model: str, mod
 
     async def event_stream():
         # 发送心跳
-        yield ": keepalive\n\n"
+        yield _KEEPALIVE
 
         headers = {"Content-Type": "application/json"}
         if VPS_API_TOKEN:
@@ -168,38 +465,38 @@ def _make_vps_sse_stream(prompt: str, session_id: Optional[str], model: str, mod
         }
 
         try:
-            timeout = aiohttp.ClientTimeout(total=600)  # 10 分钟超时
-            async with aiohttp.ClientSession(timeout=timeout) as http_session:
-                async with http_session.post(
-                    f"{VPS_API_URL}/api/agent/run",
-                    json=payload,
-                    headers=headers,
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        yield f"data: {json.dumps({'type': 'error', 'message': f'VPS API error: {response.status} - {error_text}'})}\n\n"
-                        return
-
-                    # 转发 SSE 流
-                    async for line in response.content:
-                        line_text = line.decode('utf-8', errors='replace')
-                        if line_text.strip():
-                            yield line_text
-                            if not line_text.endswith('\n'):
-                                yield '\n'
+            # 复用全局会话的连接池（读超时 10 分钟）
+            async with app.state.http.post(
+                f"{VPS_API_URL}/api/agent/run",
+                json=payload,
+                headers=headers,
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    yield _VPS_ERROR_PREFIX + _dumps(f'VPS API error: {response.status} - {error_text}') + _FRAME_END
+                    return
+
+                # 上游已是 SSE 帧，按 TCP 块原样透传 bytes，不逐行切分也不解码
+                async for chunk in response.content.iter_any():
+                    yield chunk
 
         except aiohttp.ClientError as e:
-            yield f"data: {json.dumps({'type': 'error', 'message': f'VPS connection error: {str(e)}'})}\n\n"
+            yield _VPS_ERROR_PREFIX + _dumps(f'VPS connection error: {str(e)}') + _FRAME_END
         except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'message': f'VPS error: {str(e)}'})}\n\n"
+            yield _VPS_ERROR_PREFIX + _dumps(f'VPS error: {str(e)}') + _FRAME_END
 
-        yield "data: {\"type\": \"done\"}\n\n"
+        yield _DONE
 
     return event_stream()
 
 
-def _make_claude_sse_stream(prompt: str, session_id: Optional[str], model: str, mode: str):
-    """创建 Claude CLI SSE 流 - 兼容 WorkAny 前端消息格式"""
+def _make_claude_sse_stream(prompt: str, session_id: Optional[str], model: str, mode: str,
+                            request: Optional[Request] = None):
+    """
+    创建 Claude CLI SSE 流 - 兼容 WorkAny 前端消息格式
+
+    传入 request 时会定期检查客户端是否已断开，断开后立即结束流并终止 Claude CLI 进程
+    """
 
     async def event_stream():
         if not session_id:
@@ -211,295 +508,413 @@ def _make_claude_sse_stream(prompt: str, session_id: Optional[str], model: str,
         cmd = claude_executor.build_command(prompt, active_id, model, mode)
 
         # 立即发送心跳，防止连接被判定为断开
-        yield ": keepalive\n\n"
+        yield _KEEPALIVE
+        # 每次 yield 后让出事件循环，确保 ASGI 服务器及时把数据写出，而不是攒批发送
+        await asyncio.sleep(0)
 
         process = await asyncio.create_subprocess_exec(
             *cmd,
-            stdin=asyncio.subprocess.PIPE,
+            stdin=asyncio.subprocess.DEVNULL,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
             cwd=work_dir,
-            env=claude_executor.build_claude_env(),
-            limit=16 * 1024 * 1024
+            env=_claude_env(),
+            limit=STREAM_LIMIT
         )
+        stderr_task = asyncio.create_task(_drain_stderr(process.stderr))
+        # 生产者负责读管道和解析 JSON，这里只负责组帧和写出
+        queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        producer = asyncio.create_task(_pump_events(process.stdout, queue))
+        # 心跳由独立任务定时放入同一队列，读取时无需再为每次 get 设置超时
+        keepalive = asyncio.create_task(_pump_keepalive(queue))
 
         new_session_id = active_id
         accumulated_text = ""
 
-        # 追踪进程
-        track_id = new_session_id or "default"
-        _active_processes[track_id] = process
+        # 追踪进程（无会话 ID 时等 system 事件返回后再登记）
+        track_id = active_id
+        if track_id:
+            async with _active_processes_lock:
+                _active_processes[track_id] = process
+
+        # 连续的 text 块先暂存，合并成一帧再发送，减少 JSON 编码和写次数
+        loop = asyncio.get_running_loop()
+        pending_text = []
+        last_flush = loop.time()
+
+        def flush_text():
+            """取出暂存的 text 并组帧，没有暂存时返回 None"""
+            nonlocal last_flush
+            last_flush = loop.time()
+            if not pending_text:
+                return None
+            frame = _TEXT_PREFIX + _dumps(''.join(pending_text)) + _FRAME_END
+            pending_text.clear()
+            return frame
 
         try:
+            iterations = 0
             while True:
-                try:
-                    # 每 5 秒超时一次，发送心跳保持连接
-                    line_bytes = await asyncio.wait_for(
-                        process.stdout.readline(), timeout=5
-                    )
-                except asyncio.TimeoutError:
-                    # 进程还在运行则发送心跳，否则退出
-                    if process.returncode is None:
-                        yield ": keepalive\n\n"
-                        continue
-                    else:
-                        break
+                event = await queue.get()
 
-                if not line_bytes:
+                if event is None:
                     break
 
-                line_text = line_bytes.decode('utf-8', errors='replace').strip()
-                if not line_text:
+                if event is _KEEPALIVE:
+                    # 进程已退出（stdout 可能被孙进程占用而迟迟不到 EOF）或客户端已断开则结束
+                    if process.returncode is not None:
+                        break
+                    if request is not None and await request.is_disconnected():
+                        logger.info("SSE 客户端已断开，终止 Claude CLI 进程")
+                        return
+                    # 心跳说明一段时间没有新事件，暂存的 text 不能等到下一个事件才发
+                    frame = flush_text()
+                    if frame:
+                        yield frame
+                    yield _KEEPALIVE
+                    await asyncio.sleep(0)
                     continue
 
-                if line_text.startswith('{'):
-                    try:
-                        event = json.loads(line_text)
-                        event_type = event.get("type", "")
+                iterations += 1
+                if request is not None and iterations % DISCONNECT_CHECK_INTERVAL == 0:
+                    if await request.is_disconnected():
+                        logger.info("SSE 客户端已断开，终止 Claude CLI 进程")
+                        return
 
-                        if event_type == "system":
-                            sid = event.get("session_id")
-                            if sid:
-                                new_session_id = sid
+                event_type = event.get("type", "")
+
+                if event_type == "system":
+                    sid = event.get("session_id")
+                    if sid:
+                        new_session_id = sid
+                        if sid != track_id:
+                            # 改登记到 CLI 返回的会话 ID
+                            async with _active_processes_lock:
+                                if track_id and _active_processes.get(track_id) is process:
+                                    del _active_processes[track_id]
                                 _active_processes[sid] = process
-                            yield f"data: {json.dumps({'type': 'session', 'sessionId': sid})}\n\n"
-
-                        elif event_type == "assistant":
-                            message = event.get("message", {})
-                            for block in message.get("content", []):
-                                if block.get("type") == "text":
-                                    text = block.get("text", "")
-                                    accumulated_text += text
-                                    yield f"data: {json.dumps({'type': 'text', 'content': text})}\n\n"
-                                elif block.get("type") == "tool_use":
-                                    yield f"data: {json.dumps({'type': 'tool_use', 'name': block.get('name', ''), 'input': block.get('input', {}), 'toolUseId': block.get('id', '')})}\n\n"
-
-                        elif event_type == "user":
-                            for block in event.get("content", []):
-                                if block.get("type") == "tool_result":
-                                    yield f"data: {json.dumps({'type': 'tool_result', 'toolUseId': block.get('tool_use_id', ''), 'output': str(block.get('content', ''))[:500]})}\n\n"
-
-                        elif event_type == "result":
-                            result_text = event.get("result", "")
-                            if result_text and not accumulated_text.strip():
-                                accumulated_text = result_text
-                            yield f"data: {json.dumps({'type': 'done', 'sessionId': new_session_id})}\n\n"
-
-                    except json.JSONDecodeError:
-                        pass
+                            track_id = sid
+                    yield _SESSION_PREFIX + _dumps(sid) + _FRAME_END
+                    await asyncio.sleep(0)
+
+                elif event_type == "assistant":
+                    message = event.get("message", {})
+                    for block in message.get("content", []):
+                        if block.get("type") == "text":
+                            text = block.get("text", "")
+                            accumulated_text += text
+                            pending_text.append(text)
+                            if (len(pending_text) >= TEXT_FLUSH_MAX_BLOCKS
+                                    or loop.time() - last_flush > TEXT_FLUSH_INTERVAL):
+                                yield flush_text()
+                                await asyncio.sleep(0)
+                        elif block.get("type") == "tool_use":
+                            frame = flush_text()
+                            if frame:
+                                yield frame
+                                await asyncio.sleep(0)
+                            yield (_TOOL_USE_PREFIX + _dumps(block.get('name', ''))
+                                   + b',"input":' + _dumps(block.get('input', {}))
+                                   + b',"toolUseId":' + _dumps(block.get('id', '')) + _FRAME_END)
+                            await asyncio.sleep(0)
+
+                elif event_type == "user":
+                    for block in event.get("content", []):
+                        if block.get("type") == "tool_result":
+                            frame = flush_text()
+                            if frame:
+                                yield frame
+                                await asyncio.sleep(0)
+                            yield (_TOOL_RESULT_PREFIX + _dumps(block.get('tool_use_id', ''))
+                                   + b',"output":' + _dumps(str(block.get('content', ''))[:500]) + _FRAME_END)
+                            await asyncio.sleep(0)
+
+                elif event_type == "result":
+                    frame = flush_text()
+                    if frame:
+                        yield frame
+                        await asyncio.sleep(0)
+                    result_text = event.get("result", "")
+                    if result_text and not accumulated_text.strip():
+                        accumulated_text = result_text
+                    yield _DONE_PREFIX + _dumps(new_session_id) + _FRAME_END
+                    await asyncio.sleep(0)
+
+                if queue.empty():
+                    # 暂时没有更多事件，先把暂存的 text 发出去
+                    frame = flush_text()
+                    if frame:
+                        yield frame
+                        await asyncio.sleep(0)
+
+            frame = flush_text()
+            if frame:
+                yield frame
+                await asyncio.sleep(0)
 
             await process.wait()
-            yield f"data: {json.dumps({'type': 'done', 'sessionId': new_session_id})}\n\n"
+            yield _DONE_PREFIX + _dumps(new_session_id) + _FRAME_END
+            await asyncio.sleep(0)
 
         except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'content': str(e)})}\n\n"
+            yield _ERROR_PREFIX + _dumps(str(e)) + _FRAME_END
+            await asyncio.sleep(0)
         finally:
-            _active_processes.pop(track_id, None)
-            _active_processes.pop(new_session_id or "", None)
+            if track_id:
+                async with _active_processes_lock:
+                    # 同一会话可能已被新的运行覆盖，只移除自己登记的进程
+                    if _active_processes.get(track_id) is process:
+                        del _active_processes[track_id]
             if process.returncode is None:
                 process.terminate()
                 await process.wait()
+            producer.cancel()
+            keepalive.cancel()
+            stderr_task.cancel()
+            await asyncio.gather(producer, keepalive, stderr_task, return_exceptions=True)
 
     return event_stream()
 
 
+# SSE 响应头：禁止缓存，并关闭 Nginx 等反向代理的缓冲
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+@lru_cache(maxsize=1)
+def _event_source_response_cls():
+    """探测 sse-starlette 是否可用，不可用时返回 None"""
+    try:
+        from sse_starlette.sse import EventSourceResponse
+    except ImportError:
+        return None
+    return EventSourceResponse
+
+
 def _sse_response(stream):
-    """构造 SSE 响应"""
+    """
+    构造 SSE 响应（优先使用 sse-starlette，自带 ping 与断连检测）
+
+    流产出的都是预先组帧的 bytes，EventSourceResponse 与 StreamingResponse 均原样透传
+    """
+    event_source_response = _event_source_response_cls()
+    if event_source_response is not None:
+        return event_source_response(stream, ping=15, headers=SSE_HEADERS)
+
     return StreamingResponse(
         stream,
         media_type="text/event-stream",
-        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
+        headers=SSE_HEADERS
     )
 
 
-def _get_stream(prompt: str, session_id: Optional[str], model: str, mode: str):
+# 用户默认模型缓存 (user_id -> model)，设置变更时失效
+_user_model_cache: Dict[int, str] = {}
+
+
+def get_default_model() -> str:
+    """获取桌面用户的默认模型（带缓存）"""
+    model = _user_model_cache.get(DESKTOP_USER_ID)
+    if model is None:
+        model = _user_model_cache[DESKTOP_USER_ID] = session_manager.get_user_model(DESKTOP_USER_ID)
+    return model
+
+
+def _get_stream(prompt: str, session_id: Optional[str], model: str, mode: str,
+                request: Optional[Request] = None):
     """根据执行目标返回对应的 SSE 流"""
     target = session_manager.get_execution_target(DESKTOP_USER_ID)
     if target == "vps":
         return _make_vps_sse_stream(prompt, session_id, model, mode)
     else:
-        return _make_claude_sse_stream(prompt, session_id, model, mode)
+        return _make_claude_sse_stream(prompt, session_id, model, mode, request)
 
 
-# WorkAny 兼容端点: POST /agent (直接执行)
-@app.post("/agent")
-async def agent_direct(data: Dict[str, Any], _: bool = Depends(verify_token)):
-    """直接执行 - 兼容 WorkAny useAgent.ts"""
-    prompt = data.get("prompt", "")
-    model_config = data.get("modelConfig") or {}
-    model = model_config.get("model", session_manager.get_user_model(DESKTOP_USER_ID))
-    if model not in AVAILABLE_MODELS:
-        model = session_manager.get_user_model(DESKTOP_USER_ID)
-
-    if not prompt:
+def _run_agent(request: Request, body: AgentBody, mode: str):
+    """WorkAny /agent* 端点的统一处理：校验参数、解析模型并返回 SSE 流"""
+    if not body.prompt:
         raise HTTPException(status_code=400, detail="prompt is required")
 
-    stream = _get_stream(prompt, None, model, "auto")
+    model = body.modelConfig.model if body.modelConfig else None
+    if model not in AVAILABLE_MODELS:
+        model = get_default_model()
+
+    stream = _get_stream(body.prompt, None, model, mode, request)
     return _sse_response(stream)
 
 
+# WorkAny 兼容端点: POST /agent (直接执行)
+@app.post("/agent")
+async def agent_direct(request: Request, body: AgentBody, _: bool = Depends(require_token)):
+    """直接执行 - 兼容 WorkAny useAgent.ts"""
+    return _run_agent(request, body, "auto")
+
+
 # WorkAny 兼容端点: POST /agent/plan (生成计划)
 @app.post("/agent/plan")
-async def agent_plan(data: Dict[str, Any], _: bool = Depends(verify_token)):
+async def agent_plan(request: Request, body: AgentBody, _: bool = Depends(require_token)):
     """规划模式 - 使用 Claude plan mode"""
-    prompt = data.get("prompt", "")
-    model_config = data.get("modelConfig") or {}
-    model = model_config.get("model", session_manager.get_user_model(DESKTOP_USER_ID))
-    if model not in AVAILABLE_MODELS:
-        model = session_manager.get_user_model(DESKTOP_USER_ID)
-
-    if not prompt:
-        raise HTTPException(status_code=400, detail="prompt is required")
-
-    stream = _get_stream(prompt, None, model, "plan")
-    return _sse_response(stream)
+    return _run_agent(request, body, "plan")
 
 
 # WorkAny 兼容端点: POST /agent/execute (执行已批准计划)
 @app.post("/agent/execute")
-async def agent_execute(data: Dict[str, Any], _: bool = Depends(verify_token)):
+async def agent_execute(request: Request, body: AgentBody, _: bool = Depends(require_token)):
     """执行计划 - 实际上 CloudWork 直接用 auto 模式"""
-    prompt = data.get("prompt", "")
-    model_config = data.get("modelConfig") or {}
-    model = model_config.get("model", session_manager.get_user_model(DESKTOP_USER_ID))
-    if model not in AVAILABLE_MODELS:
-        model = session_manager.get_user_model(DESKTOP_USER_ID)
-
-    if not prompt:
-        raise HTTPException(status_code=400, detail="prompt is required")
-
-    stream = _get_stream(prompt, None, model, "auto")
-    return _sse_response(stream)
+    return _run_agent(request, body, "auto")
 
 
 # WorkAny 兼容端点: POST /agent/stop/{session_id}
 @app.post("/agent/stop/{session_id}")
 async def agent_stop_session(session_id: str):
     """停止指定会话"""
-    process = _active_processes.get(session_id)
+    async with _active_processes_lock:
+        process = _active_processes.pop(session_id, None)
     if process and process.returncode is None:
         process.terminate()
         await process.wait()
-        _active_processes.pop(session_id, None)
         return {"status": "ok", "stopped": session_id}
-    return {"status": "not_found"}
+    return _STATUS_NOT_FOUND
 
 
 # WorkAny 兼容端点: POST /agent/permission
 @app.post("/agent/permission")
-async def agent_permission(data: Dict[str, Any]):
+async def agent_permission(body: PermissionBody):
     """权限响应 - CloudWork auto 模式无需权限"""
-    return {"status": "ok"}
+    return _STATUS_OK
 
 
 # CloudWork 自有端点
 @app.post("/api/agent/run")
-async def agent_run(data: Dict[str, Any], _: bool = Depends(verify_token)):
+async def agent_run(request: Request, body: AgentRunBody, _: bool = Depends(require_token)):
     """CloudWork 原生执行端点"""
-    prompt = data.get("prompt", "")
-    session_id = data.get("session_id")
-    model = data.get("model", session_manager.get_user_model(DESKTOP_USER_ID))
-    mode = data.get("mode", "auto")
-
-    if not prompt:
+    if not body.prompt:
         raise HTTPException(status_code=400, detail="prompt is required")
 
-    stream = _get_stream(prompt, session_id, model, mode)
+    model = body.model or get_default_model()
+    stream = _get_stream(body.prompt, body.session_id, model, body.mode, request)
     return _sse_response(stream)
 
 
 @app.post("/api/agent/stop")
 async def agent_stop():
     """停止所有执行"""
+    global _active_processes
+    # 锁内直接换成新字典，旧字典整体归本次调用处理，不复制也不逐项删除
+    async with _active_processes_lock:
+        processes, _active_processes = _active_processes, {}
     stopped = 0
-    for sid, process in list(_active_processes.items()):
+    for process in processes.values():
         if process.returncode is None:
             process.terminate()
             stopped += 1
-    _active_processes.clear()
+    # 并发等待所有进程退出，避免留下僵尸进程
+    await asyncio.gather(*(p.wait() for p in processes.values()), return_exceptions=True)
     return {"status": "ok", "cancelled": stopped}
 
 
 # =================== Provider 兼容层 ===================
 # WorkAny 前端调用的 Provider API
 
+_PROVIDER_AGENTS = _static_json({
+    "current": "claude-cli",
+    "available": [
+        {"type": "claude-cli", "name": "Claude CLI", "description": "CloudWork Claude CLI executor"}
+    ]
+})
+_PROVIDER_AGENTS_AVAILABLE = _static_json([{"type": "claude-cli", "name": "Claude CLI"}])
+_PROVIDER_SANDBOX = _static_json({"current": "native", "available": [{"type": "native", "name": "Native (VPS)"}]})
+_PROVIDER_SANDBOX_AVAILABLE = _static_json([{"type": "native", "name": "Native (VPS)"}])
+_PROVIDER_CONFIG = _static_json({"agentProvider": "claude-cli", "sandboxProvider": "native"})
+
+
 @app.get("/providers/agents")
 async def get_agent_providers():
     """Agent 提供商列表 - 返回 CloudWork 作为唯一提供商"""
-    return {
-        "current": "claude-cli",
-        "available": [
-            {"type": "claude-cli", "name": "Claude CLI", "description": "CloudWork Claude CLI executor"}
-        ]
-    }
+    return _PROVIDER_AGENTS
 
 
 @app.get("/providers/agents/available")
 async def get_available_agents():
-    return [{"type": "claude-cli", "name": "Claude CLI"}]
+    return _PROVIDER_AGENTS_AVAILABLE
 
 
 @app.get("/providers/sandbox")
 async def get_sandbox_providers():
     """沙箱提供商 - CloudWork 不使用沙箱"""
-    return {"current": "native", "available": [{"type": "native", "name": "Native (VPS)"}]}
+    return _PROVIDER_SANDBOX
 
 
 @app.get("/providers/sandbox/available")
 async def get_available_sandbox():
-    return [{"type": "native", "name": "Native (VPS)"}]
+    return _PROVIDER_SANDBOX_AVAILABLE
 
 
 @app.post("/providers/settings/sync")
-async def sync_provider_settings(data: Dict[str, Any] = None):
+async def sync_provider_settings(body: Optional[ProviderSettingsBody] = None):
     """同步设置"""
-    return {"status": "ok"}
+    return _STATUS_OK
 
 
 @app.get("/providers/config")
 async def get_provider_config():
-    return {"agentProvider": "claude-cli", "sandboxProvider": "native"}
+    return _PROVIDER_CONFIG
 
 
 # =================== 健康检查兼容 ===================
 
+_HEALTH_DEPENDENCIES = _static_json({"dependencies": [], "allInstalled": True})
+
+
 @app.get("/health/dependencies")
 async def health_dependencies():
     """依赖检查"""
-    return {"dependencies": [], "allInstalled": True}
+    return _HEALTH_DEPENDENCIES
 
 
 # =================== 文件兼容端点 ===================
 
+def _scan_dir(target: str, path: str) -> list:
+    """列出目录内容（DirEntry 自带文件类型，无需逐项 stat），目录不存在时返回空列表"""
+    entries = []
+    try:
+        it = os.scandir(target)
+    except FileNotFoundError:
+        return entries
+    with it:
+        for entry in sorted(it, key=lambda e: e.name):
+            if entry.name.startswith('.'):
+                continue
+            entries.append({
+                "name": entry.name,
+                "isDirectory": entry.is_dir(),
+                "path": os.path.join(path, entry.name) if path else entry.name
+            })
+    return entries
+
+
 @app.post("/files/readdir")
-async def files_readdir(data: Dict[str, Any] = None):
+async def files_readdir(body: Optional[ReaddirBody] = None):
     """读取目录"""
-    path = data.get("path", "") if data else ""
+    path = body.path if body else ""
     work_dir = claude_executor.get_user_project_dir(DESKTOP_USER_ID)
     target = os.path.join(work_dir, path) if path else work_dir
 
-    if not os.path.exists(target):
-        return {"entries": []}
+    # 放到线程池执行，避免慢磁盘阻塞事件循环
+    entries = await asyncio.to_thread(_scan_dir, target, path)
+    return {"entries": entries}
 
-    entries = []
-    for item in sorted(os.listdir(target)):
-        if item.startswith('.'):
-            continue
-        full_path = os.path.join(target, item)
-        entries.append({
-            "name": item,
-            "isDirectory": os.path.isdir(full_path),
-            "path": os.path.join(path, item) if path else item
-        })
 
-    return {"entries": entries}
+_SKILLS_DIR = _static_json({"path": os.path.join(cloudwork_root, "skills")})
 
 
 @app.get("/files/skills-dir")
 async def files_skills_dir():
     """技能目录"""
-    skills_dir = os.path.join(cloudwork_root, "skills")
-    return {"path": skills_dir}
+    return _SKILLS_DIR
 
 
 # =================== MCP 兼容端点 ===================
@@ -508,9 +923,54 @@ async def files_skills_dir():
 LOCAL_CLAUDE_DIR = os.path.expanduser("~/.claude")
 VPS_CLAUDE_DIR = "/home/claude/.claude"
 
+# 本地 MCP 相关路径
+LOCAL_SETTINGS_PATH = os.path.join(LOCAL_CLAUDE_DIR, "settings.json")
+LOCAL_SKILLS_DIR = os.path.join(LOCAL_CLAUDE_DIR, "commands")
+PLUGINS_CACHE_DIR = os.path.join(LOCAL_CLAUDE_DIR, "plugins", "cache")
+MARKETPLACES_DIR = os.path.join(LOCAL_CLAUDE_DIR, "plugins", "marketplaces")
+MCP_SERVERS_DIR = os.path.join(LOCAL_CLAUDE_DIR, "mcp-servers")
+
+# 本地配置扫描结果缓存 (名称 -> (mtime 键, 生成时间, 结果))
+# 以扫描根路径的 mtime 判断是否变化；深层文件的修改不会改变根目录 mtime，另设 TTL 兜底
+FS_CACHE_TTL = 30
+_fs_cache: Dict[str, Tuple[tuple, float, Any]] = {}
+
+
+def _mtimes(*paths: str) -> tuple:
+    """各路径的 mtime（不存在时为 0），作为缓存键"""
+    result = []
+    for path in paths:
+        try:
+            result.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            result.append(0)
+    return tuple(result)
+
+
+def _fs_cache_get(name: str, key: tuple):
+    """mtime 键一致且未超过 TTL 时返回缓存结果，否则返回 None"""
+    cached = _fs_cache.get(name)
+    if cached and cached[0] == key and time.monotonic() - cached[1] < FS_CACHE_TTL:
+        return cached[2]
+    return None
+
+
+def _cached_by_mtime(name: str, paths: tuple, compute):
+    """路径 mtime 未变且未超过 TTL 时返回缓存结果，否则重新计算"""
+    key = _mtimes(*paths)
+    value = _fs_cache_get(name, key)
+    if value is None:
+        value = compute()
+        _fs_cache[name] = (key, time.monotonic(), value)
+    return value
+
+
 def get_local_mcp_config():
-    """读取本地 MCP 配置（从 settings.json）"""
-    settings_path = os.path.join(LOCAL_CLAUDE_DIR, "settings.json")
+    """读取本地 MCP 配置（从 settings.json，按 mtime 缓存）"""
+    return _cached_by_mtime("mcp_config", (LOCAL_SETTINGS_PATH,), _read_local_mcp_config)
+
+def _read_local_mcp_config():
+    settings_path = LOCAL_SETTINGS_PATH
     if os.path.exists(settings_path):
         try:
             with open(settings_path, 'r') as f:
@@ -519,98 +979,105 @@ def get_local_mcp_config():
             pass
     return {}
 
-def get_local_mcp_servers():
-    """收集本地所有 MCP 服务器配置"""
+def _subdirs(path: str) -> list:
+    """列出目录下的子目录（DirEntry 自带文件类型，无需逐项 stat），目录不存在时返回空列表"""
+    try:
+        with os.scandir(path) as it:
+            return [entry for entry in it if entry.is_dir()]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+def _merge_mcp_json(mcp_json: str, servers: dict):
+    """读取 .mcp.json 合并到 servers，文件不存在或解析失败时忽略"""
+    try:
+        # 以 bytes 读取后直接交给 orjson 解析，省去文本解码层
+        with open(mcp_json, 'rb') as f:
+            mcp_config = _loads(f.read())
+    except:
+        return
+    # 处理两种格式: {"mcpServers": {...}} 或直接 {"server_name": {...}}
+    if isinstance(mcp_config, dict) and "mcpServers" in mcp_config:
+        mcp_config = mcp_config["mcpServers"]
+    if isinstance(mcp_config, dict):
+        servers.update(mcp_config)
+
+def _scan_plugins_cache() -> dict:
+    """从插件缓存目录收集 MCP 服务器"""
     servers = {}
+    for org in _subdirs(PLUGINS_CACHE_DIR):
+        for plugin in _subdirs(org.path):
+            # 遍历版本目录，查找 .mcp.json 文件
+            for version in _subdirs(plugin.path):
+                _merge_mcp_json(os.path.join(version.path, ".mcp.json"), servers)
+    return servers
 
-    # 1. 从插件缓存目录收集 MCP 服务器
-    plugins_cache = os.path.join(LOCAL_CLAUDE_DIR, "plugins", "cache")
-    if os.path.exists(plugins_cache):
-        for org_dir in os.listdir(plugins_cache):
-            org_path = os.path.join(plugins_cache, org_dir)
-            if not os.path.isdir(org_path):
-                continue
-            for plugin_dir in os.listdir(org_path):
-                plugin_path = os.path.join(org_path, plugin_dir)
-                if not os.path.isdir(plugin_path):
-                    continue
-                # 遍历版本目录
-                for version_dir in os.listdir(plugin_path):
-                    version_path = os.path.join(plugin_path, version_dir)
-                    if not os.path.isdir(version_path):
-                        continue
-                    # 查找 .mcp.json 文件
-                    mcp_json = os.path.join(version_path, ".mcp.json")
-                    if os.path.exists(mcp_json):
-                        try:
-                            with open(mcp_json, 'r') as f:
-                                mcp_config = json.load(f)
-                                # 处理两种格式
-                                if "mcpServers" in mcp_config:
-                                    servers.update(mcp_config["mcpServers"])
-                                else:
-                                    servers.update(mcp_config)
-                        except:
-                            pass
-
-    # 2. 从 marketplaces 外部插件目录收集 MCP 服务器
-    marketplaces_dir = os.path.join(LOCAL_CLAUDE_DIR, "plugins", "marketplaces")
-    if os.path.exists(marketplaces_dir):
-        for marketplace in os.listdir(marketplaces_dir):
-            external_plugins = os.path.join(marketplaces_dir, marketplace, "external_plugins")
-            if not os.path.exists(external_plugins):
-                continue
-            for plugin_name in os.listdir(external_plugins):
-                plugin_path = os.path.join(external_plugins, plugin_name)
-                if not os.path.isdir(plugin_path):
-                    continue
-                mcp_json = os.path.join(plugin_path, ".mcp.json")
-                if os.path.exists(mcp_json):
-                    try:
-                        with open(mcp_json, 'r') as f:
-                            mcp_config = json.load(f)
-                            # 处理两种格式: {"mcpServers": {...}} 或直接 {"server_name": {...}}
-                            if "mcpServers" in mcp_config:
-                                servers.update(mcp_config["mcpServers"])
-                            else:
-                                servers.update(mcp_config)
-                    except:
-                        pass
-
-    # 3. 从 mcp-servers 目录收集自定义 MCP 服务器
-    mcp_servers_dir = os.path.join(LOCAL_CLAUDE_DIR, "mcp-servers")
-    if os.path.exists(mcp_servers_dir):
-        for server_name in os.listdir(mcp_servers_dir):
-            server_path = os.path.join(mcp_servers_dir, server_name)
-            if not os.path.isdir(server_path):
-                continue
-            # 跳过隐藏文件和非目录
-            if server_name.startswith('.'):
-                continue
-            # 检查是否有 server.py（Python MCP 服务器）
-            if os.path.exists(os.path.join(server_path, "server.py")):
-                servers[server_name] = {
-                    "command": "python",
-                    "args": [os.path.join(server_path, "server.py")]
-                }
-            # 检查是否有 dist/index.js（编译后的 TypeScript）
-            elif os.path.exists(os.path.join(server_path, "dist", "index.js")):
-                servers[server_name] = {
-                    "command": "node",
-                    "args": [os.path.join(server_path, "dist", "index.js")]
-                }
-            # 检查是否有 index.js（Node MCP 服务器）
-            elif os.path.exists(os.path.join(server_path, "index.js")):
-                servers[server_name] = {
-                    "command": "node",
-                    "args": [os.path.join(server_path, "index.js")]
-                }
+def _scan_marketplaces() -> dict:
+    """从 marketplaces 外部插件目录收集 MCP 服务器"""
+    servers = {}
+    for marketplace in _subdirs(MARKETPLACES_DIR):
+        for plugin in _subdirs(os.path.join(marketplace.path, "external_plugins")):
+            _merge_mcp_json(os.path.join(plugin.path, ".mcp.json"), servers)
+    return servers
+
+def _scan_mcp_servers_dir() -> dict:
+    """从 mcp-servers 目录收集自定义 MCP 服务器"""
+    servers = {}
+    for server in _subdirs(MCP_SERVERS_DIR):
+        # 跳过隐藏目录
+        if server.name.startswith('.'):
+            continue
+        server_path = server.path
+        try:
+            with os.scandir(server_path) as it:
+                names = {entry.name for entry in it}
+        except OSError:
+            continue
+        # 检查是否有 server.py（Python MCP 服务器）
+        if "server.py" in names:
+            servers[server.name] = {
+                "command": "python",
+                "args": [os.path.join(server_path, "server.py")]
+            }
+        # 检查是否有 dist/index.js（编译后的 TypeScript）
+        elif "dist" in names and os.path.exists(os.path.join(server_path, "dist", "index.js")):
+            servers[server.name] = {
+                "command": "node",
+                "args": [os.path.join(server_path, "dist", "index.js")]
+            }
+        # 检查是否有 index.js（Node MCP 服务器）
+        elif "index.js" in names:
+            servers[server.name] = {
+                "command": "node",
+                "args": [os.path.join(server_path, "index.js")]
+            }
 
     return servers
 
+async def get_local_mcp_servers():
+    """
+    收集本地所有 MCP 服务器配置
+
+    三个来源互不依赖，分别放到线程池并发扫描；结果按扫描根目录的 mtime 缓存
+    """
+    key = _mtimes(PLUGINS_CACHE_DIR, MARKETPLACES_DIR, MCP_SERVERS_DIR)
+    servers = _fs_cache_get("mcp_servers", key)
+    if servers is None:
+        plugins, marketplaces, custom = await asyncio.gather(
+            asyncio.to_thread(_scan_plugins_cache),
+            asyncio.to_thread(_scan_marketplaces),
+            asyncio.to_thread(_scan_mcp_servers_dir),
+        )
+        # 与原先依次 update 的覆盖顺序一致
+        servers = {**plugins, **marketplaces, **custom}
+        _fs_cache["mcp_servers"] = (key, time.monotonic(), servers)
+    return servers
+
 def get_local_skills():
-    """读取本地 Skills 列表"""
-    skills_dir = os.path.join(LOCAL_CLAUDE_DIR, "commands")
+    """读取本地 Skills 列表（按 commands 目录的 mtime 缓存）"""
+    return _cached_by_mtime("skills", (LOCAL_SKILLS_DIR,), _list_local_skills)
+
+def _list_local_skills():
+    skills_dir = LOCAL_SKILLS_DIR
     skills = []
     if os.path.exists(skills_dir):
         for f in os.listdir(skills_dir):
@@ -624,18 +1091,29 @@ def get_local_skills():
 async def get_vps_claude_config():
     """从 VPS 获取 Claude 配置"""
     try:
-        timeout = aiohttp.ClientTimeout(total=10)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            headers = {}
-            if VPS_API_TOKEN:
-                headers["Authorization"] = f"Bearer {VPS_API_TOKEN}"
-            async with session.get(f"{VPS_API_URL}/api/claude-config", headers=headers) as resp:
-                if resp.status == 200:
-                    return await resp.json()
+        headers = {}
+        if VPS_API_TOKEN:
+            headers["Authorization"] = f"Bearer {VPS_API_TOKEN}"
+        async with app.state.http.get(
+            f"{VPS_API_URL}/api/claude-config",
+            headers=headers,
+            timeout=VPS_CONFIG_TIMEOUT,
+        ) as resp:
+            if resp.status == 200:
+                return await resp.json()
     except:
         pass
     return {"mcp": {}, "skills": [], "claude_dir": VPS_CLAUDE_DIR}
 
+def _local_claude_config() -> Dict[str, Any]:
+    """本地 Claude 配置（同步读取，由调用方放到线程池执行）"""
+    return {
+        "target": "local",
+        "claude_dir": LOCAL_CLAUDE_DIR,
+        "mcp": get_local_mcp_config(),
+        "skills": get_local_skills(),
+    }
+
 @app.get("/api/claude-config")
 async def get_claude_config():
     """获取当前环境的 Claude 配置（MCP、Skills 等）"""
@@ -651,13 +1129,8 @@ async def get_claude_config():
             "skills": vps_config.get("skills", []),
         }
     else:
-        # 返回本地配置
-        return {
-            "target": "local",
-            "claude_dir": LOCAL_CLAUDE_DIR,
-            "mcp": get_local_mcp_config(),
-            "skills": get_local_skills(),
-        }
+        # 返回本地配置（读文件，放到线程池执行）
+        return await asyncio.to_thread(_local_claude_config)
 
 @app.get("/mcp/all-configs")
 async def mcp_all_configs():
@@ -671,7 +1144,7 @@ async def mcp_all_configs():
         claude_dir = VPS_CLAUDE_DIR
     else:
         # 获取本地 MCP 服务器
-        mcp_servers = get_local_mcp_servers()
+        mcp_servers = await get_local_mcp_servers()
         claude_dir = LOCAL_CLAUDE_DIR
 
     # 前端期望的格式
@@ -700,11 +1173,20 @@ EXECUTION_TARGETS = {
     "vps": "VPS (Bot)",
 }
 
+# 设置缓存 (user_id -> (生成时间, 响应))，更新设置时失效
+_settings_cache: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+
+
 @app.get("/api/settings")
 async def get_settings():
     """获取当前设置"""
-    return {
-        "model": session_manager.get_user_model(DESKTOP_USER_ID),
+    now = time.monotonic()
+    cached = _settings_cache.get(DESKTOP_USER_ID)
+    if cached and now - cached[0] < SNAPSHOT_CACHE_TTL:
+        return cached[1]
+
+    result = {
+        "model": get_default_model(),
         "mode": session_manager.get_user_execution_mode(DESKTOP_USER_ID),
         "project": session_manager.get_user_project(DESKTOP_USER_ID),
         "target": session_manager.get_execution_target(DESKTOP_USER_ID),
@@ -714,20 +1196,25 @@ async def get_settings():
         "available_targets": EXECUTION_TARGETS,
         "projects": list(claude_executor.projects.keys()),
     }
+    _settings_cache[DESKTOP_USER_ID] = (now, result)
+    return result
 
 
 @app.post("/api/settings")
-async def update_settings(data: Dict[str, Any]):
+async def update_settings(body: SettingsBody):
     """更新设置"""
-    if "model" in data:
-        session_manager.set_user_model(DESKTOP_USER_ID, data["model"])
-    if "mode" in data:
-        session_manager.set_user_execution_mode(DESKTOP_USER_ID, data["mode"])
-    if "project" in data:
-        session_manager.set_user_project(DESKTOP_USER_ID, data["project"])
-    if "target" in data:
-        session_manager.set_execution_target(DESKTOP_USER_ID, data["target"])
-    return {"status": "ok"}
+    if body.model is not None:
+        session_manager.set_user_model(DESKTOP_USER_ID, body.model)
+        _user_model_cache.pop(DESKTOP_USER_ID, None)
+    if body.mode is not None:
+        session_manager.set_user_execution_mode(DESKTOP_USER_ID, body.mode)
+    if body.project is not None:
+        session_manager.set_user_project(DESKTOP_USER_ID, body.project)
+    if body.target is not None:
+        session_manager.set_execution_target(DESKTOP_USER_ID, body.target)
+    _settings_cache.pop(DESKTOP_USER_ID, None)
+    _claude_env.cache_clear()
+    return _STATUS_OK
 
 
 # =================== Memory ===================
@@ -747,7 +1234,8 @@ async def search_memory(keyword: str):
     mm = get_memory_manager()
     if not mm:
         raise HTTPException(status_code=500, detail="Memory system not initialized")
-    results = mm.search(keyword)
+    # 记忆检索会扫描文件，放到线程池执行以免阻塞事件循环
+    results = await asyncio.to_thread(mm.search, keyword)
     return {"results": results}
 
 
@@ -757,7 +1245,7 @@ async def list_learned():
     mm = get_memory_manager()
     if not mm:
         raise HTTPException(status_code=500, detail="Memory system not initialized")
-    patterns = mm.list_learned()
+    patterns = await asyncio.to_thread(mm.list_learned)
     # 序列化 datetime
     for p in patterns:
         if "modified" in p:
@@ -771,7 +1259,7 @@ async def forget_preview():
     mm = get_memory_manager()
     if not mm:
         raise HTTPException(status_code=500, detail="Memory system not initialized")
-    candidates = mm.get_forgettable_memories(threshold=25.0)
+    candidates = await asyncio.to_thread(mm.get_forgettable_memories, threshold=25.0)
     return {"candidates": candidates}
 
 
@@ -781,7 +1269,7 @@ async def forget_confirm():
     mm = get_memory_manager()
     if not mm:
         raise HTTPException(status_code=500, detail="Memory system not initialized")
-    deleted = mm.forget(auto=True, threshold=25.0, dry_run=False)
+    deleted = await asyncio.to_thread(mm.forget, auto=True, threshold=25.0, dry_run=False)
     return {"deleted": deleted, "count": len(deleted)}
 
 
@@ -810,6 +1298,8 @@ async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = None):
     { "type": "ping" } → { "type": "pong" }
     { "type": "run", "prompt": "..." } → 流式结果
 
+    流式结果每条消息对应一个 Claude 事件（JSON 对象）
+
     认证: 通过 query param ?token=xxx 传递
     """
     # 验证 Token
@@ -837,36 +1327,40 @@ async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = None):
 
                 process = await asyncio.create_subprocess_exec(
                     *cmd,
-                    stdin=asyncio.subprocess.PIPE,
+                    stdin=asyncio.subprocess.DEVNULL,
                     stdout=asyncio.subprocess.PIPE,
                     stderr=asyncio.subprocess.PIPE,
                     cwd=work_dir,
-                    env=claude_executor.build_claude_env(),
-                    limit=16 * 1024 * 1024
+                    env=_claude_env(),
+                    limit=STREAM_LIMIT
                 )
+                # 持续读取 stderr，避免管道写满后子进程阻塞
+                stderr_task = asyncio.create_task(_drain_stderr(process.stderr))
 
-                while True:
-                    try:
-                        line_bytes = await asyncio.wait_for(
-                            process.stdout.readline(), timeout=300
-                        )
-                    except asyncio.TimeoutError:
-                        await websocket.send_json({"type": "error", "content": "Timeout"})
-                        break
-
-                    if not line_bytes:
-                        break
-
-                    line_text = line_bytes.decode('utf-8', errors='replace').strip()
-                    if line_text.startswith('{'):
+                try:
+                    async for line_bytes in _iter_json_lines(process.stdout, timeout=300):
+                        if line_bytes is None:
+                            await websocket.send_json({"type": "error", "content": "Timeout"})
+                            break
+
+                        if line_bytes[:1] != b'{':
+                            continue
+                        # 先校验是合法 JSON，再把原始文本作为一条消息转发，不必重新序列化
+                        line_bytes = line_bytes.rstrip(b'\r')
                         try:
-                            event = json.loads(line_text)
-                            await websocket.send_json(event)
+                            _loads(line_bytes)
                         except json.JSONDecodeError:
-                            pass
+                            continue
+                        await websocket.send_text(line_bytes.decode('utf-8', errors='replace'))
 
-                await process.wait()
-                await websocket.send_json({"type": "done"})
+                    await process.wait()
+                    await websocket.send_json({"type": "done"})
+                finally:
+                    if process.returncode is None:
+                        process.terminate()
+                        await process.wait()
+                    stderr_task.cancel()
+                    await asyncio.gather(stderr_task, return_exceptions=True)
 
     except WebSocketDisconnect:
         logger.info("WebSocket client disconnected")
@@ -875,8 +1369,12 @@ async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = None):
 
 
 if __name__ == "__main__":
+    import importlib.util
     import uvicorn
     port = int(os.environ.get("API_PORT", "2026"))
     # 默认只绑定 localhost，VPS 部署时应使用 Cloudflare Tunnel
     host = os.environ.get("API_HOST", "127.0.0.1")
-    uvicorn.run(app, host=host, port=port)
+    # 优先使用 uvloop + httptools 加速子进程管道读取和 HTTP 解析（uvloop 不支持 Windows）
+    loop = "uvloop" if sys.platform != "win32" and importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    uvicorn.run(app, host=host, port=port, loop=loop, http=http, log_level="info")
@@ -1,17 +1,44 @@
-import subprocess
 import time
 
-def run_applescript(script):
-    p = subprocess.Popen(['osascript', '-'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    stdout, stderr = p.communicate(script)
-    return stdout.strip(), stderr.strip()
+from src.utils import ax_walk
+from src.utils.osa import run_applescript
+
+MAX_DEPTH = 8
+
+def _find_input_ax():
+    """进程内通过 AX API 查找所有窗口中的 text area 并尝试写入"""
+    wechat = ax_walk.running_app()
+    if wechat is None:
+        return "❌ 未检测到运行中的微信"
+    ax_walk.activate(wechat)
+
+    text_areas = ax_walk.walk(wechat.processIdentifier(), lambda n: n.role == "AXTextArea", max_depth=MAX_DEPTH,
+                              descend=lambda n: n.role != "AXTextArea", all_windows=True)
+    if not text_areas:
+        return "⚠️ 扫描完成，未找到可写的输入框。"
+    print(f"✅ 发现 {len(text_areas)} 个输入框")
+
+    # 只读区域写入会失败，依次尝试直到成功
+    for field in text_areas:
+        if ax_walk.focus_and_set_value(field, "✅ 成功定位到此输入框"):
+            return "✅ 已尝试向输入框写入测试内容，请检查微信窗口。"
+    return "⚠️ 扫描完成，未找到可写的输入框。"
 
 def find_input():
     print("🕵️‍♂️ 正在全盘搜索微信输入框...")
 
+    if ax_walk.AVAILABLE:
+        print(_find_input_ax())
+        return
+
     script = '''
     tell application "System Events"
-        tell application "WeChat" to activate
+        -- 微信卡死时 activate 会一直等待 Apple Event 回复，限定超时后继续
+        try
+            with timeout of 5 seconds
+                tell application "WeChat" to activate
+            end timeout
+        end try
         delay 0.5
 
         tell process "WeChat"
@@ -20,7 +47,12 @@ def find_input():
 
             -- 方法 1: 直接获取所有 text area (最快)
             try
-                set allInputs to every text area of every window
+                -- 逐个窗口查询，避免 every text area of every window：
+                -- 这种复合查询在 osascript 下会异常慢（radar 21759799），且返回的是按窗口嵌套的列表
+                set allInputs to {}
+                repeat with w in windows
+                    set allInputs to allInputs & (every text area of w)
+                end repeat
                 set inputCount to count of allInputs
 
                 if inputCount > 0 then
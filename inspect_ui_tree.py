@@ -1,62 +1,190 @@
-import subprocess
+import json
+import sys
+import time
+from pathlib import Path
 
-def run_applescript(script):
-    p = subprocess.Popen(['osascript', '-'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    stdout, stderr = p.communicate(script)
-    return stdout.strip(), stderr.strip()
+from src.utils import ax_walk
+from src.utils.osa import run_applescript
 
-def inspect_ui():
-    print("🕵️‍♂️ 正在深度扫描微信 UI 结构...")
+# 只保留可交互元素和可能包含它们的容器，其余节点既不记录也不深入
+INTERACTIVE_ROLES = ("AXSplitGroup", "AXTextArea", "AXButton", "AXTextField", "AXPopUpButton", "AXGroup", "AXScrollArea")
+MAX_DEPTH = 4
 
-    script = '''
-    tell application "System Events"
-        tell process "WeChat"
-            set frontmost to true
-            if not (exists front window) then return "无窗口"
+# 窗口指纹（PID、标题、位置、大小、子元素数）不变时直接复用上次扫描结果
+SNAPSHOT_PATH = Path("~/.cloudwork/ui_snapshot.json").expanduser()
+SNAPSHOT_TTL = 60
 
-            set win to front window
+FINGERPRINT_SCRIPT = '''
+tell application "System Events"
+    tell process "WeChat"
+        if not (exists front window) then return ""
+        set win to front window
+        set {x, y} to position of win
+        set {w, h} to size of win
+        return (unix id as text) & "|" & (name of win) & "|" & x & "," & y & "|" & w & "," & h & "|" & (count of UI elements of win)
+    end tell
+end tell
+'''
+
+def _build_script(roles, max_depth):
+    role_list = ", ".join(f'"{r}"' for r in roles)
+    # 每个属性读取都是一次跨进程 Apple Event，
+    # 这里按层用 "role of every UI element" 批量取回列表，再按下标拼接，
+    # 而不是对每个子元素逐个读取 role / description
+    return f'''
+    on textOf(v)
+        if v is missing value then return ""
+        try
+            return v as text
+        on error
+            return ""
+        end try
+    end textOf
 
-            -- 获取第一层级的所有元素类型
-            set level1 to every UI element of win
-
-            set resultLog to ""
-
-            repeat with item1 in level1
-                set itemRole to role of item1
-                set itemDesc to description of item1
-                set resultLog to resultLog & "\nLayer 1: " & itemRole & " | " & itemDesc
-
-                -- 如果是分割组，尝试深入一层
-                if itemRole is "AXSplitGroup" then
-                    set level2 to every UI element of item1
-                    repeat with item2 in level2
-                        set resultLog to resultLog & "\n    Layer 2: " & role of item2 & " | " & description of item2
-
-                        -- 再深入一层（通常输入框在第三层）
-                        if role of item2 is "AXSplitGroup" then
-                             set level3 to every UI element of item2
-                             repeat with item3 in level3
-                                set resultLog to resultLog & "\n        Layer 3: " & role of item3 & " | " & description of item3
-
-                                -- 尝试找 Text Area
-                                if role of item3 is "AXTextArea" then
-                                    set resultLog to resultLog & " [TARGET FOUND!]"
-                                end if
-                             end repeat
-                        end if
-                    end repeat
+    -- 字段内的制表符、换行替换为空格，保证一条记录一行
+    on clean(s)
+        set AppleScript's text item delimiters to {{tab, linefeed, return}}
+        set parts to text items of s
+        set AppleScript's text item delimiters to " "
+        set s to parts as text
+        set AppleScript's text item delimiters to ""
+        return s
+    end clean
+
+    -- 每个节点输出一行：role  description  title  x,y,w,h  depth
+    on walk(elem, depth, maxDepth, keepRoles, acc)
+        tell application "System Events"
+            set roles to role of every UI element of elem
+            if (count of roles) is 0 then return
+            set kids to every UI element of elem
+            set descs to description of every UI element of elem
+            set titles to title of every UI element of elem
+            set poss to position of every UI element of elem
+            set sizes to size of every UI element of elem
+            try
+                set vals to value of every UI element of elem
+            on error
+                set vals to {{}}
+            end try
+        end tell
+
+        repeat with i from 1 to count of roles
+            set r to item i of roles
+            if keepRoles contains r then
+                set d to my clean(my textOf(item i of descs))
+                set t to my clean(my textOf(item i of titles))
+                -- 描述、标题、值全为空的节点视为噪声，不记录但仍可深入；空输入框照常记录
+                if r is "AXTextArea" or r is "AXTextField" or d is not "" or t is not "" or (i ≤ (count of vals) and my textOf(item i of vals) is not "") then
+                    set {{x, y}} to item i of poss
+                    set {{w, h}} to item i of sizes
+                    set end of acc to r & tab & d & tab & t & tab & x & "," & y & "," & w & "," & h & tab & depth
                 end if
-            end repeat
+                if depth < maxDepth then my walk(item i of kids, depth + 1, maxDepth, keepRoles, acc)
+            end if
+        end repeat
+    end walk
 
-            return resultLog
+    tell application "System Events"
+        tell process "WeChat"
+            set frontmost to true
+            if not (exists front window) then return ""
+            set win to front window
         end tell
     end tell
+
+    set acc to {{}}
+    my walk(win, 1, {max_depth}, {{{role_list}}}, acc)
+
+    set AppleScript's text item delimiters to linefeed
+    set resultText to acc as text
+    set AppleScript's text item delimiters to ""
+    return resultText
     '''
 
-    stdout, stderr = run_applescript(script)
-    print(stdout)
+def _parse_nodes(output):
+    nodes = []
+    for line in output.splitlines():
+        parts = line.split("\t")
+        if len(parts) != 5:
+            continue
+        role, desc, title, frame, depth = parts
+        try:
+            x, y, w, h = (int(float(v)) for v in frame.split(","))
+        except ValueError:
+            continue
+        nodes.append({"role": role, "description": desc, "title": title, "x": x, "y": y, "w": w, "h": h, "depth": int(depth)})
+    return nodes
+
+def _is_candidate(node):
+    if node.role not in INTERACTIVE_ROLES:
+        return False
+    # 描述、标题、值全为空的节点视为噪声；空输入框照常记录
+    return node.role in ("AXTextArea", "AXTextField") or bool(node.description or node.title or node.value)
+
+def _inspect_ui_ax(max_depth):
+    """进程内直接读取 AX 属性，每次读取不再是一次跨进程 Apple Event"""
+    app = ax_walk.running_app()
+    if app is None:
+        return []
+    nodes = ax_walk.walk(app.processIdentifier(), _is_candidate, max_depth=max_depth,
+                         descend=lambda n: n.role in INTERACTIVE_ROLES)
+    return [
+        {"role": n.role, "description": n.description, "title": n.title,
+         "x": n.frame[0], "y": n.frame[1], "w": n.frame[2], "h": n.frame[3], "depth": n.depth}
+        for n in nodes
+    ]
+
+def _load_snapshot(key):
+    try:
+        data = json.loads(SNAPSHOT_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if data.get("key") != key or time.time() - data.get("mtime", 0) > SNAPSHOT_TTL:
+        return None
+    return data.get("tree")
+
+def _save_snapshot(key, nodes):
+    SNAPSHOT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    SNAPSHOT_PATH.write_text(json.dumps({"key": key, "tree": nodes, "mtime": time.time()}, ensure_ascii=False), encoding="utf-8")
+
+def inspect_ui(max_depth=MAX_DEPTH, use_cache=True):
+    """返回微信前台窗口中的可交互候选元素，按面积从大到小排序"""
+    if ax_walk.AVAILABLE:
+        # 进程内遍历足够快，不需要快照缓存
+        return sorted(_inspect_ui_ax(max_depth), key=lambda n: n["w"] * n["h"], reverse=True)
+
+    key = ""
+    if use_cache:
+        fingerprint, _ = run_applescript(FINGERPRINT_SCRIPT)
+        if fingerprint:
+            key = f"{fingerprint}|{max_depth}"
+            cached = _load_snapshot(key)
+            if cached is not None:
+                return cached
+
+    stdout, stderr = run_applescript(_build_script(INTERACTIVE_ROLES, max_depth))
     if stderr:
-        print(f"Error: {stderr}")
+        print(f"Error: {stderr}", file=sys.stderr)
+    nodes = sorted(_parse_nodes(stdout), key=lambda n: n["w"] * n["h"], reverse=True)
+    if key and nodes:
+        _save_snapshot(key, nodes)
+    return nodes
+
+def print_nodes(nodes):
+    if not nodes:
+        print("无窗口或未发现可交互元素")
+    for n in nodes:
+        label = " | ".join(v for v in (n["description"], n["title"]) if v)
+        mark = " [TARGET FOUND!]" if n["role"] == "AXTextArea" else ""
+        print(f"{n['role']} | {label}  ({n['x']},{n['y']} {n['w']}x{n['h']}) depth={n['depth']}{mark}")
 
 if __name__ == "__main__":
-    inspect_ui()
+    # --fresh 忽略快照缓存，强制重新扫描
+    use_cache = "--fresh" not in sys.argv
+    if "--json" in sys.argv:
+        # 每行一个 JSON 对象，便于其他脚本或 LLM 直接消费
+        for node in inspect_ui(use_cache=use_cache):
+            print(json.dumps(node, ensure_ascii=False))
+    else:
+        print("🕵️‍♂️ 正在深度扫描微信 UI 结构...")
+        print_nodes(inspect_ui(use_cache=use_cache))
@@ -5,10 +5,81 @@ CloudWork 配置验证脚本
 """
 
 import os
+import re
+import shutil
 import sys
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    load_dotenv = None
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
 # 添加项目根目录到 path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(PROJECT_ROOT))
+
+# Claude CLI 常见安装位置，PATH 中找不到时（如 cron、launchd 下 PATH 较短）再逐个检查
+KNOWN_BIN_DIRS = (
+    Path.home() / ".claude" / "local",
+    Path.home() / ".local" / "bin",
+    Path("/opt/homebrew/bin"),
+    Path("/usr/local/bin"),
+    Path("/usr/bin"),
+)
+
+# 逗号分隔的数字用户 ID，与运行时解析一致：允许空项和末尾逗号，至少有一个 ID
+_USERS_RE = re.compile(r"^[\s,]*\d+(?:\s*,[\s,]*\d+)*[\s,]*$")
+
+# 环境变量校验表：(变量名, 格式, 是否必需, 占位值, 格式不符时是否算错误)
+CHECKS = [
+    ("TELEGRAM_BOT_TOKEN", re.compile(r"^\d{6,}:[A-Za-z0-9_-]{30,}$"), True, "your_bot_token_here", True),
+    ("TELEGRAM_ALLOWED_USERS", _USERS_RE, True, "123456789,987654321", False),
+    ("ANTHROPIC_API_KEY", re.compile(r"^sk-ant-[A-Za-z0-9_-]{20,}$"), False, "sk-ant-xxxxx", False),
+]
+
+
+@lru_cache(maxsize=None)
+def _which(name):
+    """先按 PATH 查找，与运行时解析的结果一致；找不到再检查常见安装位置"""
+    path = shutil.which(name)
+    if path:
+        return path
+    for bin_dir in KNOWN_BIN_DIRS:
+        candidate = bin_dir / name
+        if os.access(candidate, os.X_OK):
+            return str(candidate)
+    return None
+
+
+def _mask(name, value):
+    """日志中只显示值的首尾片段"""
+    if name == "TELEGRAM_BOT_TOKEN":
+        return f"{value[:10]}...{value[-5:]}"
+    if name == "TELEGRAM_ALLOWED_USERS":
+        return f"{sum(1 for uid in value.split(',') if uid.strip())} 个用户"
+    return f"{value[:12]}...{value[-4:]}"
+
+
+def validate_env(env):
+    """
+    按 CHECKS 校验一次所有变量
+
+    Returns:
+        {变量名: (状态, 值)}，状态为 "ok" / "missing" / "invalid"
+    """
+    results = {}
+    for name, pattern, _, placeholder, _ in CHECKS:
+        value = env.get(name, "")
+        if not value or value == placeholder:
+            results[name] = ("missing", "")
+        elif not pattern.match(value):
+            results[name] = ("invalid", value)
+        else:
+            results[name] = ("ok", value)
+    return results
 
 def check_config():
     """验证配置文件"""
@@ -18,57 +89,48 @@ def check_config():
     warnings = []
 
     # 检查 .env 文件是否存在
-    env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", ".env")
-    if not os.path.exists(env_path):
+    env_path = PROJECT_ROOT / "config" / ".env"
+    if not env_path.exists():
         print("❌ config/.env 文件不存在")
         print("   请运行: cp config/.env.example config/.env")
         return False
 
     # 加载环境变量
-    from dotenv import load_dotenv
+    if load_dotenv is None:
+        print("❌ 缺少依赖: python-dotenv")
+        print("   请运行: pip install -r requirements.txt")
+        return False
     load_dotenv(env_path)
 
+    env = os.environ.copy()
+    results = validate_env(env)
+
     # 必需配置检查
     print("📋 必需配置:")
-
-    # Telegram Bot Token
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN", "")
-    if not bot_token or bot_token == "your_bot_token_here":
-        errors.append("TELEGRAM_BOT_TOKEN 未设置")
-        print("   ❌ TELEGRAM_BOT_TOKEN: 未设置")
-    else:
-        # 简单验证格式
-        if ":" in bot_token and len(bot_token) > 30:
-            print(f"   ✅ TELEGRAM_BOT_TOKEN: {bot_token[:10]}...{bot_token[-5:]}")
+    for name, _, required, _, strict in CHECKS:
+        if not required:
+            continue
+        status, value = results[name]
+        if status == "missing":
+            errors.append(f"{name} 未设置")
+            print(f"   ❌ {name}: 未设置")
+        elif status == "invalid":
+            (errors if strict else warnings).append(f"{name} 格式可能不正确")
+            print(f"   ⚠️  {name}: 格式可能不正确")
         else:
-            errors.append("TELEGRAM_BOT_TOKEN 格式可能不正确")
-            print(f"   ⚠️  TELEGRAM_BOT_TOKEN: 格式可能不正确")
-
-    # Telegram 授权用户
-    allowed_users = os.getenv("TELEGRAM_ALLOWED_USERS", "")
-    if not allowed_users or allowed_users == "123456789,987654321":
-        errors.append("TELEGRAM_ALLOWED_USERS 未设置")
-        print("   ❌ TELEGRAM_ALLOWED_USERS: 未设置")
-    else:
-        user_list = [u.strip() for u in allowed_users.split(",") if u.strip()]
-        if all(u.isdigit() for u in user_list):
-            print(f"   ✅ TELEGRAM_ALLOWED_USERS: {len(user_list)} 个用户")
-        else:
-            warnings.append("TELEGRAM_ALLOWED_USERS 包含非数字字符")
-            print(f"   ⚠️  TELEGRAM_ALLOWED_USERS: 格式可能不正确")
+            print(f"   ✅ {name}: {_mask(name, value)}")
 
     # Claude API 配置
     print("\n📋 Claude API 配置:")
-    api_key = os.getenv("ANTHROPIC_API_KEY", "")
-    base_url = os.getenv("ANTHROPIC_BASE_URL", "")
-    auth_token = os.getenv("ANTHROPIC_AUTH_TOKEN", "")
-
-    if api_key and api_key != "sk-ant-xxxxx":
-        if api_key.startswith("sk-ant-"):
-            print(f"   ✅ ANTHROPIC_API_KEY: {api_key[:12]}...{api_key[-4:]}")
-        else:
-            warnings.append("ANTHROPIC_API_KEY 格式可能不正确")
-            print(f"   ⚠️  ANTHROPIC_API_KEY: 格式可能不正确")
+    api_status, api_key = results["ANTHROPIC_API_KEY"]
+    base_url = env.get("ANTHROPIC_BASE_URL", "")
+    auth_token = env.get("ANTHROPIC_AUTH_TOKEN", "")
+
+    if api_status == "ok":
+        print(f"   ✅ ANTHROPIC_API_KEY: {_mask('ANTHROPIC_API_KEY', api_key)}")
+    elif api_status == "invalid":
+        warnings.append("ANTHROPIC_API_KEY 格式可能不正确")
+        print(f"   ⚠️  ANTHROPIC_API_KEY: 格式可能不正确")
     elif base_url:
         print(f"   ✅ ANTHROPIC_BASE_URL: {base_url}")
         if auth_token:
@@ -83,21 +145,21 @@ def check_config():
     # 可选配置检查
     print("\n📋 可选配置:")
 
-    model = os.getenv("DEFAULT_MODEL", "sonnet")
+    model = env.get("DEFAULT_MODEL", "sonnet")
     print(f"   ℹ️  DEFAULT_MODEL: {model}")
 
-    mode = os.getenv("DEFAULT_MODE", "auto")
+    mode = env.get("DEFAULT_MODE", "auto")
     print(f"   ℹ️  DEFAULT_MODE: {mode}")
 
-    timeout = os.getenv("COMMAND_TIMEOUT", "300")
+    timeout = env.get("COMMAND_TIMEOUT", "300")
     print(f"   ℹ️  COMMAND_TIMEOUT: {timeout}s")
 
     # 本地节点配置
-    local_url = os.getenv("LOCAL_NODE_URL", "")
+    local_url = env.get("LOCAL_NODE_URL", "")
     if local_url:
         print(f"\n📋 本地节点配置:")
         print(f"   ℹ️  LOCAL_NODE_URL: {local_url}")
-        local_token = os.getenv("LOCAL_API_TOKEN", "")
+        local_token = env.get("LOCAL_API_TOKEN", "")
         if local_token:
             print(f"   ✅ LOCAL_API_TOKEN: {local_token[:8]}...")
         else:
@@ -106,8 +168,7 @@ def check_config():
 
     # 检查 Claude CLI
     print("\n📋 依赖检查:")
-    import shutil
-    claude_path = shutil.which("claude")
+    claude_path = _which("claude")
     if claude_path:
         print(f"   ✅ Claude CLI: {claude_path}")
     else:
@@ -122,10 +183,8 @@ def check_config():
         ("logs", "日志目录"),
     ]
 
-    project_root = os.path.dirname(os.path.dirname(__file__))
     for dir_name, desc in dirs_to_check:
-        dir_path = os.path.join(project_root, dir_name)
-        if os.path.isdir(dir_path):
+        if (PROJECT_ROOT / dir_name).is_dir():
             print(f"   ✅ {dir_name}/: {desc}")
         else:
             print(f"   ⚠️  {dir_name}/: 不存在 (将自动创建)")
@@ -1,118 +1,378 @@
+import asyncio
+import hashlib
+import json
+import shutil
 import subprocess
 import time
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from src.utils.osa import run_applescript as _run_osa
 
 def run_applescript(script):
-    """运行 AppleScript"""
-    p = subprocess.Popen(['osascript', '-'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    stdout, stderr = p.communicate(script)
-    if p.returncode != 0:
+    """运行 AppleScript，失败返回 None"""
+    stdout, stderr = _run_osa(script)
+    if stderr:
         print(f"执行 AppleScript 错误: {stderr}")
-        return False
-    return True
+        return None
+    return stdout
 
-def send_wechat_message(target_name, message_content):
-    # Step 1: 准备临时文件
-    target_file = "/tmp/wechat_target.txt"
-    msg_file = "/tmp/wechat_msg.txt"
+TARGET_FILE = "/tmp/wechat_target.txt"
+MSG_FILE = "/tmp/wechat_msg.txt"
 
-    with open(target_file, "w", encoding="utf-8") as f:
+# 输入框定位缓存：窗口下 splitter group 的下标路径，按微信版本失效
+INPUT_CACHE_PATH = Path("~/.cloudwork/wechat_input.json").expanduser()
+COMPILED_SCRIPT_DIR = Path("~/.cloudwork").expanduser()
+
+def _load_input_cache():
+    """返回 (微信版本, 路径)，无缓存时为 ("", None)"""
+    try:
+        data = json.loads(INPUT_CACHE_PATH.read_text(encoding="utf-8"))
+        return str(data["version"]), [int(i) for i in data["path"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return "", None
+
+def _save_input_cache(script_output):
+    """解析脚本返回的 "版本|1,2" 并写入缓存"""
+    if not script_output or "|" not in script_output:
+        return
+    version, _, path_text = script_output.rpartition("|")
+    try:
+        path = [int(i) for i in path_text.split(",") if i]
+    except ValueError:
+        return
+    INPUT_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    INPUT_CACHE_PATH.write_text(json.dumps({"version": version, "path": path}), encoding="utf-8")
+
+def _write_temp_files(target_name, message_content):
+    """准备临时文件"""
+    with open(TARGET_FILE, "w", encoding="utf-8") as f:
         f.write(target_name)
 
-    with open(msg_file, "w", encoding="utf-8") as f:
+    with open(MSG_FILE, "w", encoding="utf-8") as f:
         f.write(message_content)
 
-    print("1. 临时文件已准备就绪")
+# 直接写入输入框的 value，不经过 pbcopy + Cmd+V，也就不需要为剪贴板留出等待时间
+# 参数通过 run handler 传入，脚本源码是常量，可预编译为 .scpt 复用
+# 返回 "微信版本|输入框路径"，供下次跳过逐层扫描
+_SEND_SCRIPT = '''
+    -- 按缓存的 splitter group 下标路径直接解析输入框
+    on resolveInput(groupPath)
+        tell application "System Events"
+            tell process "WeChat"
+                set c to window 1
+                repeat with i in groupPath
+                    set c to splitter group (i as integer) of c
+                end repeat
+                return text area 1 of c
+            end tell
+        end tell
+    end resolveInput
 
-    # Step 2: 构建 AppleScript
-    # 使用“坐标点击法”强制激活输入框
-    full_script = f'''
-    -- 定义读取文件的函数
-    on copyFileContent(filePath)
-        do shell script "cat " & quoted form of filePath & " | pbcopy"
-    end copyFileContent
-
-    tell application "System Events"
-        -- 1. 复制联系人姓名
-        my copyFileContent("{target_file}")
-        delay 0.5
-
-        -- 2. 激活微信并搜索
-        tell application "WeChat" to activate
-        delay 0.5
-        tell process "WeChat"
-            set frontmost to true
+    -- 逐层扫描 splitter group 查找输入框，返回 {输入框, 路径}
+    on locateInput()
+        tell application "System Events"
+            tell process "WeChat"
+                set win to window 1
+                if exists text area 1 of win then return {text area 1 of win, {}}
+                repeat with i from 1 to count of splitter groups of win
+                    set sp to splitter group i of win
+                    if exists text area 1 of sp then return {text area 1 of sp, {i}}
+                    repeat with j from 1 to count of splitter groups of sp
+                        set subSp to splitter group j of sp
+                        if exists text area 1 of subSp then return {text area 1 of subSp, {i, j}}
+                    end repeat
+                end repeat
+            end tell
         end tell
+        return {missing value, missing value}
+    end locateInput
+
+    -- 轮询等待微信成为前台应用，超时返回 false
+    on waitFrontmost(maxMs)
+        repeat (maxMs div 50) times
+            tell application "System Events"
+                if frontmost of process "WeChat" then return true
+            end tell
+            delay 0.05
+        end repeat
+        return false
+    end waitFrontmost
 
-        -- Cmd+F 搜索
-        keystroke "f" using {{command down}}
-        delay 0.8
+    -- 轮询等待焦点元素变为指定 role（搜索框 AXTextField / 输入框 AXTextArea），超时返回 false
+    on waitFocusedRole(roleName, maxMs)
+        repeat (maxMs div 50) times
+            try
+                tell application "System Events"
+                    tell process "WeChat"
+                        if role of (value of attribute "AXFocusedUIElement") is roleName then return true
+                    end tell
+                end tell
+            end try
+            delay 0.05
+        end repeat
+        return false
+    end waitFocusedRole
 
-        -- Cmd+V 粘贴姓名
-        keystroke "v" using {{command down}}
-        delay 1.5
+    on run {targetFile, msgFile, cachedVersion, cachedPathText}
+        -- 1. 读取联系人姓名和消息内容
+        set targetName to (read POSIX file targetFile as «class utf8»)
+        set msgContent to (read POSIX file msgFile as «class utf8»)
+        set wxVersion to version of application "WeChat"
 
-        -- 回车进入会话
-        key code 36
-        delay 1.5
+        -- 缓存路径以 "1,2" 形式传入，空串表示无缓存
+        set cachedPath to missing value
+        if cachedPathText is not "" or cachedVersion is not "" then
+            set AppleScript's text item delimiters to ","
+            set cachedPath to {}
+            repeat with i in text items of cachedPathText
+                if (i as text) is not "" then set end of cachedPath to (i as integer)
+            end repeat
+            set AppleScript's text item delimiters to ""
+        end if
 
-        -- 🔧 关键修复：查找输入框并模拟鼠标点击
-        tell process "WeChat"
+        tell application "System Events"
+            -- 2. 激活微信并搜索
+            -- 各步骤按 UI 状态轮询等待，状态到位即继续，而不是固定 delay
+            -- 微信卡死时 activate 会一直等待 Apple Event 回复，限定超时后继续
             try
-                -- 寻找输入框 (Text Area)
-                set allInputs to every text area of every window
-                if (count of allInputs) > 0 then
-                    set targetInput to item 1 of allInputs
-
-                    -- 获取输入框的位置和大小
-                    set {{x, y}} to position of targetInput
-                    set {{w, h}} to size of targetInput
-
-                    -- 计算中心点坐标
-                    set clickX to x + (w / 2)
-                    set clickY to y + (h / 2)
-
-                    -- 🖱️ 模拟鼠标点击输入框中心
-                    click at {{clickX, clickY}}
-                    delay 0.5
-                end if
-            on error
-                -- 如果找不到，尝试备用方案：再次激活窗口
+                with timeout of 5 seconds
+                    tell application "WeChat" to activate
+                end timeout
             end try
+            tell process "WeChat"
+                set frontmost to true
+                my waitFrontmost(2000)
+
+                -- Cmd+F 搜索，等搜索框获得焦点
+                keystroke "f" using {command down}
+                my waitFocusedRole("AXTextField", 2000)
+
+                -- 写入姓名到搜索框
+                set searchField to value of attribute "AXFocusedUIElement"
+                set value of searchField to targetName
+                repeat 40 times
+                    if (value of searchField) is targetName then exit repeat
+                    delay 0.05
+                end repeat
+                -- 搜索结果列表没有可轮询的稳定状态，保留短暂等待
+                delay 0.3
+
+                -- 回车进入会话，等焦点落到聊天输入框
+                key code 36
+                my waitFocusedRole("AXTextArea", 3000)
+
+                -- 3. 查找输入框：版本未变时先按缓存路径解析，失败再扫描
+                set targetInput to missing value
+                set inputPath to missing value
+                if cachedPath is not missing value and cachedVersion is wxVersion then
+                    try
+                        set targetInput to my resolveInput(cachedPath)
+                        set inputPath to cachedPath
+                    end try
+                end if
+                if targetInput is missing value then
+                    try
+                        set {targetInput, inputPath} to my locateInput()
+                    end try
+                end if
+                if targetInput is missing value then
+                    try
+                        -- 逐个窗口查询，避免 every text area of every window：
+                        -- 这种复合查询在 osascript 下会异常慢（radar 21759799），且返回的是按窗口嵌套的列表
+                        set allInputs to {}
+                        repeat with w in windows
+                            set allInputs to allInputs & (every text area of w)
+                        end repeat
+                        if (count of allInputs) > 0 then set targetInput to item 1 of allInputs
+                    end try
+                end if
+
+                if targetInput is not missing value then
+                    try
+                        set focused of targetInput to true
+                        set value of targetInput to msgContent
+                    on error
+                        set targetInput to missing value
+                        set inputPath to missing value
+                    end try
+                end if
+
+                if targetInput is missing value then
+                    -- 找不到输入框时写入当前焦点元素
+                    set targetInput to value of attribute "AXFocusedUIElement"
+                    set value of targetInput to msgContent
+                end if
+
+                -- 等待输入框内容生效（最多约 2 秒）
+                repeat 40 times
+                    if (value of targetInput) is msgContent then exit repeat
+                    delay 0.05
+                end repeat
+
+                -- 4. 发送
+                key code 36
+            end tell
         end tell
 
-        -- 3. 复制消息内容
-        my copyFileContent("{msg_file}")
-        delay 0.8
+        if inputPath is missing value then return ""
+        set AppleScript's text item delimiters to ","
+        set pathText to inputPath as text
+        set AppleScript's text item delimiters to ""
+        return wxVersion & "|" & pathText
+    end run
+'''
 
-        -- 4. 粘贴并发送
-        keystroke "v" using {{command down}}
-        delay 1.0
-        key code 36
-    end tell
-    '''
+def _as_literal(text):
+    """Python 字符串转为 AppleScript 字符串字面量"""
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
 
+@lru_cache(maxsize=None)
+def _compiled_send_script():
+    """
+    用 osacompile 把发送脚本编译为 .scpt，之后只加载不再解析源码
 
+    文件名带源码哈希，脚本变更后自动重新编译；编译失败返回 None
+    """
+    digest = hashlib.sha1(_SEND_SCRIPT.encode("utf-8")).hexdigest()[:10]
+    path = COMPILED_SCRIPT_DIR / f"send_wechat_{digest}.scpt"
+    if path.exists():
+        return str(path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        r = subprocess.run(["osacompile", "-o", str(path)], input=_SEND_SCRIPT, capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return str(path) if r.returncode == 0 else None
+
+def _build_send_script(target_file, msg_file, cached_input=("", None)):
+    """构建一行调用脚本，把文件路径和输入框缓存作为参数传给发送脚本"""
+    cached_version, cached_path = cached_input
+    cached_path_text = "" if cached_path is None else ",".join(map(str, cached_path))
+    params = "{" + ", ".join(_as_literal(a) for a in (target_file, msg_file, cached_version, cached_path_text)) + "}"
+    compiled = _compiled_send_script()
+    if compiled:
+        return f"run script (POSIX file {_as_literal(compiled)}) with parameters {params}"
+    return f"run script {_as_literal(_SEND_SCRIPT)} with parameters {params}"
+
+def send_wechat_message(target_name, message_content):
+    # Step 1: 准备临时文件
+    _write_temp_files(target_name, message_content)
+    print("1. 临时文件已准备就绪")
+    return _run_send_script()
+
+def send_wechat_file(target_name, file_path):
+    """发送文件内容：文件直接复制为消息临时文件，内容不经过 Python"""
+    # copyfile 走系统 copyfile(3)，APFS 上可直接 clone
+    shutil.copyfile(file_path, MSG_FILE)
+    with open(TARGET_FILE, "w", encoding="utf-8") as f:
+        f.write(target_name)
+    print("1. 临时文件已准备就绪")
+    return _run_send_script()
+
+def _run_send_script():
+    # Step 2: 构建并执行 AppleScript
     print("2. 开始执行全自动化脚本 (请保持双手离开键鼠)...")
-    run_applescript(full_script)
+    if not _run_send_job(TARGET_FILE, MSG_FILE):
+        return False
     print("✅ 全流程指令已发送完毕")
+    return True
+
+def prepare_send_job(index, target_name):
+    """准备第 index 个联系人的姓名文件，不触碰 UI，返回文件路径"""
+    target_file = f"/tmp/wechat_target_{index}.txt"
+    with open(target_file, "w", encoding="utf-8") as f:
+        f.write(target_name)
+    # 顺带预热编译好的 .scpt，首次编译不占用执行 UI 的线程
+    _compiled_send_script()
+    return target_file
+
+def _run_send_job(target_file, msg_file):
+    """
+    构建并执行一次发送，成功时更新输入框缓存，返回是否成功
+
+    输入框缓存在执行前才读取：上一个联系人刚扫描到的路径要能被下一个直接复用
+    """
+    output = run_applescript(_build_send_script(target_file, msg_file, _load_input_cache()))
+    if output is None:
+        return False
+    _save_input_cache(output)
+    return True
+
+async def _send_prepared(targets):
+    """
+    MSG_FILE 已就绪时依次发送给多个联系人，返回每个联系人是否成功
+
+    微信 UI 只能串行驱动：osascript 放在单线程执行器里逐个执行（复用常驻会话），
+    下一个联系人的文件准备与当前这次执行重叠
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=1)
+
+    async def prepare():
+        # 准备失败时也要放入结束标记，否则消费方会永远等在 queue.get() 上
+        try:
+            for i, target in enumerate(targets):
+                target_file = await asyncio.to_thread(prepare_send_job, i, target)
+                await queue.put((target, target_file))
+        finally:
+            await queue.put(None)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        producer = asyncio.create_task(prepare())
+        try:
+            while True:
+                job = await queue.get()
+                if job is None:
+                    break
+                target, target_file = job
+                ok = await loop.run_in_executor(executor, _run_send_job, target_file, MSG_FILE)
+                if ok:
+                    print(f"✅ 已发送给 [{target}]")
+                results.append(ok)
+            # 正常结束时 producer 已完成；准备阶段的异常在此抛出
+            await producer
+        finally:
+            producer.cancel()
+    return results
+
+async def send_to_targets(targets, message_content):
+    """向多个联系人发送同一条消息，返回每个联系人是否成功"""
+    def write_msg():
+        with open(MSG_FILE, "w", encoding="utf-8") as f:
+            f.write(message_content)
+
+    await asyncio.to_thread(write_msg)
+    return await _send_prepared(targets)
+
+async def send_file_to_targets(targets, file_path):
+    """向多个联系人发送同一个文件的内容"""
+    await asyncio.to_thread(shutil.copyfile, file_path, MSG_FILE)
+    return await _send_prepared(targets)
 
 if __name__ == "__main__":
     # 配置
     file_path = "/Users/zhanggongqing/project/孵化项目/cloudwork/data/福满亲家宴_博山菜_经营日报_20260205.md"
-    target_person = "刘琪"
+    target_people = ["刘琪"]
 
     if not os.path.exists(file_path):
         print(f"❌ 错误: 找不到文件 {file_path}")
         sys.exit(1)
 
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    if os.path.getsize(file_path) == 0:
+        print(f"❌ 错误: 日报文件为空 {file_path}")
+        sys.exit(1)
 
-        print(f"📄 读取日报文件成功，准备发送给 [{target_person}]")
-        send_wechat_message(target_person, content)
+    try:
+        print(f"📄 找到日报文件，准备发送给 {target_people}")
+        if len(target_people) == 1:
+            send_wechat_file(target_people[0], file_path)
+        else:
+            asyncio.run(send_file_to_targets(target_people, file_path))
 
     except Exception as e:
         print(f"❌ 发生异常: {e}")
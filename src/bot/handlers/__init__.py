@@ -2,14 +2,34 @@
 CloudWork Bot Handlers
 
 命令、消息、回调处理器
+
+子模块按需加载 (PEP 562)：只用到其中一组处理器时不必导入其余模块
 """
 
-from .commands import get_command_handlers
-from .messages import get_message_handlers
-from .callbacks import get_callback_handlers
+import importlib
+
+# 导出名 -> 所在子模块
+_LAZY_EXPORTS = {
+    'get_command_handlers': '.commands',
+    'get_message_handlers': '.messages',
+    'get_callback_handlers': '.callbacks',
+}
 
 __all__ = [
     'get_command_handlers',
     'get_message_handlers',
     'get_callback_handlers',
 ]
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
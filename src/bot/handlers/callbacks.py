@@ -4,28 +4,77 @@ CloudWork Callback Query Handlers
 处理 InlineKeyboardButton 的回调查询
 """
 
+import asyncio
 import logging
-from typing import Optional
+import re
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+from typing import DefaultDict, List, Optional, Set
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ForceReply
+from telegram.error import BadRequest, TelegramError
 from telegram.ext import ContextTypes, CallbackQueryHandler
 
 from ...utils.auth import is_authorized
-from ...utils.formatters import format_session_info, safe_edit_message
+from ...utils.formatters import format_session_infos, safe_edit_message
 from ..services.session import session_manager
 from ..services.claude import claude_executor, AVAILABLE_MODELS, EXECUTION_MODES
 from ..services.task import task_manager, TaskState
+from . import opcodes
+from .opcodes import (
+    SWITCH_DATA, RESTORE_DATA, BROWSE_DIR_DATA, SELECT_PROJECT_DATA, CONFIRM_PROJECT_DATA,
+)
 
 logger = logging.getLogger(__name__)
 
+# 分页渲染缓存 (kind, user_id, page, version) -> (text, reply_markup)
+# 版本号随会话变更递增，旧版本条目不再命中，按 LRU 淘汰
+_PAGE_CACHE: "OrderedDict[tuple, tuple]" = OrderedDict()
+_PAGE_CACHE_SIZE = 256
+
+# 会话按钮行缓存 (kind, id, name, message_count, last_active, is_active) -> 按钮行
+# 以显示用到的字段为键，整页缓存失效后，未改动的会话仍复用已构造的行
+_ROW_CACHE: "OrderedDict[tuple, tuple]" = OrderedDict()
+_ROW_CACHE_SIZE = 512
+
+# Telegram 限制 callback_data 为 1-64 字节
+_MAX_CALLBACK_DATA_LEN = 64
+
+# 耗时回调（会驱动 Claude 执行）放到后台任务，不阻塞其他更新；
+# 同一用户的后台回调按锁串行，保证顺序
+_BACKGROUND_ROUTES = frozenset({"confirm_plan", "transcribe_tpl", "seo"})
+_user_locks: DefaultDict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+_background_tasks: Set[asyncio.Task] = set()
+
+# 前台回调的用户锁，与后台锁分开：后台执行 Claude 期间仍可翻页、切换设置
+_foreground_locks: DefaultDict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+# 由处理函数自行应答的回调：结果用回调提示（toast）告知，消息内容不变时不再编辑；
+# 处理函数的每条返回路径都必须应答一次
+_TOAST_ROUTES = frozenset({"set_model", "set_mode", "cancel_plan", "answer_opt"})
+
+# 回调数据模版，与下方路由表的前缀一一对应
+_PAGE_DATA = {
+    "sessions": "page_sessions_{}".format,
+    "archived": "page_archived_{}".format,
+}
+
+# 会话分页: kind -> (标题, 提示, 空页文案, 行前缀, 行回调模版)
+_SESSION_PAGE_SIZE = 5
+_SESSION_PAGE_SPECS = {
+    "sessions": ("📋 会话列表", "点击切换到对应会话:", "📭 没有更多会话", "", SWITCH_DATA),
+    "archived": ("🗄️ 归档会话", "点击恢复会话:", "📭 没有更多归档会话", "🗄️ ", RESTORE_DATA),
+}
+
 
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     统一的回调查询处理器
 
     回调数据格式:
-    - switch:{session_id} - 切换会话
-    - restore:{session_id} - 恢复归档会话
+    - sw:{session_id} - 切换会话
+    - rs:{session_id} - 恢复归档会话
+    - bd:{path} / sp:{path} / cp:{path} - 浏览目录 / 选择项目 / 确认项目
     - set_model:{model} - 设置模型
     - set_mode:{mode} - 设置执行模式
     - set_project:{project} - 设置项目
@@ -41,237 +90,225 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not query:
         return
 
-    await query.answer()
+    # 按钮数据由本程序生成，不超过 Telegram 的 64 字节上限且不含控制字符；
+    # 异常数据直接丢弃，不进入解析和日志。项目路径可能含中文，不做 ASCII 限制。
+    # 提前返回的回调同样要应答，否则按钮上的加载动画会一直持续到 Telegram 超时
+    data = query.data
+    if not data or len(data) > _MAX_CALLBACK_DATA_LEN or not data.isprintable():
+        _spawn(query.answer())
+        return
 
     user = update.effective_user
     if not user:
+        _spawn(query.answer())
         return
 
     if not is_authorized(user.id):
-        await query.edit_message_text("⛔ 您没有使用权限")
+        _spawn(query.answer())
+        await _edit_if_changed(query, "⛔ 您没有使用权限")
         return
 
     user_id = user.id
-    data = query.data
-
-    logger.info(f"回调查询: user={user_id}, data={data}")
-
-    try:
-        # 会话切换
-        if data.startswith("switch:"):
-            await _handle_switch_session(query, user_id, data)
-
-        # 恢复归档会话
-        elif data.startswith("restore:"):
-            await _handle_restore_session(query, user_id, data)
-
-        # 设置模型
-        elif data.startswith("set_model:"):
-            await _handle_set_model(query, user_id, data)
-
-        # 设置执行模式
-        elif data.startswith("set_mode:"):
-            await _handle_set_mode(query, user_id, data)
-
-        # 设置项目（旧版兼容）
-        elif data.startswith("set_project:"):
-            await _handle_set_project(query, user_id, data)
-
-        # 浏览目录（层级浏览）
-        elif data.startswith("browse_dir:"):
-            await _handle_browse_dir(query, user_id, data)
-
-        # 选择项目（显示确认）
-        elif data.startswith("select_project:"):
-            await _handle_select_project(query, user_id, data)
-
-        # 确认项目选择
-        elif data.startswith("confirm_project:"):
-            await _handle_confirm_project(query, user_id, data)
-
-        # 返回项目根目录
-        elif data == "back_project_root":
-            await _handle_back_project_root(query, user_id)
-
-        # 回答 AskUserQuestion 选项
-        elif data.startswith("answer_opt_"):
-            await _handle_answer_option(query, user_id, data)
-
-        # 自定义输入
-        elif data.startswith("custom_input_"):
-            await _handle_custom_input(query, user_id, data)
-
-        # 确认计划
-        elif data.startswith("confirm_plan_"):
-            await _handle_confirm_plan(query, user_id, data)
 
-        # 取消计划
-        elif data.startswith("cancel_plan_"):
-            await _handle_cancel_plan(query, user_id, data)
+    logger.info("回调查询: user=%s, data=%s", user_id, data)
 
-        # 会话分页
-        elif data.startswith("page_sessions_"):
-            await _handle_sessions_pagination(query, user_id, data)
+    # 应答在后台发出，与下面的处理并发，编辑消息不必等应答的往返
+    # 无参数回调整串匹配，其余按前缀只解析一次，参数直接交给处理函数
+    handler = _EXACT_ROUTES.get(data)
+    if handler:
+        _spawn(query.answer())
+        await _run_in_order(user_id, query, handler(query, user_id))
+        return
 
-        # 归档分页
-        elif data.startswith("page_archived_"):
-            await _handle_archived_pagination(query, user_id, data)
+    # "前缀:参数" 形式按第一个冒号切分后直接查表；
+    # 下划线拼接的回调（answer_opt_、page_sessions_ 等）才交给正则匹配
+    prefix, sep, arg = data.partition(":")
+    if not (sep and (prefix in _ROUTES or prefix in _CONTEXT_ROUTES)):
+        m = _CB_RE.fullmatch(data)
+        if not m:
+            _spawn(query.answer())
+            logger.warning("未知的回调数据: %s", data)
+            return
+        prefix, arg = m.group(1), m.group(2)
 
-        # 取消任务
-        elif data.startswith("cancel_task_"):
-            await _handle_cancel_task(query, user_id, data)
+    # 提示类回调由处理函数带提示文字应答，其余回调立即应答
+    if prefix not in _TOAST_ROUTES:
+        _spawn(query.answer())
 
-        # 技能菜单
-        elif data.startswith("skill:"):
-            await _handle_skill_callback(query, context, user_id, data)
+    handler = _ROUTES.get(prefix)
+    if handler:
+        call = handler(query, user_id, arg)
+    else:
+        call = _CONTEXT_ROUTES[prefix](update, context, user_id, arg)
 
-        # Cron 管理菜单
-        elif data == "cron_menu":
-            await _handle_cron_menu(query, user_id)
+    if prefix in _BACKGROUND_ROUTES:
+        _spawn(_run_locked(user_id, query, call))
+    else:
+        await _run_in_order(user_id, query, call)
 
-        elif data == "cron_notify_toggle":
-            await _handle_cron_notify_toggle(query, user_id)
 
-        elif data.startswith("cron_notify_interval:"):
-            await _handle_cron_notify_interval(query, user_id, data)
+def _spawn(coro) -> asyncio.Task:
+    """在后台运行协程，持有引用直到结束，避免任务被回收"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_background_done)
+    return task
 
-        elif data == "cron_notify_interval_menu":
-            await _handle_cron_notify_interval_menu(query, user_id)
 
-        elif data.startswith("cron_task_toggle:"):
-            await _handle_cron_task_toggle(query, user_id, data)
+def _on_background_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    # 后台任务的异常没有调用方接收，在此记录（如回调查询已过期导致应答失败）
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("后台回调任务失败: %s", task.exception())
 
-        elif data.startswith("cron_task_delete:"):
-            await _handle_cron_task_delete(query, user_id, data)
 
-        elif data.startswith("cron_task_delete_confirm:"):
-            await _handle_cron_task_delete_confirm(query, user_id, data)
+async def _run_handler(query, call):
+    """执行处理函数；只兜底 Telegram 请求失败和数据解析错误，其余异常交给全局 error_handler"""
+    try:
+        await call
+    except (TelegramError, ValueError, KeyError) as e:
+        # 重复点击导致内容未变化，无需提示
+        if isinstance(e, BadRequest) and "not modified" in str(e):
+            return
+        logger.error("回调处理错误: %s", e, exc_info=True)
+        try:
+            await _edit_if_changed(query, f"❌ 操作失败: {str(e)[:100]}")
+        except TelegramError:
+            pass
 
-        elif data.startswith("cron_task_schedule:"):
-            await _handle_cron_task_schedule_menu(query, user_id, data)
 
-        elif data.startswith("cron_task_set_schedule:"):
-            await _handle_cron_task_set_schedule(query, user_id, data)
+async def _run_in_order(user_id: int, query, call):
+    """
+    执行前台回调，同一用户的回调按点击顺序依次执行
 
-        elif data == "cron_tasks_list":
-            await _handle_cron_tasks_list(query, user_id)
+    应用开启了 concurrent_updates，不同用户的回调本就并发；
+    同一用户连续点击（如快速翻页）时，避免后一次的编辑先于前一次落地
+    """
+    async with _foreground_locks[user_id]:
+        await _run_handler(query, call)
 
-        # 执行目标切换
-        elif data.startswith("set_target:"):
-            await _handle_set_target(query, user_id, data)
 
-        # 转录模版选择
-        elif data.startswith("transcribe_tpl:"):
-            await _handle_transcribe_template(update, query, context, user_id, data)
+async def _run_locked(user_id: int, query, call):
+    """
+    在用户锁内执行后台回调
 
-        # 转录自定义提示
-        elif data.startswith("transcribe_custom:"):
-            await _handle_transcribe_custom(query, context, user_id, data)
+    后台任务的异常不会到达全局 error_handler，在此记录并告知用户，
+    否则 transcribe_tpl 等长任务失败时用户收不到任何反馈
+    """
+    try:
+        async with _user_locks[user_id]:
+            await _run_handler(query, call)
+    except Exception as e:
+        logger.error("后台回调处理错误: %s", e, exc_info=True)
+        try:
+            await query.message.reply_text(f"❌ 操作失败: {str(e)[:100]}")
+        except Exception as send_error:
+            logger.warning("发送失败提示出错: %s", send_error)
 
-        # SEO 关键词挖掘
-        elif data.startswith("seo:"):
-            await _handle_seo_callback(query, context, user_id, data)
 
-        else:
-            logger.warning(f"未知的回调数据: {data}")
+async def _edit_if_changed(query, text: str, **kwargs):
+    """
+    编辑回调所在消息，文本和按钮都未变化时跳过
 
-    except Exception as e:
-        logger.error(f"回调处理错误: {e}")
-        try:
-            await query.edit_message_text(f"❌ 操作失败: {str(e)[:100]}")
-        except Exception:
-            pass
+    重复点击同一按钮（如再次选择当前模型）不再发出注定返回
+    "message is not modified" 的请求。带 Markdown 标记的文本与
+    message.text（已去除标记）不相等，此时照常编辑
+    """
+    message = query.message
+    if (message is not None and message.text == text
+            and message.reply_markup == kwargs.get("reply_markup")):
+        return
+    await query.edit_message_text(text, **kwargs)
 
 
-async def _handle_switch_session(query, user_id: int, data: str):
+async def _handle_switch_session(query, user_id: int, session_id: str):
     """处理会话切换"""
-    session_id = data.split(":", 1)[1]
-
     session_manager.set_active_session(user_id, session_id)
     session = session_manager.get_session(user_id, session_id)
 
     if session:
         session_name = session.get("name", "未命名")
         message_count = session.get("message_count", 0)
-        await query.edit_message_text(
+        await _edit_if_changed(
+            query,
             f"✅ 已切换到会话: *{session_name}*\n"
             f"历史消息: {message_count} 条\n\n"
             f"现在可以直接发送消息继续对话",
             parse_mode='Markdown'
         )
     else:
-        await query.edit_message_text("⚠️ 会话不存在或已过期")
+        await _edit_if_changed(query, "⚠️ 会话不存在或已过期")
 
 
-async def _handle_restore_session(query, user_id: int, data: str):
+async def _handle_restore_session(query, user_id: int, session_id: str):
     """处理恢复归档会话"""
-    session_id = data.split(":", 1)[1]
-
-    success = session_manager.restore_session(user_id, session_id)
+    success = session_manager.unarchive_session(user_id, session_id)
 
     if success:
         session = session_manager.get_session(user_id, session_id)
         session_name = session.get("name", "未命名") if session else "未命名"
-        await query.edit_message_text(
+        await _edit_if_changed(
+            query,
             f"✅ 已恢复会话: *{session_name}*\n\n"
             f"会话已设为活跃，可以直接发送消息继续对话",
             parse_mode='Markdown'
         )
     else:
-        await query.edit_message_text("⚠️ 恢复会话失败，会话可能不存在")
+        await _edit_if_changed(query, "⚠️ 恢复会话失败，会话可能不存在")
 
 
-async def _handle_set_model(query, user_id: int, data: str):
+async def _handle_set_model(query, user_id: int, model: str):
     """处理设置模型"""
-    model = data.split(":", 1)[1]
-
     if model not in AVAILABLE_MODELS:
-        await query.edit_message_text(f"⚠️ 无效的模型: {model}")
+        await query.answer()
+        await _edit_if_changed(query, f"⚠️ 无效的模型: {model}")
+        return
+
+    model_desc = AVAILABLE_MODELS[model]
+    await query.answer(f"✅ {model} ({model_desc})")
+
+    # 选择的就是当前模型：提示已足够，省去一次 editMessageText
+    if model == session_manager.get_user_model(user_id):
         return
 
     session_manager.set_user_model(user_id, model)
-    model_desc = AVAILABLE_MODELS.get(model, model)
 
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         f"✅ 已切换到模型: *{model}*\n"
         f"({model_desc})",
         parse_mode='Markdown'
     )
 
 
-async def _handle_set_mode(query, user_id: int, data: str):
+async def _handle_set_mode(query, user_id: int, mode: str):
     """处理设置执行模式"""
-    mode = data.split(":", 1)[1]
-
     if mode not in EXECUTION_MODES:
-        await query.edit_message_text(f"⚠️ 无效的模式: {mode}")
+        await query.answer()
+        await _edit_if_changed(query, f"⚠️ 无效的模式: {mode}")
+        return
+
+    mode_desc = EXECUTION_MODES[mode]
+    await query.answer(f"✅ {mode} ({mode_desc})")
+
+    # 选择的就是当前模式：提示已足够，省去一次 editMessageText
+    if mode == session_manager.get_user_execution_mode(user_id):
         return
 
     session_manager.set_user_execution_mode(user_id, mode)
-    mode_desc = EXECUTION_MODES.get(mode, mode)
 
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         f"✅ 已切换到模式: *{mode}*\n"
         f"({mode_desc})",
         parse_mode='Markdown'
     )
 
 
-async def _handle_set_project(query, user_id: int, data: str):
+async def _handle_set_project(query, user_id: int, project: str):
     """处理设置项目"""
-    project = data.split(":", 1)[1]
-
     # 获取当前项目，检查是否真的切换了
     current_project = session_manager.get_user_project(user_id)
-
-    # 如果切换到不同的项目，归档当前会话
-    if project != current_project:
-        current_session_id = session_manager.get_active_session_id(user_id)
-        if current_session_id:
-            session_manager.archive_session(user_id, current_session_id)
-            logger.info(f"切换项目时归档会话: {current_session_id[:8]}...")
-
-    session_manager.set_user_project(user_id, project)
     project_dir = claude_executor.get_project_dir(project)
 
     # 构建提示信息
@@ -279,13 +316,24 @@ async def _handle_set_project(query, user_id: int, data: str):
     if project != current_project:
         message += "\n\n💡 已归档之前的会话，下次发消息将创建新会话"
 
-    await query.edit_message_text(message, parse_mode='Markdown')
+    # 会话变更只改内存，由 session_manager 后台落盘
+    _switch_project(user_id, project, current_project)
+    await _edit_if_changed(query, message, parse_mode='Markdown')
 
 
-async def _handle_browse_dir(query, user_id: int, data: str):
-    """处理浏览目录（层级浏览）"""
-    relative_path = data.split(":", 1)[1]
+def _switch_project(user_id: int, project: str, current_project: str):
+    """切换项目；切换到不同项目时先归档当前会话"""
+    if project != current_project:
+        current_session_id = session_manager.get_active_session_id(user_id)
+        if current_session_id:
+            session_manager.archive_session(user_id, current_session_id)
+            logger.info("切换项目时归档会话: %s...", current_session_id[:8])
+
+    session_manager.set_user_project(user_id, project)
 
+
+async def _handle_browse_dir(query, user_id: int, relative_path: str):
+    """处理浏览目录（层级浏览）"""
     # 获取目录内容
     dir_info = claude_executor.get_directory_contents(relative_path)
     current_path = dir_info["current_path"]
@@ -306,7 +354,7 @@ async def _handle_browse_dir(query, user_id: int, data: str):
             ])
         else:
             keyboard.append([
-                InlineKeyboardButton(f"⬆️ 返回上级", callback_data=f"browse_dir:{parent_path}")
+                InlineKeyboardButton(f"⬆️ 返回上级", callback_data=BROWSE_DIR_DATA(parent_path))
             ])
 
     # 子目录列表
@@ -318,11 +366,11 @@ async def _handle_browse_dir(query, user_id: int, data: str):
         keyboard.append([
             InlineKeyboardButton(
                 f"{prefix}📁 {name}",
-                callback_data=f"browse_dir:{path}"
+                callback_data=BROWSE_DIR_DATA(path)
             ),
             InlineKeyboardButton(
                 "✓ 选择",
-                callback_data=f"select_project:{path}"
+                callback_data=SELECT_PROJECT_DATA(path)
             )
         ])
 
@@ -331,7 +379,7 @@ async def _handle_browse_dir(query, user_id: int, data: str):
         keyboard.append([
             InlineKeyboardButton(
                 "✓ 选择当前目录",
-                callback_data=f"select_project:{current_path}"
+                callback_data=SELECT_PROJECT_DATA(current_path)
             )
         ])
 
@@ -343,7 +391,8 @@ async def _handle_browse_dir(query, user_id: int, data: str):
 
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         f"📂 浏览: `{current_path or '/'}`\n\n"
         f"点击 📁 进入子目录，点击 ✓ 选择项目",
         reply_markup=reply_markup,
@@ -351,10 +400,8 @@ async def _handle_browse_dir(query, user_id: int, data: str):
     )
 
 
-async def _handle_select_project(query, user_id: int, data: str):
+async def _handle_select_project(query, user_id: int, project: str):
     """处理选择项目（显示确认对话框）"""
-    project = data.split(":", 1)[1]
-
     current_project = session_manager.get_user_project(user_id)
     project_dir = claude_executor.get_project_dir(project)
 
@@ -378,42 +425,24 @@ async def _handle_select_project(query, user_id: int, data: str):
         )
         keyboard = [
             [
-                InlineKeyboardButton("✅ 确认切换", callback_data=f"confirm_project:{project}"),
+                InlineKeyboardButton("✅ 确认切换", callback_data=CONFIRM_PROJECT_DATA(project)),
                 InlineKeyboardButton("❌ 取消", callback_data="back_project_root")
             ]
         ]
 
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         message,
         reply_markup=reply_markup,
         parse_mode='Markdown'
     )
 
 
-async def _handle_confirm_project(query, user_id: int, data: str):
+async def _handle_confirm_project(query, user_id: int, project: str):
     """处理确认项目选择"""
-    project = data.split(":", 1)[1]
-
-    current_project = session_manager.get_user_project(user_id)
-
-    # 如果切换到不同的项目，归档当前会话
-    if project != current_project:
-        current_session_id = session_manager.get_active_session_id(user_id)
-        if current_session_id:
-            session_manager.archive_session(user_id, current_session_id)
-            logger.info(f"切换项目时归档会话: {current_session_id[:8]}...")
-
-    session_manager.set_user_project(user_id, project)
-    project_dir = claude_executor.get_project_dir(project)
-
-    # 构建提示信息
-    message = f"✅ 已切换到项目: *{project}*\n工作目录: `{project_dir}`"
-    if project != current_project:
-        message += "\n\n💡 已归档之前的会话，下次发消息将创建新会话"
-
-    await query.edit_message_text(message, parse_mode='Markdown')
+    await _handle_set_project(query, user_id, project)
 
 
 async def _handle_back_project_root(query, user_id: int):
@@ -421,13 +450,30 @@ async def _handle_back_project_root(query, user_id: int):
     current_project = session_manager.get_user_project(user_id)
 
     # 获取顶级项目列表
-    top_items = claude_executor.get_top_level_items()
+    top_items = tuple(
+        (item["name"], item["path"], item.get("is_special", False))
+        for item in claude_executor.get_top_level_items()
+    )
+    reply_markup = _project_root_markup(current_project, top_items)
+
+    await _edit_if_changed(
+        query,
+        f"📂 选择项目\n当前: *{current_project}*\n\n"
+        f"点击 📁 进入子目录，点击 ✓ 选择项目",
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+
+
+@lru_cache(maxsize=64)
+def _project_root_markup(current_project: str, top_items: tuple) -> InlineKeyboardMarkup:
+    """
+    顶级项目键盘，top_items 为 (name, path, is_special) 元组
 
+    目录列表和当前项目不变时反复返回同一个键盘对象，不再逐个构造按钮
+    """
     keyboard = []
-    for item in top_items:
-        name = item["name"]
-        path = item["path"]
-        is_special = item.get("is_special", False)
+    for name, path, is_special in top_items:
         prefix = "✅ " if path == current_project else ""
 
         if is_special:
@@ -435,7 +481,7 @@ async def _handle_back_project_root(query, user_id: int):
             keyboard.append([
                 InlineKeyboardButton(
                     f"{prefix}📌 {name}",
-                    callback_data=f"select_project:{path}"
+                    callback_data=SELECT_PROJECT_DATA(path)
                 )
             ])
         else:
@@ -443,49 +489,47 @@ async def _handle_back_project_root(query, user_id: int):
             keyboard.append([
                 InlineKeyboardButton(
                     f"{prefix}📁 {name}",
-                    callback_data=f"browse_dir:{path}"
+                    callback_data=BROWSE_DIR_DATA(path)
                 ),
                 InlineKeyboardButton(
                     "✓ 选择",
-                    callback_data=f"select_project:{path}"
+                    callback_data=SELECT_PROJECT_DATA(path)
                 )
             ])
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_text(
-        f"📂 选择项目\n当前: *{current_project}*\n\n"
-        f"点击 📁 进入子目录，点击 ✓ 选择项目",
-        reply_markup=reply_markup,
-        parse_mode='Markdown'
-    )
+    return InlineKeyboardMarkup(keyboard)
 
 
-async def _handle_answer_option(query, user_id: int, data: str):
+async def _handle_answer_option(query, user_id: int, arg: str):
     """处理 AskUserQuestion 选项回答"""
-    # 解析: answer_opt_{session_id}_{option_index}
-    parts = data.split("_")
-    if len(parts) < 4:
-        await query.edit_message_text("⚠️ 无效的选项数据")
+    # 参数: {session_id}_{option_index}
+    session_id_prefix, sep, index_text = arg.rpartition("_")
+    # 先校验再转换，畸形数据不走异常路径；选项数量不会超过三位数
+    if not sep or not index_text.isdecimal() or len(index_text) > 3:
+        await query.answer()
+        await _edit_if_changed(query, "⚠️ 无效的选项数据")
         return
 
-    session_id_prefix = parts[2]
-    option_index = int(parts[3])
+    option_index = int(index_text)
 
     # 查找匹配的任务
-    task = _find_task_by_session_prefix(user_id, session_id_prefix)
+    task = task_manager.find_task_by_session_prefix(user_id, session_id_prefix)
     if not task:
-        await query.edit_message_text("⚠️ 未找到对应的任务，可能已超时")
+        await query.answer()
+        await _edit_if_changed(query, "⚠️ 未找到对应的任务，可能已超时")
         return
 
     # 获取选项文本
     options = task.question_options or []
     if option_index >= len(options):
-        await query.edit_message_text("⚠️ 选项不存在")
+        await query.answer()
+        await _edit_if_changed(query, "⚠️ 选项不存在")
         return
 
     selected_option = options[option_index]
     answer_text = selected_option.get("label", str(option_index))
+    # 提示立即告知已选中哪一项，任务随即继续；消息编辑只是去掉按钮
+    await query.answer(f"✅ 已选择: {answer_text}")
 
     # 设置用户回复
     task.user_reply = answer_text
@@ -493,30 +537,28 @@ async def _handle_answer_option(query, user_id: int, data: str):
     if task.input_event:
         task.input_event.set()
 
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         f"✅ 已选择: *{answer_text}*\n\n继续执行...",
         parse_mode='Markdown'
     )
 
 
-async def _handle_custom_input(query, user_id: int, data: str):
+async def _handle_custom_input(query, user_id: int, session_id_prefix: str):
     """处理自定义输入请求"""
-    # 解析: custom_input_{session_id}
-    parts = data.split("_")
-    if len(parts) < 3:
-        await query.edit_message_text("⚠️ 无效的数据")
+    if not session_id_prefix:
+        await _edit_if_changed(query, "⚠️ 无效的数据")
         return
 
-    session_id_prefix = parts[2]
-
-    task = _find_task_by_session_prefix(user_id, session_id_prefix)
+    task = task_manager.find_task_by_session_prefix(user_id, session_id_prefix)
     if not task:
-        await query.edit_message_text("⚠️ 未找到对应的任务")
+        await _edit_if_changed(query, "⚠️ 未找到对应的任务")
         return
 
     question = task.pending_question or "请输入您的回答"
 
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         f"📝 请直接发送消息作为您的回答\n\n"
         f"问题: {question}\n\n"
         f"_直接发送文字消息即可_",
@@ -524,302 +566,312 @@ async def _handle_custom_input(query, user_id: int, data: str):
     )
 
 
-async def _handle_confirm_plan(query, user_id: int, data: str):
+async def _handle_confirm_plan(query, user_id: int, session_id: str):
     """处理确认计划执行"""
-    # 解析: confirm_plan_{session_id}
-    parts = data.split("_")
-    if len(parts) < 3:
-        await query.edit_message_text("⚠️ 无效的数据")
+    if not session_id:
+        await _edit_if_changed(query, "⚠️ 无效的数据")
         return
 
-    session_id = parts[2]
-
     plan = task_manager.get_pending_plan(user_id, session_id)
     if not plan:
-        await query.edit_message_text("⚠️ 计划已过期或不存在")
+        await _edit_if_changed(query, "⚠️ 计划已过期或不存在")
         return
 
     # 移除待执行计划
     task_manager.remove_pending_plan(user_id, session_id)
 
-    await query.edit_message_text("✅ 已确认，开始执行计划...")
+    await _edit_if_changed(query, "✅ 已确认，开始执行计划...")
 
     # TODO: 触发计划执行
     # 这里需要实际调用 claude_executor 执行
     logger.info(f"确认执行计划: user={user_id}, session={session_id}")
 
 
-async def _handle_cancel_plan(query, user_id: int, data: str):
+async def _handle_cancel_plan(query, user_id: int, session_id: str):
     """处理取消计划"""
-    parts = data.split("_")
-    if len(parts) < 3:
-        await query.edit_message_text("⚠️ 无效的数据")
+    if not session_id:
+        await query.answer()
+        await _edit_if_changed(query, "⚠️ 无效的数据")
         return
 
-    session_id = parts[2]
-
     task_manager.remove_pending_plan(user_id, session_id)
 
-    await query.edit_message_text("❌ 已取消计划")
+    await query.answer("❌ 已取消计划")
+    await _edit_if_changed(query, "❌ 已取消计划")
 
 
-async def _handle_cancel_task(query, user_id: int, data: str):
+async def _handle_cancel_task(query, user_id: int, arg: str):
     """处理取消正在执行的任务"""
-    # 解析: cancel_task_{user_id}
-    parts = data.split("_")
-    if len(parts) < 3 or not parts[2]:
-        await query.edit_message_text("⚠️ 无效的数据")
+    # 参数: {user_id}
+    if not arg:
+        await _edit_if_changed(query, "⚠️ 无效的数据")
         return
 
-    try:
-        target_user_id = int(parts[2])
-    except ValueError:
-        await query.edit_message_text("⚠️ 无效的用户ID")
+    if not arg.isdecimal():
+        await _edit_if_changed(query, "⚠️ 无效的用户ID")
         return
+    target_user_id = int(arg)
 
     # 安全检查：只能取消自己的任务
     if target_user_id != user_id:
-        await query.edit_message_text("⚠️ 无法取消其他用户的任务")
+        await _edit_if_changed(query, "⚠️ 无法取消其他用户的任务")
         return
 
-    # 获取当前活跃会话
-    session_id = session_manager.get_active_session_id(user_id)
+    # 只有一个任务时直接取它的键（新会话的任务以 None 为键，与活跃会话 ID 不同），
+    # 否则按当前活跃会话查找
+    task = task_manager.active_task_for(user_id)
+    if task is not None:
+        session_id = task.task_key[1]
+    else:
+        session_id = session_manager.get_active_session_id(user_id)
 
-    # 尝试取消任务
-    cancelled = await task_manager.cancel_task(user_id, session_id)
+    # 等取消结果出来再编辑一次消息，不先显示可能不成立的"已取消"
+    # shield 保证即使回调被中断，进程终止也会继续完成
+    cancelled = await asyncio.shield(task_manager.cancel_task(user_id, session_id))
 
     if cancelled:
-        await query.edit_message_text("⏹️ 已取消任务")
         logger.info(f"用户 {user_id} 通过按钮取消了任务")
+        await _edit_if_changed(query, "⏹️ 已取消任务")
     else:
-        await query.edit_message_text("⚠️ 没有正在执行的任务")
+        await _edit_if_changed(query, "⚠️ 没有正在执行的任务")
 
 
-async def _handle_sessions_pagination(query, user_id: int, data: str):
+async def _handle_sessions_pagination(query, user_id: int, arg: str):
     """处理会话列表分页"""
-    page = int(data.split("_")[2])
-    page_size = 5
+    await _render_session_page(query, user_id, arg, "sessions")
+
+
+async def _handle_archived_pagination(query, user_id: int, arg: str):
+    """处理归档会话列表分页"""
+    await _render_session_page(query, user_id, arg, "archived")
+
+
+async def _render_session_page(query, user_id: int, arg: str, kind: str):
+    """渲染会话列表的一页，kind 为 sessions（活跃会话）或 archived（归档会话）"""
+    if not arg.isdecimal():
+        await _edit_if_changed(query, "⚠️ 无效的页码")
+        return
+    page = int(arg)
+    title, hint, empty_text = _SESSION_PAGE_SPECS[kind][:3]
+
+    cache_key = (kind, user_id, page, session_manager.get_version(user_id))
+    cached = _get_cached_page(cache_key)
+    if cached:
+        await _edit_if_changed(query, cached[0], reply_markup=cached[1])
+        return
 
-    sessions = session_manager.get_sessions(user_id)
-    active_id = session_manager.get_active_session_id(user_id)
+    if kind == "sessions":
+        sessions = session_manager.get_all_sessions(user_id)
+        active_id = session_manager.get_active_session_id(user_id)
+    else:
+        sessions = session_manager.get_archived_sessions(user_id)
+        active_id = None
 
+    page_size = _SESSION_PAGE_SIZE
     total_pages = (len(sessions) + page_size - 1) // page_size
-    start_idx = page * page_size
-    end_idx = start_idx + page_size
-    page_sessions = sessions[start_idx:end_idx]
+    page_sessions = sessions[page * page_size:(page + 1) * page_size]
 
     if not page_sessions:
-        await query.edit_message_text("📭 没有更多会话")
+        _cache_page(cache_key, (empty_text, None))
+        await _edit_if_changed(query, empty_text)
         return
 
-    # 构建按钮
-    keyboard = []
-    for session in page_sessions:
-        session_id = session.get("id", "")
-        is_active = session_id == active_id
-        info = format_session_info(session, is_active)
-        keyboard.append([
-            InlineKeyboardButton(info, callback_data=f"switch:{session_id}")
-        ])
+    # 构建按钮：版本号变化只让整页缓存失效，页内未改动的会话复用已构造的行；
+    # InlineKeyboardMarkup 直接保存传入的元组，缓存的行无需再复制成列表
+    keyboard = _session_rows(kind, page_sessions, active_id)
 
     # 分页按钮
-    nav_buttons = []
-    if page > 0:
-        nav_buttons.append(
-            InlineKeyboardButton("◀️ 上一页", callback_data=f"page_sessions_{page - 1}")
-        )
-    if page < total_pages - 1:
-        nav_buttons.append(
-            InlineKeyboardButton("下一页 ▶️", callback_data=f"page_sessions_{page + 1}")
-        )
+    nav_buttons = _nav_row(kind, page, total_pages)
     if nav_buttons:
         keyboard.append(nav_buttons)
 
     reply_markup = InlineKeyboardMarkup(keyboard)
+    text = f"{title} (第 {page + 1}/{total_pages} 页)\n{hint}"
+    _cache_page(cache_key, (text, reply_markup))
 
-    await query.edit_message_text(
-        f"📋 会话列表 (第 {page + 1}/{total_pages} 页)\n"
-        f"点击切换到对应会话:",
-        reply_markup=reply_markup
-    )
+    await _edit_if_changed(query, text, reply_markup=reply_markup)
 
 
-async def _handle_archived_pagination(query, user_id: int, data: str):
-    """处理归档会话列表分页"""
-    page = int(data.split("_")[2])
-    page_size = 5
-
-    archived = session_manager.get_archived_sessions(user_id)
-    total_pages = (len(archived) + page_size - 1) // page_size
-    start_idx = page * page_size
-    end_idx = start_idx + page_size
-    page_archived = archived[start_idx:end_idx]
+def _session_rows(kind: str, sessions: List[dict], active_id: Optional[str]) -> List[tuple]:
+    """一页会话的按钮行，未命中行缓存的会话一次性批量格式化"""
+    keys = [
+        (kind, session.get("id", ""), session.get("name", "未命名"), session.get("message_count", 0),
+         session.get("last_active", ""), active_id is not None and session.get("id") == active_id)
+        for session in sessions
+    ]
+    rows = [_ROW_CACHE.get(key) for key in keys]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    if missing:
+        row_prefix, row_data = _SESSION_PAGE_SPECS[kind][3:]
+        infos = format_session_infos([sessions[i] for i in missing], active_id)
+        for i, info in zip(missing, infos):
+            rows[i] = (InlineKeyboardButton(f"{row_prefix}{info}", callback_data=row_data(keys[i][1])),)
+            _ROW_CACHE[keys[i]] = rows[i]
+    for key in keys:
+        _ROW_CACHE.move_to_end(key)
+    while len(_ROW_CACHE) > _ROW_CACHE_SIZE:
+        _ROW_CACHE.popitem(last=False)
+    return rows
+
+
+@lru_cache(maxsize=128)
+def _nav_row(kind: str, page: int, total_pages: int) -> tuple:
+    """分页导航按钮行，按钮不可变，可在多次渲染间复用"""
+    page_data = _PAGE_DATA[kind]
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton("◀️ 上一页", callback_data=page_data(page - 1)))
+    if page < total_pages - 1:
+        buttons.append(InlineKeyboardButton("下一页 ▶️", callback_data=page_data(page + 1)))
+    return tuple(buttons)
+
+
+def _get_cached_page(key: tuple) -> Optional[tuple]:
+    """读取分页缓存，命中时移到队尾"""
+    entry = _PAGE_CACHE.get(key)
+    if entry is not None:
+        _PAGE_CACHE.move_to_end(key)
+    return entry
+
+
+def _cache_page(key: tuple, entry: tuple):
+    """写入分页缓存，超过容量时淘汰最久未用的条目"""
+    _PAGE_CACHE[key] = entry
+    _PAGE_CACHE.move_to_end(key)
+    if len(_PAGE_CACHE) > _PAGE_CACHE_SIZE:
+        _PAGE_CACHE.popitem(last=False)
+
+
+# 技能菜单与详情页均为静态内容，导入时构建一次
+
+_SKILL_MENU_TEXT = "🛠️ *可用技能*\n\n点击技能名称直接使用，点击 ℹ️ 查看详情"
+_SKILL_MENU_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📋 Plan", callback_data="skill:plan:use"),
+        InlineKeyboardButton("ℹ️", callback_data="skill:plan:info"),
+    ],
+    [
+        InlineKeyboardButton("🔄 Ralph", callback_data="skill:ralph:use"),
+        InlineKeyboardButton("ℹ️", callback_data="skill:ralph:info"),
+    ],
+    [
+        InlineKeyboardButton("🎤 Transcribe", callback_data="skill:transcribe:info"),
+        InlineKeyboardButton("ℹ️", callback_data="skill:transcribe:info"),
+    ],
+])
+
+_SKILL_BACK_BUTTON = InlineKeyboardButton("◀️ 返回", callback_data="skill:back:menu")
+
+_PLAN_INFO_TEXT = (
+    "📋 *Planning\\-with\\-Files*\n\n"
+    "*功能:*\n"
+    "• 创建 task\\_plan\\.md \\- 任务计划\n"
+    "• 创建 findings\\.md \\- 发现记录\n"
+    "• 创建 progress\\.md \\- 进度追踪\n\n"
+    "*适用场景:*\n"
+    "• 复杂多步骤任务\n"
+    "• 研究项目\n"
+    "• 需要 \>5 次工具调用的任务"
+)
+_PLAN_INFO_MARKUP = InlineKeyboardMarkup([[
+    InlineKeyboardButton("▶️ 使用", callback_data="skill:plan:use"),
+    _SKILL_BACK_BUTTON,
+]])
+
+_RALPH_INFO_TEXT = (
+    "🔄 *Ralph\\-Loop*\n\n"
+    "*功能:*\n"
+    "• 自动迭代执行直到任务完成\n"
+    "• 每次迭代继承上次结果\n"
+    "• 输出完成标记时自动停止\n\n"
+    "*参数:*\n"
+    "• `\\-\\-max N` \\- 最大迭代次数 \\(默认 10\\)\n"
+    "• `\\-\\-promise TEXT` \\- 完成标记"
+)
+_RALPH_INFO_MARKUP = InlineKeyboardMarkup([[
+    InlineKeyboardButton("▶️ 使用", callback_data="skill:ralph:use"),
+    _SKILL_BACK_BUTTON,
+]])
+
+# Transcribe 只有 info，因为触发靠发送音频
+_TRANSCRIBE_INFO_TEXT = (
+    "🎤 *Transcribe*\n\n"
+    "*功能:*\n"
+    "• 语音/音频文件转录为文字\n"
+    "• 支持多种加工模版整理\n"
+    "• 支持自定义提示词加工\n\n"
+    "*使用方式:*\n"
+    "• 直接发送语音消息\n"
+    "• 发送音频文件 \\(mp3/m4a/wav等\\)\n"
+    "• 转录后选择加工模版\n\n"
+    "*可用模版:*\n"
+    "📋 会议纪要 \\| 📝 内容摘要\n"
+    "✅ 待办提取 \\| 📰 文章整理\n"
+    "📄 仅转录 \\| ✏️ 自定义提示"
+)
+_TRANSCRIBE_INFO_MARKUP = InlineKeyboardMarkup([[_SKILL_BACK_BUTTON]])
+
+
+async def _handle_skill_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, arg: str):
+    """处理技能按钮回调"""
+    query = update.callback_query
+    # 参数: {skill_name}:{action}
+    # skill_name: plan、ralph、transcribe 或 back；action: use 或 info
+    skill_name, sep, action = arg.partition(":")
+    if not sep:
+        await _edit_if_changed(query, "⚠️ 无效的技能数据")
+        return
 
-    if not page_archived:
-        await query.edit_message_text("📭 没有更多归档会话")
+    handler = _SKILL_HANDLERS.get(skill_name)
+    if not handler:
+        await _edit_if_changed(query, "⚠️ 未知的技能")
         return
+    await handler(query, context, action)
 
-    # 构建按钮
-    keyboard = []
-    for session in page_archived:
-        session_id = session.get("id", "")
-        info = format_session_info(session, False)
-        keyboard.append([
-            InlineKeyboardButton(f"🗄️ {info}", callback_data=f"restore:{session_id}")
-        ])
 
-    # 分页按钮
-    nav_buttons = []
-    if page > 0:
-        nav_buttons.append(
-            InlineKeyboardButton("◀️ 上一页", callback_data=f"page_archived_{page - 1}")
-        )
-    if page < total_pages - 1:
-        nav_buttons.append(
-            InlineKeyboardButton("下一页 ▶️", callback_data=f"page_archived_{page + 1}")
+async def _skill_plan(query, context: ContextTypes.DEFAULT_TYPE, action: str):
+    if action == "use":
+        # 存储等待状态，消息处理器会检测这个状态
+        context.user_data['pending_skill'] = 'plan'
+        # 发送新消息并强制回复
+        await query.message.reply_text(
+            "📋 *Planning\\-with\\-Files*\n\n请直接输入任务描述:",
+            parse_mode='MarkdownV2',
+            reply_markup=ForceReply(selective=True, input_field_placeholder="/plan 你的任务描述")
         )
-    if nav_buttons:
-        keyboard.append(nav_buttons)
+        return
+    await _edit_if_changed(query, _PLAN_INFO_TEXT, reply_markup=_PLAN_INFO_MARKUP, parse_mode='MarkdownV2')
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_text(
-        f"🗄️ 归档会话 (第 {page + 1}/{total_pages} 页)\n"
-        f"点击恢复会话:",
-        reply_markup=reply_markup
-    )
 
+async def _skill_ralph(query, context: ContextTypes.DEFAULT_TYPE, action: str):
+    if action == "use":
+        # 存储等待状态
+        context.user_data['pending_skill'] = 'ralph'
+        # 发送新消息并强制回复
+        await query.message.reply_text(
+            "🔄 *Ralph\\-Loop*\n\n请直接输入任务描述:\n\\(可选: 添加 `\\-\\-max N` 设置最大迭代次数\\)",
+            parse_mode='MarkdownV2',
+            reply_markup=ForceReply(selective=True, input_field_placeholder="/ralph 你的任务描述")
+        )
+        return
+    await _edit_if_changed(query, _RALPH_INFO_TEXT, reply_markup=_RALPH_INFO_MARKUP, parse_mode='MarkdownV2')
 
-def _find_task_by_session_prefix(user_id: int, session_id_prefix: str):
-    """通过会话 ID 前缀查找任务"""
-    tasks = task_manager.get_user_tasks(user_id)
-    for task in tasks:
-        if task.session_id and task.session_id.startswith(session_id_prefix):
-            return task
-    return None
 
+async def _skill_transcribe(query, context: ContextTypes.DEFAULT_TYPE, action: str):
+    await _edit_if_changed(query, _TRANSCRIBE_INFO_TEXT, reply_markup=_TRANSCRIBE_INFO_MARKUP, parse_mode='MarkdownV2')
 
-async def _handle_skill_callback(query, context: ContextTypes.DEFAULT_TYPE, user_id: int, data: str):
-    """处理技能按钮回调"""
-    parts = data.split(":")
-    if len(parts) < 3:
-        await query.edit_message_text("⚠️ 无效的技能数据")
-        return
 
-    skill_name = parts[1]  # plan 或 ralph
-    action = parts[2]      # use 或 info
-
-    if skill_name == "plan":
-        if action == "use":
-            # 存储等待状态，消息处理器会检测这个状态
-            context.user_data['pending_skill'] = 'plan'
-            # 发送新消息并强制回复
-            await query.message.reply_text(
-                "📋 *Planning\\-with\\-Files*\n\n请直接输入任务描述:",
-                parse_mode='MarkdownV2',
-                reply_markup=ForceReply(selective=True, input_field_placeholder="/plan 你的任务描述")
-            )
-            await query.answer()
-            return
-        else:  # info
-            text = (
-                "📋 *Planning\\-with\\-Files*\n\n"
-                "*功能:*\n"
-                "• 创建 task\\_plan\\.md \\- 任务计划\n"
-                "• 创建 findings\\.md \\- 发现记录\n"
-                "• 创建 progress\\.md \\- 进度追踪\n\n"
-                "*适用场景:*\n"
-                "• 复杂多步骤任务\n"
-                "• 研究项目\n"
-                "• 需要 \>5 次工具调用的任务"
-            )
-            keyboard = [[
-                InlineKeyboardButton("▶️ 使用", callback_data="skill:plan:use"),
-                InlineKeyboardButton("◀️ 返回", callback_data="skill:back:menu")
-            ]]
-
-    elif skill_name == "ralph":
-        if action == "use":
-            # 存储等待状态
-            context.user_data['pending_skill'] = 'ralph'
-            # 发送新消息并强制回复
-            await query.message.reply_text(
-                "🔄 *Ralph\\-Loop*\n\n请直接输入任务描述:\n\\(可选: 添加 `\\-\\-max N` 设置最大迭代次数\\)",
-                parse_mode='MarkdownV2',
-                reply_markup=ForceReply(selective=True, input_field_placeholder="/ralph 你的任务描述")
-            )
-            await query.answer()
-            return
-        else:  # info
-            text = (
-                "🔄 *Ralph\\-Loop*\n\n"
-                "*功能:*\n"
-                "• 自动迭代执行直到任务完成\n"
-                "• 每次迭代继承上次结果\n"
-                "• 输出完成标记时自动停止\n\n"
-                "*参数:*\n"
-                "• `\\-\\-max N` \\- 最大迭代次数 \\(默认 10\\)\n"
-                "• `\\-\\-promise TEXT` \\- 完成标记"
-            )
-            keyboard = [[
-                InlineKeyboardButton("▶️ 使用", callback_data="skill:ralph:use"),
-                InlineKeyboardButton("◀️ 返回", callback_data="skill:back:menu")
-            ]]
-
-    elif skill_name == "transcribe":
-        # Transcribe 只有 info，因为触发靠发送音频
-        text = (
-            "🎤 *Transcribe*\n\n"
-            "*功能:*\n"
-            "• 语音/音频文件转录为文字\n"
-            "• 支持多种加工模版整理\n"
-            "• 支持自定义提示词加工\n\n"
-            "*使用方式:*\n"
-            "• 直接发送语音消息\n"
-            "• 发送音频文件 \\(mp3/m4a/wav等\\)\n"
-            "• 转录后选择加工模版\n\n"
-            "*可用模版:*\n"
-            "📋 会议纪要 \\| 📝 内容摘要\n"
-            "✅ 待办提取 \\| 📰 文章整理\n"
-            "📄 仅转录 \\| ✏️ 自定义提示"
-        )
-        keyboard = [[
-            InlineKeyboardButton("◀️ 返回", callback_data="skill:back:menu")
-        ]]
-
-    elif skill_name == "back":
-        # 返回技能列表
-        keyboard = [
-            [
-                InlineKeyboardButton("📋 Plan", callback_data="skill:plan:use"),
-                InlineKeyboardButton("ℹ️", callback_data="skill:plan:info"),
-            ],
-            [
-                InlineKeyboardButton("🔄 Ralph", callback_data="skill:ralph:use"),
-                InlineKeyboardButton("ℹ️", callback_data="skill:ralph:info"),
-            ],
-            [
-                InlineKeyboardButton("🎤 Transcribe", callback_data="skill:transcribe:info"),
-                InlineKeyboardButton("ℹ️", callback_data="skill:transcribe:info"),
-            ],
-        ]
-        text = "🛠️ *可用技能*\n\n点击技能名称直接使用，点击 ℹ️ 查看详情"
-        await query.edit_message_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode='Markdown'
-        )
-        return
+async def _skill_back(query, context: ContextTypes.DEFAULT_TYPE, action: str):
+    # 返回技能列表
+    await _edit_if_changed(query, _SKILL_MENU_TEXT, reply_markup=_SKILL_MENU_MARKUP, parse_mode='Markdown')
 
-    else:
-        await query.edit_message_text("⚠️ 未知的技能")
-        return
 
-    await query.edit_message_text(
-        text,
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='MarkdownV2'
-    )
+_SKILL_HANDLERS = {
+    "plan": _skill_plan,
+    "ralph": _skill_ralph,
+    "transcribe": _skill_transcribe,
+    "back": _skill_back,
+}
 
 
 # =====================================
@@ -863,7 +915,8 @@ async def _handle_cron_menu(query, user_id: int):
         [InlineKeyboardButton("📋 任务列表", callback_data="cron_tasks_list")],
     ]
 
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         text,
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode='Markdown'
@@ -925,18 +978,19 @@ async def _handle_cron_notify_interval_menu(query, user_id: int):
 
     keyboard.append([InlineKeyboardButton("◀️ 返回", callback_data="cron_menu")])
 
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         text,
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode='Markdown'
     )
 
 
-async def _handle_cron_notify_interval(query, user_id: int, data: str):
+async def _handle_cron_notify_interval(query, user_id: int, arg: str):
     """设置通知间隔"""
     from ..services.cron_config import cron_config
 
-    interval = int(data.split(":")[1])
+    interval = int(arg)
     cron_config.set_notification_interval(interval)
 
     await query.answer(f"已设置为每 {interval} 分钟")
@@ -960,7 +1014,8 @@ async def _handle_cron_tasks_list(query, user_id: int):
 
         keyboard = [[InlineKeyboardButton("◀️ 返回", callback_data="cron_menu")]]
 
-        await query.edit_message_text(
+        await _edit_if_changed(
+            query,
             text,
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode='Markdown'
@@ -1006,18 +1061,19 @@ async def _handle_cron_tasks_list(query, user_id: int):
 
     keyboard.append([InlineKeyboardButton("◀️ 返回", callback_data="cron_menu")])
 
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         text,
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode='Markdown'
     )
 
 
-async def _handle_cron_task_toggle(query, user_id: int, data: str):
+async def _handle_cron_task_toggle(query, user_id: int, arg: str):
     """切换任务开关（通过注释/取消注释实现）"""
     from ..services.cron_config import cron_config
 
-    line_num = int(data.split(":")[1])
+    line_num = int(arg)
     tasks = cron_config.get_cron_tasks()
 
     # 找到对应任务
@@ -1044,11 +1100,11 @@ async def _handle_cron_task_toggle(query, user_id: int, data: str):
     await _handle_cron_tasks_list(query, user_id)
 
 
-async def _handle_cron_task_delete(query, user_id: int, data: str):
+async def _handle_cron_task_delete(query, user_id: int, arg: str):
     """显示删除确认"""
     from ..services.cron_config import cron_config
 
-    line_num = int(data.split(":")[1])
+    line_num = int(arg)
     tasks = cron_config.get_cron_tasks()
 
     # 找到对应任务
@@ -1076,18 +1132,19 @@ async def _handle_cron_task_delete(query, user_id: int, data: str):
         ]
     ]
 
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         text,
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode='Markdown'
     )
 
 
-async def _handle_cron_task_delete_confirm(query, user_id: int, data: str):
+async def _handle_cron_task_delete_confirm(query, user_id: int, arg: str):
     """确认删除任务"""
     from ..services.cron_config import cron_config
 
-    line_num = int(data.split(":")[1])
+    line_num = int(arg)
 
     success = cron_config.remove_cron_task(line_num)
 
@@ -1100,11 +1157,11 @@ async def _handle_cron_task_delete_confirm(query, user_id: int, data: str):
     await _handle_cron_tasks_list(query, user_id)
 
 
-async def _handle_cron_task_schedule_menu(query, user_id: int, data: str):
+async def _handle_cron_task_schedule_menu(query, user_id: int, arg: str):
     """显示任务周期修改菜单"""
     from ..services.cron_config import cron_config
 
-    line_num = int(data.split(":")[1])
+    line_num = int(arg)
     tasks = cron_config.get_cron_tasks()
 
     # 找到对应任务
@@ -1147,20 +1204,20 @@ async def _handle_cron_task_schedule_menu(query, user_id: int, data: str):
 
     keyboard.append([InlineKeyboardButton("◀️ 返回", callback_data="cron_tasks_list")])
 
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         text,
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode='Markdown'
     )
 
 
-async def _handle_cron_task_set_schedule(query, user_id: int, data: str):
+async def _handle_cron_task_set_schedule(query, user_id: int, arg: str):
     """设置任务执行周期"""
     from ..services.cron_config import cron_config
 
-    parts = data.split(":", 2)
-    line_num = int(parts[1])
-    new_cron_expr = parts[2]
+    line_text, _, new_cron_expr = arg.partition(":")
+    line_num = int(line_text)
 
     success = cron_config.update_cron_schedule(line_num, new_cron_expr)
 
@@ -1173,13 +1230,12 @@ async def _handle_cron_task_set_schedule(query, user_id: int, data: str):
     await _handle_cron_tasks_list(query, user_id)
 
 
-async def _handle_set_target(query, user_id: int, data: str):
+async def _handle_set_target(query, user_id: int, target: str):
     """处理执行目标切换"""
-    target = data.split(":", 1)[1]
-
     if target == "vps":
         session_manager.set_execution_target(user_id, "vps")
-        await query.edit_message_text(
+        await _edit_if_changed(
+            query,
             "🖥️ 已切换到 *VPS 执行*\n\n任务将在 VPS 本地 Claude CLI 执行",
             parse_mode='Markdown'
         )
@@ -1189,13 +1245,15 @@ async def _handle_set_target(query, user_id: int, data: str):
         current_url = session_manager.get_local_node_url(user_id)
         if current_url:
             session_manager.set_execution_target(user_id, "local")
-            await query.edit_message_text(
+            await _edit_if_changed(
+                query,
                 f"💻 已切换到 *本地节点执行*\n\n"
                 f"节点地址: `{current_url}`",
                 parse_mode='Markdown'
             )
         else:
-            await query.edit_message_text(
+            await _edit_if_changed(
+                query,
                 "❌ 请先设置本地节点 URL\n\n"
                 "用法: `/target local http://100.x.x.x:2026`",
                 parse_mode='Markdown'
@@ -1203,7 +1261,8 @@ async def _handle_set_target(query, user_id: int, data: str):
 
     elif target == "local_setup":
         # 提示用户设置本地节点
-        await query.edit_message_text(
+        await _edit_if_changed(
+            query,
             "💻 *设置本地节点*\n\n"
             "请使用命令设置本地节点 URL:\n"
             "`/target local http://100.x.x.x:2026`\n\n"
@@ -1213,14 +1272,14 @@ async def _handle_set_target(query, user_id: int, data: str):
         )
 
     else:
-        await query.edit_message_text(f"❌ 无效目标: {target}")
+        await _edit_if_changed(query, f"❌ 无效目标: {target}")
 
 
 # =====================================
 # 转录模版回调处理
 # =====================================
 
-async def _handle_transcribe_template(update: Update, query, context: ContextTypes.DEFAULT_TYPE, user_id: int, data: str):
+async def _handle_transcribe_template(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, arg: str):
     """
     处理转录模版选择回调
 
@@ -1229,22 +1288,21 @@ async def _handle_transcribe_template(update: Update, query, context: ContextTyp
     from ..services.skills import transcribe_manager, TRANSCRIBE_TEMPLATES
     from .messages import handle_message
 
-    parts = data.split(":")
-    if len(parts) < 3:
-        await query.edit_message_text("⚠️ 无效的模版数据")
+    query = update.callback_query
+    template_key, sep, _ = arg.partition(":")
+    if not sep:
+        await _edit_if_changed(query, "⚠️ 无效的模版数据")
         return
 
-    template_key = parts[1]
-
     # 获取暂存的转录文本
     transcribed_text = context.user_data.get('pending_transcription')
     if not transcribed_text:
-        await query.edit_message_text("❌ 转录文本已过期，请重新发送音频")
+        await _edit_if_changed(query, "❌ 转录文本已过期，请重新发送音频")
         return
 
     template = TRANSCRIBE_TEMPLATES.get(template_key)
     if not template:
-        await query.edit_message_text("⚠️ 未知的模版类型")
+        await _edit_if_changed(query, "⚠️ 未知的模版类型")
         return
 
     template_name = template["name"]
@@ -1253,7 +1311,8 @@ async def _handle_transcribe_template(update: Update, query, context: ContextTyp
     if template_key == "raw":
         # 清除暂存
         context.user_data.pop('pending_transcription', None)
-        await query.edit_message_text(
+        await _edit_if_changed(
+            query,
             f"📄 转录文本：\n\n{transcribed_text}"
         )
         return
@@ -1261,7 +1320,7 @@ async def _handle_transcribe_template(update: Update, query, context: ContextTyp
     # 构建加工 prompt
     process_prompt = transcribe_manager.build_process_prompt(template_key, transcribed_text)
     if not process_prompt:
-        await query.edit_message_text("❌ 模版构建失败")
+        await _edit_if_changed(query, "❌ 模版构建失败")
         return
 
     # 记录模版信息，用于加工完成后保存结果
@@ -1280,7 +1339,8 @@ async def _handle_transcribe_template(update: Update, query, context: ContextTyp
     context.user_data.pop('transcription_path', None)
 
     # 更新消息显示正在加工
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         f"{template['emoji']} 正在用「{template_name}」模版整理..."
     )
 
@@ -1291,22 +1351,24 @@ async def _handle_transcribe_template(update: Update, query, context: ContextTyp
     await handle_message(update, context)
 
 
-async def _handle_transcribe_custom(query, context: ContextTypes.DEFAULT_TYPE, user_id: int, data: str):
+async def _handle_transcribe_custom(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, arg: str):
     """
     处理转录自定义提示回调
 
     设置 pending_skill，等待用户输入自定义 prompt
     """
+    query = update.callback_query
     # 检查是否有暂存的转录文本
     transcribed_text = context.user_data.get('pending_transcription')
     if not transcribed_text:
-        await query.edit_message_text("❌ 转录文本已过期，请重新发送音频")
+        await _edit_if_changed(query, "❌ 转录文本已过期，请重新发送音频")
         return
 
     # 设置待处理状态
     context.user_data['pending_skill'] = 'transcribe_custom'
 
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         "✏️ *自定义加工*\n\n"
         "请直接发送您的提示词，例如：\n"
         "• 翻译成英文\n"
@@ -1321,29 +1383,28 @@ async def _handle_transcribe_custom(query, context: ContextTypes.DEFAULT_TYPE, u
 # SEO 关键词挖掘回调处理
 # =====================================
 
-async def _handle_seo_callback(query, context, user_id: int, data: str):
+async def _handle_seo_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, action: str):
     """处理 SEO 关键词挖掘回调"""
     from ..services.skills import keyword_mining_manager
     from .messages import handle_message
 
-    parts = data.split(":")
-    if len(parts) < 2:
-        await query.edit_message_text("⚠️ 无效的操作")
+    query = update.callback_query
+    if not action:
+        await _edit_if_changed(query, "⚠️ 无效的操作")
         return
 
-    action = parts[1]
-
     # 查看历史报告
     if action == "report":
         if not keyword_mining_manager:
-            await query.edit_message_text("❌ 关键词挖掘服务未初始化")
+            await _edit_if_changed(query, "❌ 关键词挖掘服务未初始化")
             return
 
         project_dir = claude_executor.get_user_project_dir(user_id)
         status = keyword_mining_manager.get_mining_status(project_dir)
 
         if not status or not status.get('reports'):
-            await query.edit_message_text(
+            await _edit_if_changed(
+                query,
                 "📭 暂无历史报告\n\n使用 `/seo <领域>` 开始挖掘",
                 parse_mode='Markdown'
             )
@@ -1354,7 +1415,8 @@ async def _handle_seo_callback(query, context, user_id: int, data: str):
             text += f"• `{report['filename']}` ({report['modified']})\n"
 
         keyboard = [[InlineKeyboardButton("◀️ 返回", callback_data="seo:menu")]]
-        await query.edit_message_text(
+        await _edit_if_changed(
+            query,
             text,
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode='Markdown'
@@ -1378,7 +1440,8 @@ async def _handle_seo_callback(query, context, user_id: int, data: str):
             ],
         ]
 
-        await query.edit_message_text(
+        await _edit_if_changed(
+            query,
             "🔍 *SEO 关键词挖掘*\n\n"
             "*快捷挖掘:* 点击下方按钮\n\n"
             "*自定义挖掘:*\n"
@@ -1418,13 +1481,14 @@ async def _handle_seo_callback(query, context, user_id: int, data: str):
     }
 
     if action not in direction_config:
-        await query.edit_message_text(f"⚠️ 未知的挖掘方向: {action}")
+        await _edit_if_changed(query, f"⚠️ 未知的挖掘方向: {action}")
         return
 
     config = direction_config[action]
 
     # 更新消息显示进行中状态
-    await query.edit_message_text(
+    await _edit_if_changed(
+        query,
         f"🔍 *正在挖掘 {action.upper()} 方向关键词...*\n\n"
         "请稍候，这可能需要一些时间...",
         parse_mode='Markdown'
@@ -1456,7 +1520,9 @@ async def _handle_seo_callback(query, context, user_id: int, data: str):
     from ..services.claude import claude_executor
 
     try:
-        output, _ = claude_executor.execute_sync(
+        # execute_sync 会阻塞直到 Claude 结束，放到线程中执行
+        output, _ = await asyncio.to_thread(
+            claude_executor.execute_sync,
             prompt=mining_prompt,
             session_id=None,
             user_id=user_id
@@ -1476,6 +1542,72 @@ async def _handle_seo_callback(query, context, user_id: int, data: str):
         await query.message.reply_text(f"❌ 挖掘失败: {str(e)[:200]}")
 
 
+# =====================================
+# 回调路由表
+# =====================================
+
+# 无参数回调：整串匹配，以 (query, user_id) 调用
+_EXACT_ROUTES = {
+    "back_project_root": _handle_back_project_root,
+    "cron_menu": _handle_cron_menu,
+    "cron_notify_toggle": _handle_cron_notify_toggle,
+    "cron_notify_interval_menu": _handle_cron_notify_interval_menu,
+    "cron_tasks_list": _handle_cron_tasks_list,
+}
+
+# 带参数回调：以 (query, user_id, arg) 调用
+_ROUTES = {
+    opcodes.SWITCH: _handle_switch_session,
+    opcodes.RESTORE: _handle_restore_session,
+    opcodes.BROWSE_DIR: _handle_browse_dir,
+    opcodes.SELECT_PROJECT: _handle_select_project,
+    opcodes.CONFIRM_PROJECT: _handle_confirm_project,
+    "set_model": _handle_set_model,
+    "set_mode": _handle_set_mode,
+    "set_project": _handle_set_project,
+    "answer_opt": _handle_answer_option,
+    "custom_input": _handle_custom_input,
+    "confirm_plan": _handle_confirm_plan,
+    "cancel_plan": _handle_cancel_plan,
+    "page_sessions": _handle_sessions_pagination,
+    "page_archived": _handle_archived_pagination,
+    "cancel_task": _handle_cancel_task,
+    "cron_notify_interval": _handle_cron_notify_interval,
+    "cron_task_toggle": _handle_cron_task_toggle,
+    "cron_task_delete": _handle_cron_task_delete,
+    "cron_task_delete_confirm": _handle_cron_task_delete_confirm,
+    "cron_task_schedule": _handle_cron_task_schedule_menu,
+    "cron_task_set_schedule": _handle_cron_task_set_schedule,
+    "set_target": _handle_set_target,
+    # 旧消息上的按钮仍使用完整前缀
+    "switch": _handle_switch_session,
+    "switch_session": _handle_switch_session,
+    "restore": _handle_restore_session,
+    "unarchive_session": _handle_restore_session,
+    "browse_dir": _handle_browse_dir,
+    "select_project": _handle_select_project,
+    "confirm_project": _handle_confirm_project,
+}
+
+# 需要 context（及 update）的回调：以 (update, context, user_id, arg) 调用
+_CONTEXT_ROUTES = {
+    "skill": _handle_skill_callback,
+    "transcribe_tpl": _handle_transcribe_template,
+    "transcribe_custom": _handle_transcribe_custom,
+    "seo": _handle_seo_callback,
+}
+
+# 以下划线拼接参数的回调（如 answer_opt_{session_prefix}_{index}）；
+# "前缀:参数" 形式已在 button_callback 中按冒号切分查表，不经过正则
+_UNDERSCORE_ROUTES = (
+    "answer_opt", "custom_input", "confirm_plan", "cancel_plan",
+    "cancel_task", "page_sessions", "page_archived",
+)
+
+# 前缀 + "_" + 参数，整个备选集编译为一个模式，一次匹配同时取出前缀和参数
+_CB_RE = re.compile(r"(%s)_(.*)" % "|".join(_UNDERSCORE_ROUTES), re.S)
+
+
 def get_callback_handlers():
     """返回回调处理器列表"""
     return [
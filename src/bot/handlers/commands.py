@@ -14,6 +14,7 @@ from ...utils.formatters import escape_markdown, safe_truncate
 from ..services.session import session_manager
 from ..services.claude import claude_executor, AVAILABLE_MODELS, EXECUTION_MODES
 from ..services.memory import get_memory_manager
+from .opcodes import SWITCH_DATA, RESTORE_DATA, BROWSE_DIR_DATA, SELECT_PROJECT_DATA
 
 logger = logging.getLogger(__name__)
 
@@ -153,7 +154,7 @@ async def list_sessions(update: Update, context: ContextTypes.DEFAULT_TYPE):
         keyboard.append([
             InlineKeyboardButton(
                 button_text,
-                callback_data=f"switch_session:{session_id}"
+                callback_data=SWITCH_DATA(session_id)
             )
         ])
 
@@ -227,7 +228,7 @@ async def archived_sessions(update: Update, context: ContextTypes.DEFAULT_TYPE):
         keyboard.append([
             InlineKeyboardButton(
                 button_text,
-                callback_data=f"unarchive_session:{session_id}"
+                callback_data=RESTORE_DATA(session_id)
             )
         ])
 
@@ -540,7 +541,7 @@ async def project_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             keyboard.append([
                 InlineKeyboardButton(
                     f"{prefix}📌 {name}",
-                    callback_data=f"select_project:{path}"
+                    callback_data=SELECT_PROJECT_DATA(path)
                 )
             ])
         else:
@@ -548,11 +549,11 @@ async def project_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             keyboard.append([
                 InlineKeyboardButton(
                     f"{prefix}📁 {name}",
-                    callback_data=f"browse_dir:{path}"
+                    callback_data=BROWSE_DIR_DATA(path)
                 ),
                 InlineKeyboardButton(
                     "✓ 选择",
-                    callback_data=f"select_project:{path}"
+                    callback_data=SELECT_PROJECT_DATA(path)
                 )
             ])
 
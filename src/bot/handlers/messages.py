@@ -806,17 +806,21 @@ async def _handle_ask_user_question(
         first_question = questions[0] if questions else {}
         options = first_question.get("options", [])
 
+        # 回调按 task_manager 的前缀索引查找任务：取任务当前的会话 ID
+        # （新会话执行中会换成 Claude 返回的 ID），长度与索引一致
+        session_prefix = (task.session_id or session_id)[:task_manager.SESSION_PREFIX_LEN]
+
         for idx, opt in enumerate(options):
             label = opt.get("label", f"选项 {idx + 1}")
             # 回调数据格式: answer_opt_{session_id}_{option_index}
-            callback_data = f"answer_opt_{session_id[:8]}_{idx}"
+            callback_data = f"answer_opt_{session_prefix}_{idx}"
             keyboard.append([InlineKeyboardButton(label, callback_data=callback_data)])
 
         # 添加自定义输入按钮
         keyboard.append([
             InlineKeyboardButton(
                 "✏️ 自定义输入",
-                callback_data=f"custom_input_{session_id[:8]}"
+                callback_data=f"custom_input_{session_prefix}"
             )
         ])
 
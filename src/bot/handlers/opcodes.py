@@ -0,0 +1,22 @@
+"""
+CloudWork Callback Opcodes
+
+携带长参数的回调数据使用 2 字符操作码作前缀，
+按钮生成方（commands、callbacks）与 button_callback 的路由表共用
+
+Telegram 限制 callback_data 为 64 字节，项目路径（中文每字 3 字节）
+和会话 ID 占去大半，前缀越短，能放下的参数越长
+"""
+
+SWITCH = "sw"
+RESTORE = "rs"
+BROWSE_DIR = "bd"
+SELECT_PROJECT = "sp"
+CONFIRM_PROJECT = "cp"
+
+# 回调数据模版: SWITCH_DATA(session_id) -> "sw:{session_id}"
+SWITCH_DATA = f"{SWITCH}:{{}}".format
+RESTORE_DATA = f"{RESTORE}:{{}}".format
+BROWSE_DIR_DATA = f"{BROWSE_DIR}:{{}}".format
+SELECT_PROJECT_DATA = f"{SELECT_PROJECT}:{{}}".format
+CONFIRM_PROJECT_DATA = f"{CONFIRM_PROJECT}:{{}}".format
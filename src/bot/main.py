@@ -18,6 +18,7 @@ from .handlers.commands import get_command_handlers
 from .handlers.messages import get_message_handlers
 from .handlers.callbacks import get_callback_handlers
 from .services.task import task_manager
+from .services.session import session_manager
 from .services.cron_notifier import init_cron_notifier, cron_notifier
 from .services.memory import init_memory
 
@@ -32,6 +33,23 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def _bot_api_http_version() -> str:
+    """
+    Bot API 请求使用的 HTTP 版本
+
+    HTTP/2 下并发的 editMessageText 等请求在同一条 TLS 连接上多路复用，
+    不再各占一条连接；配置为 2 但未安装 h2 时回退到 HTTP/1.1
+    """
+    version = settings.telegram_http_version
+    if version in ("2", "2.0"):
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning('未安装 h2，Bot API 请求使用 HTTP/1.1（pip install "python-telegram-bot[http2]"）')
+            return "1.1"
+    return version
+
+
 # =====================================
 # 应用生命周期
 # =====================================
@@ -65,6 +83,9 @@ async def post_init(application: Application) -> None:
     except Exception as e:
         logger.warning(f"设置命令菜单失败: {e}")
 
+    # 会话变更改为后台批量落盘
+    session_manager.start_flush_loop(settings.session_flush_interval)
+
     # 启动 Cron 通知服务（监听 cron 任务输出并发送通知）
     try:
         notifier = init_cron_notifier(application.bot)
@@ -85,6 +106,9 @@ async def post_shutdown(application: Application) -> None:
     # 清理所有运行中的任务
     await task_manager.cleanup_all_tasks()
 
+    # 写入未落盘的会话变更
+    await session_manager.stop_flush_loop()
+
     logger.info("Bot 已关闭")
 
 
@@ -147,6 +171,7 @@ def main():
         .post_init(post_init)
         .post_shutdown(post_shutdown)
         .concurrent_updates(True)  # 启用并发更新处理
+        .http_version(_bot_api_http_version())
         .build()
     )
 
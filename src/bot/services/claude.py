@@ -9,7 +9,9 @@ import re
 import asyncio
 import json
 import logging
+import shutil
 import time
+from functools import lru_cache
 from typing import Optional, Tuple, Dict, Any, Callable, Awaitable
 
 from ...utils.config import settings
@@ -39,6 +41,39 @@ EXECUTION_MODES = {
 }
 
 
+# 可执行文件名 -> 绝对路径，只缓存找到的结果
+_binary_paths: Dict[str, str] = {}
+
+
+def resolve_binary(name: str) -> str:
+    """
+    解析可执行文件的绝对路径（缓存结果，避免每次启动子进程都搜索 PATH）
+
+    找不到时原样返回名称且不缓存，之后安装或修改 PATH 后无需重启即可生效
+    """
+    path = _binary_paths.get(name)
+    if path is None:
+        path = shutil.which(name)
+        if path is None:
+            return name
+        _binary_paths[name] = path
+    return path
+
+
+@lru_cache(maxsize=32)
+def command_options(model: str, execution_mode: str) -> tuple:
+    """由模型和执行模式决定的 CLI 参数（组合有限，缓存复用）"""
+    options = ['--model', model, '--output-format', 'stream-json', '--verbose']
+
+    # 根据执行模式添加权限标志
+    if execution_mode == "plan":
+        options.extend(['--permission-mode', 'plan'])
+    else:
+        options.append('--dangerously-skip-permissions')
+
+    return tuple(options)
+
+
 class ClaudeExecutor:
     """Claude CLI 执行器"""
 
@@ -46,6 +81,8 @@ class ClaudeExecutor:
         self.work_dir = settings.work_dir
         self.workspace_dir = settings.workspace_dir
         self.projects: Dict[str, str] = {}
+        # 目录完整路径 -> (mtime_ns, 子目录名)，供项目浏览复用
+        self._subdir_cache: Dict[str, Tuple[int, Tuple[str, ...]]] = {}
         self._discover_projects()
 
     def _discover_projects(self):
@@ -122,27 +159,21 @@ class ClaudeExecutor:
             return result
 
         try:
-            for item in sorted(os.listdir(full_path)):
-                # 跳过隐藏文件
-                if item.startswith('.'):
-                    continue
+            for item in self._list_subdirs(full_path):
+                # 计算相对路径
+                if relative_path:
+                    item_relative_path = f"{relative_path}/{item}"
+                else:
+                    item_relative_path = item
 
-                item_full_path = os.path.join(full_path, item)
-                if os.path.isdir(item_full_path):
-                    # 计算相对路径
-                    if relative_path:
-                        item_relative_path = f"{relative_path}/{item}"
-                    else:
-                        item_relative_path = item
-
-                    # 检查是否是已注册的项目
-                    is_project = item_relative_path in self.projects
-
-                    result["dirs"].append({
-                        "name": item,
-                        "path": item_relative_path,
-                        "is_project": is_project
-                    })
+                # 检查是否是已注册的项目
+                is_project = item_relative_path in self.projects
+
+                result["dirs"].append({
+                    "name": item,
+                    "path": item_relative_path,
+                    "is_project": is_project
+                })
         except Exception as e:
             logger.error(f"获取目录内容时出错: {e}")
 
@@ -156,21 +187,37 @@ class ClaudeExecutor:
             return items
 
         try:
-            for item in sorted(os.listdir(self.workspace_dir)):
-                if item.startswith('.'):
-                    continue
-                item_path = os.path.join(self.workspace_dir, item)
-                if os.path.isdir(item_path):
-                    items.append({
-                        "name": item,
-                        "path": item,
-                        "is_special": False
-                    })
+            for item in self._list_subdirs(self.workspace_dir):
+                items.append({
+                    "name": item,
+                    "path": item,
+                    "is_special": False
+                })
         except Exception as e:
             logger.error(f"获取顶级目录时出错: {e}")
 
         return items
 
+    def _list_subdirs(self, full_path: str) -> Tuple[str, ...]:
+        """
+        列出目录下的非隐藏子目录（已排序）
+
+        以目录 mtime 作为版本：子项增删、重命名都会更新父目录的 mtime，
+        未变化时直接复用上次结果，一次 stat 代替 listdir 加逐项 stat
+        """
+        mtime = os.stat(full_path).st_mtime_ns
+        cached = self._subdir_cache.get(full_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with os.scandir(full_path) as entries:
+            names = tuple(sorted(
+                entry.name for entry in entries
+                if not entry.name.startswith('.') and entry.is_dir()
+            ))
+        self._subdir_cache[full_path] = (mtime, names)
+        return names
+
     def get_project_dir(self, project: str) -> str:
         """获取项目目录"""
         # default 项目使用 work_dir
@@ -182,8 +229,11 @@ class ClaudeExecutor:
             return self.projects[project]
 
         # 未注册但在 workspace 下的路径（支持任意深度）
+        # 命中后写入 self.projects，之后同名查找不再访问文件系统；
+        # 未命中不缓存，目录稍后创建时仍能识别（因此不对整个方法加 lru_cache，
+        # 那样会把 work_dir 兜底结果也固定下来）
         potential_path = os.path.join(self.workspace_dir, project)
-        if os.path.exists(potential_path) and os.path.isdir(potential_path):
+        if os.path.isdir(potential_path):
             # 动态注册这个项目
             self.projects[project] = potential_path
             logger.info(f"动态注册项目: {project} -> {potential_path}")
@@ -225,32 +275,11 @@ class ClaudeExecutor:
             self.is_valid_uuid(session_id)
         )
 
-        claude_bin = settings.claude_binary
-
+        cmd = [resolve_binary('unbuffer'), resolve_binary(settings.claude_binary)]
         if is_valid_session:
-            cmd = [
-                'unbuffer',
-                claude_bin, '--resume', session_id,
-                '-p', prompt,
-                '--model', model,
-                '--output-format', 'stream-json',
-                '--verbose'
-            ]
-        else:
-            cmd = [
-                'unbuffer',
-                claude_bin,
-                '-p', prompt,
-                '--model', model,
-                '--output-format', 'stream-json',
-                '--verbose'
-            ]
-
-        # 根据执行模式添加权限标志
-        if execution_mode == "plan":
-            cmd.extend(['--permission-mode', 'plan'])
-        else:
-            cmd.append('--dangerously-skip-permissions')
+            cmd.extend(['--resume', session_id])
+        cmd.extend(['-p', prompt])
+        cmd.extend(command_options(model, execution_mode))
 
         return cmd
 
@@ -476,7 +505,7 @@ class ClaudeExecutor:
         if event_type == "system":
             new_session_id = event.get("session_id")
             if new_session_id:
-                task.session_id = new_session_id
+                task_manager.set_task_session_id(task, new_session_id)
                 logger.info(f"获取到 session_id: {new_session_id[:8]}...")
 
             tools = event.get("tools", [])
@@ -4,12 +4,14 @@ CloudWork Session Management Service
 管理用户会话：创建、切换、归档、持久化
 """
 
+import asyncio
 import json
 import os
 import logging
 import hashlib
+import tempfile
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set
 from dataclasses import dataclass, field, asdict
 
 from ...utils.config import settings
@@ -86,6 +88,10 @@ class SessionManager:
         self.sessions_file = os.path.join(self.data_dir, "sessions.json")
         self.user_sessions: Dict[int, UserData] = {}
         self.message_to_session: Dict[int, str] = {}  # message_id -> session_id 映射
+        self._versions: Dict[int, int] = {}  # user_id -> 会话列表版本号，任何变更时递增
+        self._dirty: Set[int] = set()  # 有未落盘变更的用户
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
         self._ensure_data_dir()
         self.load_sessions()
 
@@ -112,25 +118,97 @@ class SessionManager:
             logger.info("会话数据文件不存在，使用空数据")
 
     def save_sessions(self):
-        """保存会话数据到文件"""
+        """立即保存会话数据到文件"""
         try:
-            data = {
-                str(user_id): user_data.to_dict()
-                for user_id, user_data in self.user_sessions.items()
-            }
-
-            with open(self.sessions_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-
+            self._write_file(self._dump())
+            # 写入成功后才清除标记，失败时留给下次保存重试
+            self._dirty.clear()
             logger.debug("会话数据已保存")
         except Exception as e:
             logger.error(f"保存会话数据失败: {e}")
 
+    def _dump(self) -> str:
+        data = {
+            str(user_id): user_data.to_dict()
+            for user_id, user_data in self.user_sessions.items()
+        }
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
+    def _write_file(self, text: str):
+        """先写临时文件再 os.replace，避免中途崩溃留下半个文件"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.data_dir, prefix=".sessions.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, self.sessions_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _mark_dirty(self, user_id: int):
+        """
+        标记用户数据已变更
+
+        后台落盘循环运行时只记录，由循环批量写入；否则立即写入
+        """
+        self._dirty.add(user_id)
+        if self._flush_task is None:
+            self.save_sessions()
+
+    def start_flush_loop(self, interval: float):
+        """启动后台落盘循环，需在事件循环中调用"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop(interval))
+            logger.info(f"会话后台落盘已启动，间隔 {interval} 秒")
+
+    async def stop_flush_loop(self):
+        """停止后台落盘循环并写入剩余变更（关闭时调用）"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    async def _flush_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    async def flush(self):
+        """把未落盘的变更写入文件"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            # 写入期间产生的新变更记到新集合里；写入失败或被取消时把本批放回，下次重试
+            dirty, self._dirty = self._dirty, set()
+            # 序列化在事件循环中完成，线程里只做文件写入，避免与会话修改并发
+            text = self._dump()
+            try:
+                await asyncio.to_thread(self._write_file, text)
+            except asyncio.CancelledError:
+                self._dirty |= dirty
+                raise
+            except Exception as e:
+                self._dirty |= dirty
+                logger.error(f"保存会话数据失败: {e}")
+                return
+            logger.debug(f"会话数据已保存 ({len(dirty)} 个用户有变更)")
+
+    def get_version(self, user_id: int) -> int:
+        """获取用户会话列表的版本号，供列表渲染缓存判断是否失效"""
+        return self._versions.get(user_id, 0)
+
+    def _bump_version(self, user_id: int):
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
     def get_or_create_user_data(self, user_id: int) -> UserData:
         """获取或创建用户数据"""
         if user_id not in self.user_sessions:
             self.user_sessions[user_id] = UserData()
-            self.save_sessions()
+            self._mark_dirty(user_id)
         return self.user_sessions[user_id]
 
     def get_active_session_id(self, user_id: int) -> Optional[str]:
@@ -147,7 +225,8 @@ class SessionManager:
         if session_id in user_data.sessions:
             user_data.sessions[session_id]["last_active"] = datetime.now().isoformat()
 
-        self.save_sessions()
+        self._bump_version(user_id)
+        self._mark_dirty(user_id)
 
     def create_session(
         self,
@@ -176,7 +255,8 @@ class SessionManager:
 
         user_data.sessions[session_id] = session.to_dict()
         user_data.active = session_id
-        self.save_sessions()
+        self._bump_version(user_id)
+        self._mark_dirty(user_id)
 
         logger.info(f"创建新会话: {session_id[:8]}... 名称: {name}")
         return session
@@ -201,7 +281,8 @@ class SessionManager:
             if increment_count:
                 session["message_count"] = session.get("message_count", 0) + 1
 
-            self.save_sessions()
+            self._bump_version(user_id)
+            self._mark_dirty(user_id)
 
     def touch_session(self, user_id: int, session_id: str):
         """
@@ -236,7 +317,8 @@ class SessionManager:
             if user_data.active == old_session_id:
                 user_data.active = new_session_id
 
-            self.save_sessions()
+            self._bump_version(user_id)
+            self._mark_dirty(user_id)
             logger.info(f"更新会话 ID: {old_session_id[:8]}... -> {new_session_id[:8]}...")
 
     def get_session(self, user_id: int, session_id: str) -> Optional[dict]:
@@ -287,18 +369,23 @@ class SessionManager:
             if user_data.active == session_id:
                 user_data.active = None
 
-            self.save_sessions()
+            self._bump_version(user_id)
+            self._mark_dirty(user_id)
             logger.info(f"归档会话: {session_id[:8]}...")
 
-    def unarchive_session(self, user_id: int, session_id: str):
+    def unarchive_session(self, user_id: int, session_id: str) -> bool:
         """恢复归档的会话"""
         user_data = self.get_or_create_user_data(user_id)
 
         if session_id in user_data.sessions:
             user_data.sessions[session_id]["archived"] = False
             user_data.active = session_id
-            self.save_sessions()
+            self._bump_version(user_id)
+            self._mark_dirty(user_id)
             logger.info(f"恢复会话: {session_id[:8]}...")
+            return True
+
+        return False
 
     def delete_session(self, user_id: int, session_id: str) -> bool:
         """删除会话"""
@@ -310,7 +397,8 @@ class SessionManager:
             if user_data.active == session_id:
                 user_data.active = None
 
-            self.save_sessions()
+            self._bump_version(user_id)
+            self._mark_dirty(user_id)
             logger.info(f"删除会话: {session_id[:8]}...")
             return True
 
@@ -357,7 +445,8 @@ class SessionManager:
         user_data.sessions[new_session_id] = new_session.to_dict()
         user_data.active = new_session_id
 
-        self.save_sessions()
+        self._bump_version(user_id)
+        self._mark_dirty(user_id)
         logger.info(f"清理会话上下文: {session_id[:8]}... -> {new_session_id[:8]}...")
 
         return new_session_id
@@ -395,6 +484,8 @@ class SessionManager:
                             user_data.active = None
 
                         archived_count += 1
+                        self._bump_version(user_id)
+                        self._mark_dirty(user_id)
                         logger.info(
                             f"自动归档会话: {session_id[:8]}... "
                             f"(用户 {user_id}, 不活跃 {inactive_minutes:.0f} 分钟)"
@@ -403,7 +494,6 @@ class SessionManager:
                     logger.warning(f"解析会话时间出错: {e}")
 
         if archived_count > 0:
-            self.save_sessions()
             logger.info(f"自动归档了 {archived_count} 个会话")
 
     # =====================================
@@ -419,7 +509,7 @@ class SessionManager:
         """设置用户模型"""
         user_data = self.get_or_create_user_data(user_id)
         user_data.model = model
-        self.save_sessions()
+        self._mark_dirty(user_id)
 
     def get_user_execution_mode(self, user_id: int) -> str:
         """获取用户执行模式"""
@@ -430,7 +520,7 @@ class SessionManager:
         """设置用户执行模式"""
         user_data = self.get_or_create_user_data(user_id)
         user_data.execution_mode = mode
-        self.save_sessions()
+        self._mark_dirty(user_id)
 
     def get_user_project(self, user_id: int) -> str:
         """获取用户当前项目"""
@@ -447,9 +537,10 @@ class SessionManager:
         # 即使旧项目有运行中的任务，也不会阻塞新项目的操作
         if old_project != project:
             user_data.active = None
+            self._bump_version(user_id)
             logger.info(f"切换项目 {old_project} -> {project}，清除活跃会话")
 
-        self.save_sessions()
+        self._mark_dirty(user_id)
 
     def set_pending_name(self, user_id: int, name: str):
         """设置待创建会话的名称"""
@@ -471,7 +562,7 @@ class SessionManager:
             raise ValueError(f"无效的执行目标: {target}")
         user_data = self.get_or_create_user_data(user_id)
         user_data.execution_target = target
-        self.save_sessions()
+        self._mark_dirty(user_id)
         logger.info(f"用户 {user_id} 切换执行目标: {target}")
 
     def get_local_node_url(self, user_id: int) -> Optional[str]:
@@ -483,7 +574,7 @@ class SessionManager:
         """设置用户的本地节点 URL (例如 http://100.x.x.x:2026)"""
         user_data = self.get_or_create_user_data(user_id)
         user_data.local_node_url = url
-        self.save_sessions()
+        self._mark_dirty(user_id)
         logger.info(f"用户 {user_id} 设置本地节点: {url}")
 
     def get_local_node_token(self, user_id: int) -> Optional[str]:
@@ -495,7 +586,7 @@ class SessionManager:
         """设置用户的本地节点 API Token"""
         user_data = self.get_or_create_user_data(user_id)
         user_data.local_node_token = token
-        self.save_sessions()
+        self._mark_dirty(user_id)
         logger.info(f"用户 {user_id} 设置本地节点 Token: {'***' if token else 'None'}")
 
     # =====================================
@@ -8,7 +8,7 @@ import asyncio
 import time
 import logging
 from dataclasses import dataclass, field
-from typing import Dict, Optional, Any, List, Tuple
+from typing import Dict, Iterator, Optional, Any, List, Tuple
 from enum import Enum
 
 logger = logging.getLogger(__name__)
@@ -41,6 +41,8 @@ class RunningTask:
     user_reply: Optional[str] = None
     session_not_found: bool = False
     question_options: Optional[List[Dict[str, str]]] = None
+    # running_tasks 中的键，session_id 为创建时的值，新会话拿到 ID 后不变
+    task_key: Optional[Tuple[int, Optional[str]]] = None
 
     def __post_init__(self):
         if self.input_event is None:
@@ -70,10 +72,19 @@ class TaskManager:
     # 计划超时时间（秒）
     PLAN_TIMEOUT = 300
 
+    # 回调数据中携带的会话 ID 前缀长度
+    SESSION_PREFIX_LEN = 8
+
     def __init__(self):
         # 运行中的任务 (user_id, session_id) -> RunningTask
         self.running_tasks: Dict[Tuple[int, Optional[str]], RunningTask] = {}
 
+        # 按用户索引 user_id -> {task_key: RunningTask}
+        self._by_user: Dict[int, Dict[Tuple[int, Optional[str]], RunningTask]] = {}
+
+        # 会话 ID 前缀索引 user_id -> {session_id[:8]: RunningTask}
+        self._prefix_index: Dict[int, Dict[str, RunningTask]] = {}
+
         # 待执行的计划 (user_id, session_id) -> PendingPlan
         self.pending_plans: Dict[Tuple[int, str], PendingPlan] = {}
 
@@ -96,11 +107,13 @@ class TaskManager:
             chat_id=chat_id,
             message_id=message_id,
             user_id=user_id,
-            input_event=asyncio.Event()
+            input_event=asyncio.Event(),
+            task_key=(user_id, session_id)
         )
 
-        task_key = (user_id, session_id)
-        self.running_tasks[task_key] = task
+        self.running_tasks[task.task_key] = task
+        self._by_user.setdefault(user_id, {})[task.task_key] = task
+        self._index_task(task)
 
         logger.info(f"创建任务: user={user_id}, session={session_id[:8] if session_id else 'new'}...")
         return task
@@ -111,17 +124,55 @@ class TaskManager:
         return self.running_tasks.get(task_key)
 
     def get_user_tasks(self, user_id: int) -> List[RunningTask]:
-        """获取用户所有任务"""
-        return [
-            task for (uid, _), task in self.running_tasks.items()
-            if uid == user_id
-        ]
+        """获取用户所有任务（返回副本，遍历时可以取消或移除任务）"""
+        return list(self._by_user.get(user_id, {}).values())
+
+    def iter_user_tasks(self, user_id: int) -> Iterator[RunningTask]:
+        """逐个产出用户的任务，不构造列表；遍历期间不能增删任务"""
+        yield from self._by_user.get(user_id, {}).values()
+
+    def active_task_for(self, user_id: int) -> Optional[RunningTask]:
+        """用户恰有一个运行中的任务时返回它，否则返回 None"""
+        tasks = self._by_user.get(user_id)
+        if tasks and len(tasks) == 1:
+            return next(iter(tasks.values()))
+        return None
+
+    def find_task_by_session_prefix(self, user_id: int, session_id_prefix: str) -> Optional[RunningTask]:
+        """通过会话 ID 前缀查找任务"""
+        return self._prefix_index.get(user_id, {}).get(session_id_prefix[:self.SESSION_PREFIX_LEN])
+
+    def set_task_session_id(self, task: RunningTask, session_id: str):
+        """更新任务的会话 ID（新会话在执行中才拿到 ID）"""
+        self._unindex_task(task)
+        task.session_id = session_id
+        self._index_task(task)
+
+    def _index_task(self, task: RunningTask):
+        if task.session_id:
+            prefix = task.session_id[:self.SESSION_PREFIX_LEN]
+            self._prefix_index.setdefault(task.user_id, {})[prefix] = task
+
+    def _unindex_task(self, task: RunningTask):
+        if not task.session_id:
+            return
+        user_index = self._prefix_index.get(task.user_id)
+        prefix = task.session_id[:self.SESSION_PREFIX_LEN]
+        if user_index and user_index.get(prefix) is task:
+            del user_index[prefix]
+            if not user_index:
+                del self._prefix_index[task.user_id]
 
     def remove_task(self, user_id: int, session_id: Optional[str]):
         """移除任务"""
         task_key = (user_id, session_id)
         if task_key in self.running_tasks:
-            del self.running_tasks[task_key]
+            self._unindex_task(self.running_tasks.pop(task_key))
+            user_tasks = self._by_user.get(user_id)
+            if user_tasks is not None:
+                user_tasks.pop(task_key, None)
+                if not user_tasks:
+                    del self._by_user[user_id]
             logger.info(f"移除任务: user={user_id}, session={session_id[:8] if session_id else 'unknown'}...")
 
     async def cancel_task(self, user_id: int, session_id: Optional[str]) -> bool:
@@ -173,8 +224,7 @@ class TaskManager:
             task = self.get_task(user_id, session_id)
             return task is not None and task.state == TaskState.RUNNING
         else:
-            tasks = self.get_user_tasks(user_id)
-            return any(t.state == TaskState.RUNNING for t in tasks)
+            return any(t.state == TaskState.RUNNING for t in self.iter_user_tasks(user_id))
 
     def is_waiting_input(self, user_id: int, session_id: Optional[str]) -> bool:
         """检查任务是否在等待用户输入"""
@@ -249,6 +299,8 @@ class TaskManager:
                 logger.error(f"清理任务失败: {e}")
 
         self.running_tasks.clear()
+        self._by_user.clear()
+        self._prefix_index.clear()
         self.pending_plans.clear()
         logger.info("已清理所有任务")
 
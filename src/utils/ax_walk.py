@@ -0,0 +1,140 @@
+"""
+CloudWork Accessibility Tree Walker
+
+通过 pyobjc 在进程内遍历 macOS 应用的 AX 树，供微信自动化脚本共用
+
+未安装 pyobjc 时 AVAILABLE 为 False，调用方应回退到 AppleScript
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Callable, List, Optional, Tuple
+
+try:
+    # pip install pyobjc-framework-ApplicationServices
+    from AppKit import NSApplicationActivateIgnoringOtherApps, NSWorkspace
+    from ApplicationServices import (
+        AXUIElementCreateApplication,
+        AXUIElementCopyAttributeValue,
+        AXUIElementSetAttributeValue,
+        AXValueGetValue,
+        kAXChildrenAttribute,
+        kAXDescriptionAttribute,
+        kAXErrorSuccess,
+        kAXFocusedAttribute,
+        kAXFocusedWindowAttribute,
+        kAXPositionAttribute,
+        kAXRoleAttribute,
+        kAXSizeAttribute,
+        kAXTitleAttribute,
+        kAXValueAttribute,
+        kAXValueCGPointType,
+        kAXValueCGSizeType,
+        kAXWindowsAttribute,
+    )
+    AVAILABLE = True
+except ImportError:
+    AVAILABLE = False
+
+WECHAT_BUNDLE_ID = "com.tencent.xinWeChat"
+
+
+def _attr(elem, attr):
+    err, value = AXUIElementCopyAttributeValue(elem, attr, None)
+    return value if err == kAXErrorSuccess else None
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    return str(value).replace("\t", " ").replace("\r", " ").replace("\n", " ")
+
+
+@dataclass
+class AXNode:
+    """AX 树节点，role 遍历时读取，其余属性按需读取"""
+    element: Any
+    role: str
+    depth: int
+
+    @cached_property
+    def description(self) -> str:
+        return _text(_attr(self.element, kAXDescriptionAttribute))
+
+    @cached_property
+    def title(self) -> str:
+        return _text(_attr(self.element, kAXTitleAttribute))
+
+    @cached_property
+    def value(self) -> str:
+        return _text(_attr(self.element, kAXValueAttribute))
+
+    @cached_property
+    def frame(self) -> Tuple[int, int, int, int]:
+        x = y = w = h = 0
+        pos = _attr(self.element, kAXPositionAttribute)
+        if pos is not None:
+            _, point = AXValueGetValue(pos, kAXValueCGPointType, None)
+            x, y = point.x, point.y
+        size = _attr(self.element, kAXSizeAttribute)
+        if size is not None:
+            _, extent = AXValueGetValue(size, kAXValueCGSizeType, None)
+            w, h = extent.width, extent.height
+        return int(x), int(y), int(w), int(h)
+
+
+def running_app(bundle_id: str = WECHAT_BUNDLE_ID):
+    """返回运行中的 NSRunningApplication，未运行时为 None"""
+    for app in NSWorkspace.sharedWorkspace().runningApplications():
+        if app.bundleIdentifier() == bundle_id:
+            return app
+    return None
+
+
+def activate(app):
+    app.activateWithOptions_(NSApplicationActivateIgnoringOtherApps)
+
+
+def walk(
+    pid: int,
+    predicate: Callable[[AXNode], bool],
+    max_depth: int = 5,
+    descend: Optional[Callable[[AXNode], bool]] = None,
+    all_windows: bool = False,
+) -> List[AXNode]:
+    """
+    广度优先遍历应用窗口，返回满足 predicate 的节点
+
+    Args:
+        pid: 应用进程 ID
+        predicate: 节点是否收集
+        max_depth: 最大深度，窗口的直接子元素为第 1 层
+        descend: 是否继续深入该节点，默认全部深入
+        all_windows: False 时只遍历焦点窗口
+    """
+    app = AXUIElementCreateApplication(pid)
+    windows = list(_attr(app, kAXWindowsAttribute) or ())
+    if not all_windows:
+        focused = _attr(app, kAXFocusedWindowAttribute)
+        windows = [focused] if focused is not None else windows[:1]
+
+    found = []
+    queue = deque((win, 0) for win in windows)
+    while queue:
+        elem, depth = queue.popleft()
+        if depth >= max_depth:
+            continue
+        for child in _attr(elem, kAXChildrenAttribute) or ():
+            node = AXNode(child, _attr(child, kAXRoleAttribute) or "", depth + 1)
+            if predicate(node):
+                found.append(node)
+            if descend is None or descend(node):
+                queue.append((child, depth + 1))
+    return found
+
+
+def focus_and_set_value(node: AXNode, text: str) -> bool:
+    """聚焦节点并写入文字，只读元素返回 False"""
+    return (AXUIElementSetAttributeValue(node.element, kAXFocusedAttribute, True) == kAXErrorSuccess
+            and AXUIElementSetAttributeValue(node.element, kAXValueAttribute, text) == kAXErrorSuccess)
@@ -18,6 +18,8 @@ class Settings(BaseSettings):
     # =====================================
     telegram_bot_token: str = ""  # Required at runtime, but allow empty for import
     telegram_allowed_users: List[int] = []
+    # Bot API 请求的 HTTP 版本；"2" 在一条连接上复用并发请求，需安装 h2
+    telegram_http_version: str = "1.1"
 
     @field_validator('telegram_allowed_users', mode='before')
     @classmethod
@@ -68,6 +70,7 @@ class Settings(BaseSettings):
     # =====================================
     auto_archive_minutes: int = 30
     max_concurrent_tasks: int = 5
+    session_flush_interval: float = 3.0  # 会话数据后台落盘间隔（秒）
 
     # =====================================
     # Logging
@@ -6,6 +6,7 @@ CloudWork Output Formatting Utilities
 
 import re
 import logging
+from datetime import datetime
 from typing import Tuple, Optional, List
 
 logger = logging.getLogger(__name__)
@@ -367,23 +368,31 @@ def format_session_info(session: dict, is_active: bool = False) -> str:
     """格式化会话信息"""
     name = session.get("name", "未命名")
     message_count = session.get("message_count", 0)
-    last_active = session.get("last_active", "")
-
-    # 解析最后活跃时间
-    if last_active:
-        try:
-            from datetime import datetime
-            dt = datetime.fromisoformat(last_active)
-            time_str = dt.strftime("%m-%d %H:%M")
-        except Exception:
-            time_str = last_active[:16]
-    else:
-        time_str = "未知"
+    time_str = _format_last_active(session.get("last_active", ""))
 
     active_marker = "▶️ " if is_active else ""
     return f"{active_marker}{name} ({message_count}条) - {time_str}"
 
 
+def format_session_infos(sessions: List[dict], active_id: Optional[str] = None) -> List[str]:
+    """批量格式化会话信息，active_id 对应的会话带活跃标记"""
+    return [
+        f"{'▶️ ' if active_id is not None and session.get('id') == active_id else ''}"
+        f"{session.get('name', '未命名')} ({session.get('message_count', 0)}条) - "
+        f"{_format_last_active(session.get('last_active', ''))}"
+        for session in sessions
+    ]
+
+def _format_last_active(last_active: str) -> str:
+    """解析最后活跃时间"""
+    if not last_active:
+        return "未知"
+    try:
+        return datetime.fromisoformat(last_active).strftime("%m-%d %H:%M")
+    except Exception:
+        return last_active[:16]
+
+
 def format_error_message(error: str) -> str:
     """格式化错误消息"""
     # 转义特殊字符
@@ -0,0 +1,163 @@
+"""
+CloudWork AppleScript Runner
+
+macOS 上执行 AppleScript 的公共封装，供微信自动化脚本共用
+"""
+
+import atexit
+import os
+import re
+import select
+import subprocess
+import time
+from typing import Optional, Tuple
+
+_SENTINEL = "__CLOUDWORK_END__"
+_TIMEOUT = 30
+_RESULT_MARK = re.compile(r'^[> ]*=> ', re.M)
+# osascript 报告脚本错误的行，如 "execution error: ... (-1728)"、"12:30: syntax error: ..."
+_ERROR_LINE = re.compile(r'^(?:\d+:\d+: )?(?:execution|syntax) error: ')
+
+
+class OsaSession:
+    """
+    常驻的 osascript -i 交互进程
+
+    多次调用时省去每次冷启动 osascript 的开销
+    （进程创建、LaunchServices 注册、代码签名校验等）
+    """
+
+    _instance: Optional["OsaSession"] = None
+
+    def __init__(self):
+        self._proc: Optional[subprocess.Popen] = None
+
+    @classmethod
+    def get(cls) -> "OsaSession":
+        """获取进程内共享的会话"""
+        if cls._instance is None:
+            cls._instance = cls()
+            atexit.register(cls._instance.close)
+        return cls._instance
+
+    def close(self):
+        """结束 osascript 进程"""
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+
+    def run(self, script: str, timeout: float = _TIMEOUT) -> Tuple[str, str]:
+        """执行脚本，超时抛出 TimeoutError，进程退出抛出 EOFError"""
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                ['osascript', '-i'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+
+        # -i 模式逐行求值：用 run script 把整段脚本压成一行，再输出哨兵标记结果结束
+        escaped = script.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        self._proc.stdin.write(f'run script "{escaped}"\n"{_SENTINEL}"\n'.encode('utf-8'))
+        self._proc.stdin.flush()
+
+        # stdout 与 stderr 分开读取，两者都要 select，避免 stderr 写满管道后进程阻塞
+        out_fd = self._proc.stdout.fileno()
+        err_fd = self._proc.stderr.fileno()
+        out = err = b""
+        deadline = time.monotonic() + timeout
+        while _SENTINEL.encode() not in out:
+            remaining = deadline - time.monotonic()
+            ready = select.select([out_fd, err_fd], [], [], remaining)[0] if remaining > 0 else []
+            if not ready:
+                raise TimeoutError("osascript 无响应")
+            for fd in ready:
+                chunk = os.read(fd, 4096)
+                if not chunk:
+                    raise EOFError("osascript 已退出")
+                if fd == out_fd:
+                    out += chunk
+                else:
+                    err += chunk
+
+        # 脚本的错误信息先于哨兵写出，此时已在管道中，无阻塞地取完
+        while select.select([err_fd], [], [], 0)[0]:
+            chunk = os.read(err_fd, 4096)
+            if not chunk:
+                break
+            err += chunk
+
+        # -i 模式可能把脚本错误当作普通输出打印，挑出这些行按 stderr 返回，
+        # 调用方据 stderr 判断失败
+        lines = _parse_interactive_output(out.decode('utf-8', errors='replace')).split("\n")
+        errors = [line for line in lines if _ERROR_LINE.match(line)]
+        if errors:
+            lines = [line for line in lines if not _ERROR_LINE.match(line)]
+        stderr = _clean_stderr(err.decode('utf-8', errors='replace'))
+        return "\n".join(lines), "\n".join(filter(None, [stderr, *errors]))
+
+
+def _parse_interactive_output(text: str) -> str:
+    """
+    解析 -i 模式的输出：log 行 + "=> 结果"
+
+    结果以源码形式打印，字符串带引号且可能跨多行，
+    需要整体去引号、反转义，不能逐行 strip
+    """
+    # 去掉哨兵自身所在的那一行
+    head = text[:text.rfind(f'"{_SENTINEL}"')]
+    head = head[:max(head.rfind("\n"), 0)]
+
+    # 最后一个以 "=> "（可能带 ">> " 提示符）开头的行起是结果，之前是 log 输出
+    marks = list(_RESULT_MARK.finditer(head))
+    if marks:
+        log_part, result = head[:marks[-1].start()], head[marks[-1].end():]
+    else:
+        log_part, result = head, ""
+    if len(result) >= 2 and result.startswith('"') and result.endswith('"'):
+        result = result[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+
+    lines = []
+    for line in log_part.splitlines():
+        line = line.lstrip('> ').strip()
+        if line:
+            lines.append(line)
+    if result:
+        lines.append(result)
+    return "\n".join(lines)
+
+
+def _clean_stderr(text: str) -> str:
+    """去掉 stderr 中的交互提示符和空行，只留错误信息"""
+    lines = (line.lstrip('> ').strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _run_applescript_once(script: str, timeout: float) -> Tuple[str, str]:
+    try:
+        r = subprocess.run(['osascript', '-'], input=script, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        # 目标应用卡死时 osascript 可能永不返回，run 超时会结束子进程
+        return "", "osascript 无响应"
+    return r.stdout.strip(), r.stderr.strip()
+
+
+def run_applescript(script: str, timeout: float = _TIMEOUT) -> Tuple[str, str]:
+    """
+    执行 AppleScript，返回 (stdout, stderr)
+
+    优先复用常驻会话，会话不可用时回退为一次性调用；
+    两种方式都以 timeout 秒为上限
+    """
+    session = OsaSession.get()
+    try:
+        return session.run(script, timeout)
+    except TimeoutError as e:
+        # 脚本可能已部分执行（例如已输入文字），不再重跑
+        session.close()
+        return "", str(e)
+    except (OSError, EOFError):
+        session.close()
+        return _run_applescript_once(script, timeout)
+
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+CloudWork Callback Routing Tests
+
+测试回调数据的校验与路由：整串匹配、"前缀:参数"、下划线拼接（_CB_RE）及操作码
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.bot.handlers import callbacks
+from src.bot.handlers import opcodes
+
+
+USER_ID = 123456789
+
+
+class FakeQuery:
+    """记录应答和编辑的回调查询"""
+
+    def __init__(self, data):
+        self.data = data
+        self.answers = []
+        self.edits = []
+        self.message = SimpleNamespace(text=None, reply_markup=None)
+
+    async def answer(self, text=None, **kwargs):
+        self.answers.append(text)
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+        self.message.text = text
+        self.message.reply_markup = kwargs.get("reply_markup")
+
+
+def _recorder(calls, name):
+    async def handler(*args):
+        # 普通路由 (query, user_id, arg)，context 路由 (update, context, user_id, arg)，整串路由 (query, user_id)
+        arg = args[-1] if len(args) in (3, 4) else None
+        calls.append((name, arg))
+    return handler
+
+
+def _press(data, authorized=True):
+    """
+    用记录函数替换路由表后点击按钮，返回 (调用记录, query)
+
+    替换只在本次调用内有效，不会执行真实的处理函数
+    """
+    calls = []
+    saved = (callbacks._EXACT_ROUTES, callbacks._ROUTES, callbacks._CONTEXT_ROUTES, callbacks.is_authorized)
+    callbacks._EXACT_ROUTES = {k: _recorder(calls, k) for k in saved[0]}
+    callbacks._ROUTES = {k: _recorder(calls, k) for k in saved[1]}
+    callbacks._CONTEXT_ROUTES = {k: _recorder(calls, k) for k in saved[2]}
+    callbacks.is_authorized = lambda user_id: authorized
+
+    query = FakeQuery(data)
+    update = SimpleNamespace(callback_query=query, effective_user=SimpleNamespace(id=USER_ID))
+
+    async def run():
+        await callbacks.button_callback(update, SimpleNamespace(user_data={}))
+        # 等待后台应答与后台路由执行完
+        while callbacks._background_tasks:
+            await asyncio.gather(*callbacks._background_tasks, return_exceptions=True)
+
+    try:
+        asyncio.run(run())
+    finally:
+        (callbacks._EXACT_ROUTES, callbacks._ROUTES,
+         callbacks._CONTEXT_ROUTES, callbacks.is_authorized) = saved
+    return calls, query
+
+
+def test_cb_regex():
+    """下划线拼接的回调一次匹配出前缀和参数，参数可以包含下划线"""
+    m = callbacks._CB_RE.fullmatch("answer_opt_abcd1234_2")
+    assert m.groups() == ("answer_opt", "abcd1234_2")
+    m = callbacks._CB_RE.fullmatch("page_sessions_3")
+    assert m.groups() == ("page_sessions", "3")
+    assert callbacks._CB_RE.fullmatch("unknown_route_1") is None
+    # 前缀后必须紧跟下划线
+    assert callbacks._CB_RE.fullmatch("cancel_task") is None
+    print("✓ _CB_RE 匹配正确")
+
+
+def test_routing():
+    """各类回调数据分派到对应的处理函数"""
+    session_id = "550e8400-e29b-41d4-a716-446655440000"
+    cases = [
+        ("cron_menu", ("cron_menu", None)),
+        (opcodes.SWITCH_DATA(session_id), (opcodes.SWITCH, session_id)),
+        (opcodes.RESTORE_DATA(session_id), (opcodes.RESTORE, session_id)),
+        (opcodes.BROWSE_DIR_DATA("项目/子目录"), (opcodes.BROWSE_DIR, "项目/子目录")),
+        (opcodes.SELECT_PROJECT_DATA("demo"), (opcodes.SELECT_PROJECT, "demo")),
+        (opcodes.CONFIRM_PROJECT_DATA("demo"), (opcodes.CONFIRM_PROJECT, "demo")),
+        # 旧消息上的长前缀按钮
+        (f"switch_session:{session_id}", ("switch_session", session_id)),
+        # 参数里的冒号原样保留
+        ("skill:plan:use", ("skill", "plan:use")),
+        ("set_model:haiku", ("set_model", "haiku")),
+        ("answer_opt_abcd1234_2", ("answer_opt", "abcd1234_2")),
+        ("page_archived_0", ("page_archived", "0")),
+        ("cancel_task_42", ("cancel_task", "42")),
+    ]
+    for data, expected in cases:
+        calls, _ = _press(data)
+        assert calls == [expected], (data, calls)
+    print("✓ 路由分派正确")
+
+
+def test_rejected_data():
+    """非法或未知的回调数据不分派，但仍要应答以结束按钮的加载状态"""
+    for data in ["", "x" * (callbacks._MAX_CALLBACK_DATA_LEN + 1), "sw:abc\n", "no_such_route", "unknown:arg"]:
+        calls, query = _press(data)
+        assert calls == [], (data, calls)
+        assert query.answers == [None], (data, query.answers)
+
+    calls, query = _press(opcodes.SWITCH_DATA("abc"), authorized=False)
+    assert calls == []
+    assert query.answers == [None]
+    assert query.edits == ["⛔ 您没有使用权限"]
+    print("✓ 非法回调数据被拒绝")
+
+
+def test_answer_ownership():
+    """提示类回调由处理函数应答，其余回调由分派器立即应答"""
+    for data in ["set_model:haiku", "set_mode:plan", "cancel_plan_abc", "answer_opt_abcd1234_0"]:
+        calls, query = _press(data)
+        assert len(calls) == 1
+        # 处理函数已被替换，分派器本身不应答
+        assert query.answers == [], (data, query.answers)
+
+    for data in ["cron_menu", opcodes.SWITCH_DATA("abc"), "page_sessions_0", "transcribe_tpl:meeting"]:
+        calls, query = _press(data)
+        assert len(calls) == 1
+        assert query.answers == [None], (data, query.answers)
+    print("✓ 应答归属正确")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("测试回调路由")
+    print("="*60)
+
+    test_cb_regex()
+    test_routing()
+    test_rejected_data()
+    test_answer_ownership()
+
+    print("\n✅ 回调路由测试通过！")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+CloudWork Desktop Stream Tests
+
+测试桌面端 API 的子进程输出分行（_iter_json_lines）
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录和桌面端 API 目录到 Python 路径
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "desktop" / "api"))
+
+import main as desktop_api
+
+
+def _reader(*chunks, eof=True):
+    reader = asyncio.StreamReader()
+    for chunk in chunks:
+        reader.feed_data(chunk)
+    if eof:
+        reader.feed_eof()
+    return reader
+
+
+async def _collect(reader, timeout=None):
+    """收集产出的行，跳过批次边界 b""；遇到超时标记 None 时记录并结束"""
+    lines = []
+    async for line in desktop_api._iter_json_lines(reader, timeout=timeout):
+        if line is None:
+            lines.append(None)
+            break
+        if line:
+            lines.append(line)
+    return lines
+
+
+def test_split_lines():
+    """按换行切分，跨块的行拼接完整，末尾无换行的行也会产出"""
+    async def run():
+        reader = _reader(b'{"a":1}\n{"b":2}\r\n\n{"c":3}')
+        return await _collect(reader)
+
+    for chunk_size in (5, desktop_api.READ_CHUNK_SIZE):
+        original_chunk = desktop_api.READ_CHUNK_SIZE
+        desktop_api.READ_CHUNK_SIZE = chunk_size
+        try:
+            lines = asyncio.run(run())
+        finally:
+            desktop_api.READ_CHUNK_SIZE = original_chunk
+        # 行尾的 \r 原样保留，由调用方处理
+        assert lines == [b'{"a":1}', b'{"b":2}\r', b'{"c":3}'], chunk_size
+    print("✓ 分行正确")
+
+
+def test_batch_boundaries():
+    """每读完一块产出一次 b"" 作为批次边界"""
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b'{"a":1}\n{"b":2}\n')
+        items = []
+        gen = desktop_api._iter_json_lines(reader, timeout=None)
+        items.append(await gen.__anext__())
+        items.append(await gen.__anext__())
+        items.append(await gen.__anext__())
+        reader.feed_eof()
+        items.extend([item async for item in gen])
+        return items
+
+    assert asyncio.run(run()) == [b'{"a":1}', b'{"b":2}', b""]
+    print("✓ 批次边界正确")
+
+
+def test_skip_overlong_line():
+    """超过 STREAM_LIMIT 的行被丢弃（直到下一个换行），后续行正常产出"""
+    original_limit = desktop_api.STREAM_LIMIT
+    original_chunk = desktop_api.READ_CHUNK_SIZE
+    desktop_api.STREAM_LIMIT = 16
+    desktop_api.READ_CHUNK_SIZE = 8
+
+    async def run():
+        reader = _reader(b'{"ok":1}\n' + b'x' * 40 + b'\n{"ok":2}\n' + b'y' * 40)
+        return await _collect(reader)
+
+    try:
+        lines = asyncio.run(run())
+    finally:
+        desktop_api.STREAM_LIMIT = original_limit
+        desktop_api.READ_CHUNK_SIZE = original_chunk
+
+    # 超长的中间行和未结束的超长末行都不产出
+    assert lines == [b'{"ok":1}', b'{"ok":2}']
+    print("✓ 超长行丢弃正确")
+
+
+def test_timeout():
+    """读取超时产出 None，之前已读到的行正常产出"""
+    async def run():
+        reader = _reader(b'{"a":1}\n', eof=False)
+        return await _collect(reader, timeout=0.05)
+
+    assert asyncio.run(run()) == [b'{"a":1}', None]
+    print("✓ 读取超时正确")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("测试桌面端输出分行")
+    print("="*60)
+
+    test_split_lines()
+    test_batch_boundaries()
+    test_skip_overlong_line()
+    test_timeout()
+
+    print("\n✅ 桌面端输出分行测试通过！")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -180,7 +180,8 @@ def test_claude_executor():
     # 无会话 ID
     cmd1 = executor.build_command("test prompt", None, "sonnet", "auto")
     print(f"✓ 无会话命令: {' '.join(cmd1)}")
-    assert "claude" in cmd1
+    # 可执行文件会被解析为绝对路径
+    assert os.path.basename(cmd1[1]) == "claude"
     assert "--dangerously-skip-permissions" in cmd1
     assert "--model" in cmd1
     assert "sonnet" in cmd1
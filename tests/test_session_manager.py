@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+CloudWork SessionManager Tests
+
+测试会话列表版本号与后台落盘循环
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.bot.services.session import SessionManager
+
+
+USER_ID = 123456789
+
+
+def _read_saved(tmpdir):
+    with open(os.path.join(tmpdir, "sessions.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_version_bumps():
+    """会话列表变更时版本号递增，与列表无关的设置不递增"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        manager = SessionManager(data_dir=tmpdir)
+        assert manager.get_version(USER_ID) == 0
+
+        def bumped(action):
+            before = manager.get_version(USER_ID)
+            action()
+            return manager.get_version(USER_ID) > before
+
+        assert bumped(lambda: manager.create_session(USER_ID, "s1", "会话一"))
+        assert bumped(lambda: manager.create_session(USER_ID, "s2", "会话二"))
+        assert bumped(lambda: manager.set_active_session(USER_ID, "s1"))
+        assert bumped(lambda: manager.archive_session(USER_ID, "s2"))
+        assert bumped(lambda: manager.unarchive_session(USER_ID, "s2"))
+        assert bumped(lambda: manager.delete_session(USER_ID, "s2"))
+
+        # 切换项目会清空活跃会话，列表的活跃标记随之变化
+        assert bumped(lambda: manager.set_user_project(USER_ID, "other_project"))
+        # 项目未变化时不递增
+        assert not bumped(lambda: manager.set_user_project(USER_ID, "other_project"))
+        assert not bumped(lambda: manager.set_user_model(USER_ID, "haiku"))
+
+        # 版本号按用户独立
+        assert manager.get_version(USER_ID + 1) == 0
+    print("✓ 版本号递增正确")
+
+
+def test_save_without_flush_loop():
+    """未启动落盘循环时，每次变更立即写入"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        manager = SessionManager(data_dir=tmpdir)
+        manager.create_session(USER_ID, "s1", "会话一")
+        assert not manager._dirty
+        assert "s1" in _read_saved(tmpdir)[str(USER_ID)]["sessions"]
+    print("✓ 立即写入正确")
+
+
+def test_flush_loop():
+    """落盘循环运行时变更只做标记，由循环或停止时统一写入"""
+    async def run(tmpdir):
+        manager = SessionManager(data_dir=tmpdir)
+        manager.start_flush_loop(0.05)
+        try:
+            manager.create_session(USER_ID, "s1", "会话一")
+            assert manager._dirty == {USER_ID}
+            assert not os.path.exists(os.path.join(tmpdir, "sessions.json"))
+
+            await asyncio.sleep(0.2)
+            assert not manager._dirty
+            assert "s1" in _read_saved(tmpdir)[str(USER_ID)]["sessions"]
+
+            manager.create_session(USER_ID, "s2", "会话二")
+        finally:
+            # 停止时写入剩余变更
+            await manager.stop_flush_loop()
+        assert not manager._dirty
+        assert "s2" in _read_saved(tmpdir)[str(USER_ID)]["sessions"]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        asyncio.run(run(tmpdir))
+    print("✓ 落盘循环正确")
+
+
+def test_failed_write_keeps_dirty():
+    """写入失败时保留脏标记，下次落盘重试"""
+    async def run(tmpdir):
+        manager = SessionManager(data_dir=tmpdir)
+        manager.start_flush_loop(3600)
+        manager.create_session(USER_ID, "s1", "会话一")
+
+        write_file = manager._write_file
+
+        def failing_write(text):
+            raise OSError("disk full")
+
+        manager._write_file = failing_write
+        await manager.flush()
+        assert manager._dirty == {USER_ID}
+
+        manager._write_file = write_file
+        await manager.stop_flush_loop()
+        assert not manager._dirty
+        assert "s1" in _read_saved(tmpdir)[str(USER_ID)]["sessions"]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        asyncio.run(run(tmpdir))
+    print("✓ 写入失败后保留脏标记")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("测试 SessionManager 版本号与落盘")
+    print("="*60)
+
+    test_version_bumps()
+    test_save_without_flush_loop()
+    test_flush_loop()
+    test_failed_write_keeps_dirty()
+
+    print("\n✅ SessionManager 版本号与落盘测试通过！")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+CloudWork TaskManager Tests
+
+测试任务管理器的按用户索引与会话 ID 前缀索引
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.bot.services.task import TaskManager
+
+
+SESSION_A = "aaaa1111-0000-0000-0000-000000000001"
+SESSION_B = "bbbb2222-0000-0000-0000-000000000002"
+
+
+def test_user_index():
+    """按用户索引随任务创建与移除同步更新"""
+    manager = TaskManager()
+
+    task1 = manager.create_task(None, SESSION_A, chat_id=1, message_id=1, user_id=100)
+    task2 = manager.create_task(None, SESSION_B, chat_id=1, message_id=2, user_id=100)
+    other = manager.create_task(None, SESSION_A, chat_id=2, message_id=3, user_id=200)
+
+    assert list(manager.iter_user_tasks(100)) == [task1, task2]
+    assert manager.get_user_tasks(200) == [other]
+    # 多个任务时无法确定目标任务
+    assert manager.active_task_for(100) is None
+    assert manager.active_task_for(200) is other
+
+    manager.remove_task(100, SESSION_A)
+    assert list(manager.iter_user_tasks(100)) == [task2]
+    assert manager.active_task_for(100) is task2
+
+    manager.remove_task(100, SESSION_B)
+    assert list(manager.iter_user_tasks(100)) == []
+    assert 100 not in manager._by_user
+    # 移除不存在的任务不报错
+    manager.remove_task(100, SESSION_B)
+    print("✓ 按用户索引正确")
+
+
+def test_prefix_index():
+    """会话 ID 前缀索引：按前 8 位查找，且只能查到自己的任务"""
+    manager = TaskManager()
+
+    task = manager.create_task(None, SESSION_A, chat_id=1, message_id=1, user_id=100)
+    prefix = SESSION_A[:TaskManager.SESSION_PREFIX_LEN]
+
+    assert manager.find_task_by_session_prefix(100, prefix) is task
+    # 传入更长的 ID 时按前缀截断后查找
+    assert manager.find_task_by_session_prefix(100, SESSION_A) is task
+    assert manager.find_task_by_session_prefix(200, prefix) is None
+    assert manager.find_task_by_session_prefix(100, "zzzzzzzz") is None
+
+    manager.remove_task(100, SESSION_A)
+    assert manager.find_task_by_session_prefix(100, prefix) is None
+    assert 100 not in manager._prefix_index
+    print("✓ 前缀索引正确")
+
+
+def test_set_task_session_id():
+    """新会话拿到 ID 后重新索引，任务键保持创建时的值"""
+    manager = TaskManager()
+
+    task = manager.create_task(None, None, chat_id=1, message_id=1, user_id=100)
+    # 没有会话 ID 的任务不进入前缀索引
+    assert 100 not in manager._prefix_index
+
+    manager.set_task_session_id(task, SESSION_A)
+    assert task.task_key == (100, None)
+    assert manager.get_task(100, None) is task
+    assert manager.find_task_by_session_prefix(100, SESSION_A[:8]) is task
+
+    # 再次更换 ID 时旧前缀失效
+    manager.set_task_session_id(task, SESSION_B)
+    assert manager.find_task_by_session_prefix(100, SESSION_A[:8]) is None
+    assert manager.find_task_by_session_prefix(100, SESSION_B[:8]) is task
+
+    # 按任务键移除后索引一并清理
+    manager.remove_task(100, None)
+    assert manager.find_task_by_session_prefix(100, SESSION_B[:8]) is None
+    assert list(manager.iter_user_tasks(100)) == []
+    print("✓ 更新会话 ID 后索引正确")
+
+
+def test_unindex_keeps_newer_task():
+    """前缀被新任务占用时，移除旧任务不删除新任务的索引"""
+    manager = TaskManager()
+
+    old = manager.create_task(None, SESSION_A, chat_id=1, message_id=1, user_id=100)
+    new = manager.create_task(None, None, chat_id=1, message_id=2, user_id=100)
+    manager.set_task_session_id(new, SESSION_A[:8] + "-other")
+    assert manager.find_task_by_session_prefix(100, SESSION_A[:8]) is new
+
+    manager._unindex_task(old)
+    assert manager.find_task_by_session_prefix(100, SESSION_A[:8]) is new
+    print("✓ 旧任务移除不影响新任务索引")
+
+
+def main():
+    """运行所有测试"""
+    print("\n" + "="*60)
+    print("测试 TaskManager 索引")
+    print("="*60)
+
+    test_user_index()
+    test_prefix_index()
+    test_set_task_session_id()
+    test_unindex_keeps_newer_task()
+
+    print("\n✅ TaskManager 索引测试通过！")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())